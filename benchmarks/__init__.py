@@ -0,0 +1 @@
+"""Micro-benchmarks and load tools (run with ``python -m benchmarks.<name>``)."""
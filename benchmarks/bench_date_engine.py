@@ -0,0 +1,100 @@
+"""Measure days-until and age computation: scalar helpers vs DateTable.
+
+Generates random birthdays (Feb 29 included), computes days until the
+next birthday and the age for every row with days_until_birthday /
+calculate_age and with the batch API, and checks both give the same
+results. --exhaustive also compares every birthday of the year against
+every reference date of a full leap cycle.
+
+Usage:
+    python -m benchmarks.bench_date_engine [--rows 1000000] [--exhaustive]
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from utils.date_helpers import (
+    DateTable,
+    ages_batch,
+    calculate_age,
+    days_until_batch,
+    days_until_birthday
+)
+
+LEAP_YEAR = 2000
+
+
+def make_rows(count: int, seed: int = 1) -> tuple:
+    """Parallel year, month and day lists; a quarter of the years unknown."""
+    rng = random.Random(seed)
+    start = date(LEAP_YEAR, 1, 1)
+    years, months, days = [], [], []
+    for _ in range(count):
+        birthday = start + timedelta(days=rng.randrange(366))
+        years.append(None if rng.random() < 0.25 else rng.randrange(1940, 2024))
+        months.append(birthday.month)
+        days.append(birthday.day)
+    return years, months, days
+
+
+def run_scalar(years, birth_dates, today):
+    days_left = [days_until_birthday(birth_date, today) for birth_date in birth_dates]
+    ages = [
+        None if year is None else calculate_age(year, birth_date, today)
+        for year, birth_date in zip(years, birth_dates)
+    ]
+    return days_left, ages
+
+
+def run_batch(years, months, days, today):
+    return days_until_batch(months, days, today), ages_batch(years, months, days, today)
+
+
+def check_exhaustive() -> int:
+    """Compare lookups with the scalar helpers for all dates of 2023-2028."""
+    birthdays = [date(LEAP_YEAR, 1, 1) + timedelta(days=i) for i in range(366)]
+    mismatches = 0
+    today = date(2023, 1, 1)
+    while today.year < 2029:
+        table = DateTable(today)
+        for birth_date in birthdays:
+            key = birth_date.month * 100 + birth_date.day
+            if (table.days_until(key) != days_until_birthday(birth_date, today)
+                    or table.age(1990, key) != calculate_age(1990, birth_date, today)):
+                mismatches += 1
+        today += timedelta(days=1)
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--exhaustive', action='store_true')
+    args = parser.parse_args()
+    
+    years, months, days = make_rows(args.rows)
+    # A non-leap year around Feb 29 exercises the Feb 28 rule
+    today = date(2025, 2, 27)
+    
+    # Rows already hold dates; only the helper calls are timed
+    birth_dates = [date(LEAP_YEAR, month, day) for month, day in zip(months, days)]
+    start = time.perf_counter()
+    scalar = run_scalar(years, birth_dates, today)
+    scalar_time = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    batch = run_batch(years, months, days, today)
+    batch_time = time.perf_counter() - start
+    
+    print(f"scalar helpers {args.rows} rows  {scalar_time:7.3f}s  {args.rows / scalar_time:12,.0f} rows/s")
+    print(f"DateTable      {args.rows} rows  {batch_time:7.3f}s  {args.rows / batch_time:12,.0f} rows/s  "
+          f"x{scalar_time / batch_time:.1f} (incl. building the table)")
+    print(f"identical results: {scalar == batch}")
+    
+    if args.exhaustive:
+        print(f"exhaustive check mismatches: {check_exhaustive()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Compare open-per-call SQLite access with the pooled ConnectionManager.
+
+Usage:
+    python -m benchmarks.bench_db_connections [--ops 20000]
+"""
+import argparse
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from database.db import ConnectionManager
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        telegram_id INTEGER UNIQUE NOT NULL,
+        username TEXT
+    )
+'''
+
+
+def open_per_call_read(db_file, telegram_id):
+    """Old behaviour: connect, query, close."""
+    conn = sqlite3.connect(db_file, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    try:
+        return conn.execute("SELECT id FROM users WHERE telegram_id = ?", (telegram_id,)).fetchone()
+    finally:
+        conn.close()
+
+
+def open_per_call_write(db_file, telegram_id):
+    """Old behaviour: connect, insert, commit, close."""
+    conn = sqlite3.connect(db_file, check_same_thread=False)
+    try:
+        conn.execute("INSERT OR IGNORE INTO users (telegram_id) VALUES (?)", (telegram_id,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def pooled_read(manager, telegram_id):
+    with manager.connection() as conn:
+        return conn.execute("SELECT id FROM users WHERE telegram_id = ?", (telegram_id,)).fetchone()
+
+
+def pooled_write(manager, telegram_id):
+    with manager.transaction() as conn:
+        conn.execute("INSERT OR IGNORE INTO users (telegram_id) VALUES (?)", (telegram_id,))
+
+
+def measure(label, func, ops):
+    start = time.perf_counter()
+    for i in range(ops):
+        func(i)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {ops / elapsed:>12,.0f} ops/sec")
+    return ops / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--ops', type=int, default=20000)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = Path(tmp) / 'bench.db'
+        manager = ConnectionManager(db_file)
+        with manager.transaction() as conn:
+            conn.execute(SCHEMA)
+            conn.executemany(
+                "INSERT INTO users (telegram_id) VALUES (?)",
+                ((i,) for i in range(args.ops))
+            )
+        
+        old_read = measure('open-per-call SELECT', lambda i: open_per_call_read(db_file, i), args.ops)
+        new_read = measure('pooled SELECT', lambda i: pooled_read(manager, i), args.ops)
+        
+        write_ops = max(args.ops // 10, 1)
+        old_write = measure('open-per-call INSERT+commit',
+                            lambda i: open_per_call_write(db_file, args.ops + i), write_ops)
+        new_write = measure('pooled INSERT+commit',
+                            lambda i: pooled_write(manager, 2 * args.ops + i), write_ops)
+        
+        print(f"\nread speedup:  {new_read / old_read:.1f}x")
+        print(f"write speedup: {new_write / old_write:.1f}x")
+        manager.close_all()
+
+
+if __name__ == '__main__':
+    main()
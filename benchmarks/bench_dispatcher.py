@@ -0,0 +1,64 @@
+"""Measure notification throughput: serial send loop vs MessageDispatcher.
+
+Runs against benchmarks.fake_telegram, which adds a per-call latency and
+answers 429 when Telegram's flood limits would be exceeded.
+
+Usage:
+    python -m benchmarks.bench_dispatcher [--messages 300] [--chats 100] [--latency 0.05]
+"""
+import argparse
+import time
+from concurrent.futures import wait
+
+import telebot
+
+from benchmarks.fake_telegram import FakeTelegramServer
+from utils.dispatcher import MessageDispatcher
+
+
+def run_serial(bot, jobs):
+    """Old scheduler behaviour: one blocking call after another, no retries."""
+    failed = 0
+    for chat_id, text in jobs:
+        try:
+            bot.send_message(chat_id, text)
+        except Exception:
+            failed += 1
+    return failed
+
+
+def run_dispatcher(bot, jobs, workers):
+    dispatcher = MessageDispatcher(bot, workers=workers)
+    dispatcher.start()
+    futures = [dispatcher.send_message(chat_id, text) for chat_id, text in jobs]
+    wait(futures)
+    dispatcher.stop()
+    return sum(1 for f in futures if f.exception())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=300)
+    parser.add_argument('--chats', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+    
+    jobs = [(1000 + i % args.chats, f'message {i}') for i in range(args.messages)]
+    bot = telebot.TeleBot('123456:FAKE', threaded=False)
+    
+    for label, runner in (('serial loop', lambda: run_serial(bot, jobs)),
+                          ('dispatcher', lambda: run_dispatcher(bot, jobs, args.workers))):
+        server = FakeTelegramServer(latency=args.latency).start()
+        server.install()
+        start = time.perf_counter()
+        failed = runner()
+        elapsed = time.perf_counter() - start
+        delivered = len(server.sent)
+        print(f"{label:<12} delivered {delivered:>5}/{len(jobs)}  failed {failed:>5}  "
+              f"429s {server.rejected:>5}  {elapsed:6.2f}s  {delivered / elapsed:6.1f} msg/s")
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
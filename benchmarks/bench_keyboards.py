@@ -0,0 +1,70 @@
+"""Measure reply_markup construction cost per handler: rebuilt vs registry.
+
+"rebuilt" calls the undecorated builders and serializes the result, as
+every reply did before the keyboard registry; "registry" calls the
+decorated functions and serializes the returned FrozenMarkup, which is
+what telebot does with reply_markup for each request.
+
+Usage:
+    python -m benchmarks.bench_keyboards [--iterations 20000] [--pages 50]
+"""
+import argparse
+import time
+from datetime import date
+
+from handlers import views
+from keyboards import inline_keyboards, reply_keyboards
+
+
+def make_pages(count: int, size: int = views.DELETE_PAGE_SIZE) -> list:
+    """Pages of a 500-birthday list, as the delete and list views show them."""
+    pages = []
+    for number in range(1, count + 1):
+        rows = [{
+            'id': (number - 1) * size + i,
+            'friend_name': f'Друг {(number - 1) * size + i}',
+            'birth_date': date(2000, 1 + i % 12, 1 + i % 28),
+            'month_day': (1 + i % 12) * 100 + 1 + i % 28
+        } for i in range(size)]
+        pages.append(views.Page(rows, number, size, total=500, cursor=f'a0.{number}',
+                                has_prev=number > 1, has_next=True))
+    return pages
+
+
+def per_call(func, iterations: int) -> float:
+    """Microseconds per func() call."""
+    start = time.perf_counter()
+    for i in range(iterations):
+        func(i)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--pages', type=int, default=50, help='Distinct pages users flip through')
+    args = parser.parse_args()
+    
+    pages = make_pages(args.pages)
+    cases = (
+        ('start/cancel: main menu', reply_keyboards.get_main_menu, None),
+        ('add: cancel keyboard', reply_keyboards.get_cancel_keyboard, None),
+        ('/menu: inline menu', inline_keyboards.get_main_menu, None),
+        ('list: page navigation', inline_keyboards.get_list_keyboard, pages),
+        ('delete: page buttons', inline_keyboards.get_delete_keyboard, pages),
+    )
+    
+    print(f"{'handler reply':<26} {'rebuilt':>10} {'registry':>10}")
+    for label, get, args_pages in cases:
+        build = get.__wrapped__
+        if args_pages is None:
+            old = per_call(lambda i: build().to_json(), args.iterations)
+            new = per_call(lambda i: get().to_json(), args.iterations)
+        else:
+            old = per_call(lambda i: build(args_pages[i % len(args_pages)]).to_json(), args.iterations)
+            new = per_call(lambda i: get(args_pages[i % len(args_pages)]).to_json(), args.iterations)
+        print(f"{label:<26} {old:8.2f}µs {new:8.2f}µs  x{old / new:5.1f}")
+
+
+if __name__ == '__main__':
+    main()
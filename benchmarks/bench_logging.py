@@ -0,0 +1,105 @@
+"""Measure what a handler's INFO line costs the thread that handles updates.
+
+"before" is the old setup: an f-string message written synchronously to
+a FileHandler and a stdout StreamHandler. The other runs use the
+utils.logging_setup pipeline: lazy %-formatting, records without the
+caller lookup, queued to a listener thread that writes the file (text
+or JSON), optionally with 1-in-N sampling. Console output goes to /dev/null; the log files
+are written to a temporary directory.
+
+For each run: time per call on the logging thread, then the time the
+listener needed to drain the queue, and the number of lines written.
+
+Usage:
+    python -m benchmarks.bench_logging [--lines 200000] [--sample-every 100]
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from config import LOGGING_SETTINGS
+from utils.logging_setup import TEXT_FORMAT, create_pipeline, skip_unused_record_fields
+
+
+def count_lines(path: str) -> int:
+    with open(path, encoding='utf-8') as f:
+        return sum(1 for _ in f)
+
+
+def make_logger(name: str, handler) -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.handlers[:] = [handler] if not isinstance(handler, list) else handler
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return logger
+
+
+def run_before(lines: int, path: str, devnull) -> tuple:
+    handlers = [logging.FileHandler(path, encoding='utf-8'), logging.StreamHandler(devnull)]
+    for handler in handlers:
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    logger = make_logger('handlers.bench_before', handlers)
+    
+    start = time.perf_counter()
+    for user_id in range(lines):
+        logger.info(f"Button LIST clicked by {user_id}")
+    elapsed = time.perf_counter() - start
+    
+    for handler in handlers:
+        handler.close()
+    # The remaining runs use records without caller info, as setup_logging() does
+    skip_unused_record_fields()
+    return elapsed, 0.0
+
+
+def run_pipeline(lines: int, path: str, devnull, log_format: str, sample_every: int) -> tuple:
+    # No rotation, so the file holds every line written
+    settings = dict(LOGGING_SETTINGS, file=path, max_bytes=0, stdout=True, format=log_format,
+                    sample_every=sample_every, sampled_loggers=('handlers',))
+    handler, listener = create_pipeline(settings, stream=devnull)
+    logger = make_logger(f'handlers.bench_{log_format}_{sample_every}', handler)
+    listener.start()
+    
+    start = time.perf_counter()
+    for user_id in range(lines):
+        logger.info("Button LIST clicked by %s", user_id)
+    elapsed = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    listener.stop()
+    drained = time.perf_counter() - start
+    for output in listener.handlers:
+        output.close()
+    return elapsed, drained
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', type=int, default=200_000)
+    parser.add_argument('--sample-every', type=int, default=100)
+    args = parser.parse_args()
+    
+    directory = tempfile.mkdtemp()
+    runs = [
+        ('before: sync, f-string', lambda path, devnull: run_before(args.lines, path, devnull)),
+        ('queue, lazy', lambda path, devnull: run_pipeline(args.lines, path, devnull, 'text', 1)),
+        ('queue, lazy, json', lambda path, devnull: run_pipeline(args.lines, path, devnull, 'json', 1)),
+        (f'queue, lazy, 1/{args.sample_every}',
+         lambda path, devnull: run_pipeline(args.lines, path, devnull, 'text', args.sample_every)),
+    ]
+    
+    baseline = None
+    with open(os.devnull, 'w') as devnull:
+        for index, (name, run) in enumerate(runs):
+            path = os.path.join(directory, f'run{index}.log')
+            elapsed, drained = run(path, devnull)
+            per_call = elapsed / args.lines
+            baseline = baseline or per_call
+            print(f"{name:<26} {per_call * 1e6:7.2f} us/call  x{baseline / per_call:5.1f}  "
+                  f"drain {drained:6.2f}s  {count_lines(path):>8} lines")
+
+
+if __name__ == '__main__':
+    main()
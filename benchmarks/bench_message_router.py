@@ -0,0 +1,136 @@
+"""Measure per-update dispatch overhead: lambda filter chain vs MessageRouter.
+
+Both bots get the same buttons and states with no-op handlers, so only
+telebot's handler selection (and the state lookups it causes) is timed.
+Updates are offered at a fixed rate in 10 ms ticks; the report shows the
+CPU time spent per update and the share of one core that rate costs.
+
+Usage:
+    python -m benchmarks.bench_message_router [--rate 10000] [--seconds 3] [--chats 1000]
+"""
+import argparse
+import itertools
+import time
+
+import telebot
+from telebot import types
+
+from database.state_store import MemoryStateBackend, StateStore
+from utils.message_router import MessageRouter
+
+BUTTONS = ['❌ Отмена', 'С днем рождения', '➕ Добавить', '📋 Список', '🔔 Ближайшие', '🗑️ Удалить']
+STATES = ['waiting_name', 'waiting_date']
+TICK = 0.01
+
+
+def noop(message):
+    pass
+
+
+def build_filter_chain(states: StateStore) -> telebot.TeleBot:
+    """The handler layout before MessageRouter: one filter per button and state."""
+    bot = telebot.TeleBot('123456:FAKE', threaded=False)
+    for command in ('cancel', 'import', 'export'):
+        bot.register_message_handler(noop, commands=[command])
+    for text in BUTTONS:
+        bot.register_message_handler(noop, func=lambda m, text=text: m.text == text)
+    for state in STATES:
+        bot.register_message_handler(noop, func=lambda m, state=state: states.get_state(m.chat.id) == state)
+    bot.register_message_handler(
+        noop, content_types=['document'], func=lambda m: states.get_state(m.chat.id) == 'waiting_import'
+    )
+    bot.register_message_handler(noop, func=lambda m: states.get_state(m.chat.id) == 'waiting_import')
+    bot.register_message_handler(noop, func=lambda m: True)
+    return bot
+
+
+def build_router(states: StateStore) -> telebot.TeleBot:
+    """The same layout routed through a MessageRouter."""
+    bot = telebot.TeleBot('123456:FAKE', threaded=False)
+    for command in ('cancel', 'import', 'export'):
+        bot.register_message_handler(noop, commands=[command])
+    
+    messages = MessageRouter()
+    for text in BUTTONS:
+        messages.register_text(text, noop)
+    for state in STATES:
+        messages.register_state(state, noop)
+    messages.register_state('waiting_import', noop, content_type='document')
+    messages.register_state('waiting_import', noop)
+    messages.register_fallback(noop)
+    
+    def on_message(message):
+        handler = messages.for_text(message)
+        if handler is None:
+            handler = messages.for_state(states.get_state(message.chat.id), message)
+        if handler is not None:
+            handler(message)
+    
+    bot.register_message_handler(on_message, content_types=messages.content_types())
+    return bot
+
+
+def make_updates(count: int, chats: int) -> list:
+    """Half button taps, a third dialog input, the rest unknown text."""
+    updates = []
+    for i in range(count):
+        chat_id = 1000 + i % chats
+        if i % 6 < 3:
+            text = BUTTONS[i % len(BUTTONS)]
+        elif i % 6 < 5:
+            text = f'ввод {i}'
+        else:
+            text = 'привет'
+        updates.append(types.Update.de_json({
+            'update_id': i,
+            'message': {
+                'message_id': i,
+                'date': 0,
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': {'id': chat_id, 'is_bot': False, 'first_name': 'u'},
+                'text': text
+            }
+        }))
+    return updates
+
+
+def run(bot, updates, rate: int):
+    """Offer `rate` updates per second; return (CPU seconds, wall seconds)."""
+    per_tick = max(1, int(rate * TICK))
+    batches = [updates[i:i + per_tick] for i in range(0, len(updates), per_tick)]
+    cpu_start, start = time.process_time(), time.perf_counter()
+    deadline = start
+    for batch in batches:
+        bot.process_new_updates(batch)
+        deadline += TICK
+        delay = deadline - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    return time.process_time() - cpu_start, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rate', type=int, default=10000, help='Offered updates per second')
+    parser.add_argument('--seconds', type=float, default=3)
+    parser.add_argument('--chats', type=int, default=1000)
+    args = parser.parse_args()
+    
+    updates = make_updates(int(args.rate * args.seconds), args.chats)
+    
+    for label, build in (('filter chain', build_filter_chain), ('router', build_router)):
+        states = StateStore(MemoryStateBackend())
+        # A third of the chats are in a dialog
+        for chat_id in itertools.islice(range(1000, 1000 + args.chats), 0, None, 3):
+            states.set_state(chat_id, STATES[chat_id % 2], {})
+        bot = build(states)
+        
+        cpu, wall = run(bot, updates, args.rate)
+        per_update = cpu / len(updates) * 1e6
+        print(f"{label:<12} {len(updates)} updates  {per_update:6.1f} µs/update  "
+              f"{len(updates) / wall:8.0f} updates/s  "
+              f"{per_update * args.rate / 1e4:5.1f}% of a core at {args.rate}/s")
+
+
+if __name__ == '__main__':
+    main()
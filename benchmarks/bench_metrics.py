@@ -0,0 +1,79 @@
+"""Measure the cost of one metrics observation.
+
+Times Counter.inc and Histogram.observe on a pre-resolved series, the
+overhead timed() adds around a no-op function, and histogram observes
+from several threads at once (each thread writes its own shard), then
+renders the registry as a /metrics scrape would.
+
+Usage:
+    python -m benchmarks.bench_metrics [--ops 1000000] [--threads 4]
+"""
+import argparse
+import random
+import threading
+import time
+
+from utils.metrics import MetricsRegistry, timed
+
+
+def per_op(func, ops: int) -> float:
+    """Seconds per call of func() over `ops` calls."""
+    start = time.perf_counter()
+    for _ in range(ops):
+        func()
+    return (time.perf_counter() - start) / ops
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ops', type=int, default=1_000_000)
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args()
+    
+    registry = MetricsRegistry()
+    counter = registry.counter('bench_total', 'Benchmark counter', ('action',)).labels('view')
+    histogram = registry.histogram('bench_seconds', 'Benchmark histogram', ('handler',)).labels('btn_list')
+    values = [random.Random(1).expovariate(200) for _ in range(1024)]
+    
+    def noop():
+        pass
+    
+    loop = per_op(noop, args.ops)
+    inc = per_op(counter.inc, args.ops) - loop
+    
+    index = iter(range(10 ** 12))
+    observe = histogram.observe
+    base = per_op(lambda: values[next(index) & 1023], args.ops)
+    observed = per_op(lambda: observe(values[next(index) & 1023]), args.ops) - base
+    
+    wrapped = per_op(timed(histogram)(noop), args.ops) - loop
+    
+    def worker():
+        for i in range(args.ops):
+            observe(values[i & 1023])
+    
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    threaded = (time.perf_counter() - start) / (args.ops * args.threads)
+    
+    start = time.perf_counter()
+    body = registry.render()
+    render = time.perf_counter() - start
+    
+    print(f"Counter.inc            {inc * 1e9:8.0f} ns")
+    print(f"Histogram.observe      {observed * 1e9:8.0f} ns")
+    print(f"timed() call overhead  {wrapped * 1e9:8.0f} ns  (two perf_counter() calls + observe)")
+    print(f"observe, {args.threads} threads     {threaded * 1e9:8.0f} ns  wall time per observation")
+    print(f"render                 {render * 1e3:8.2f} ms  ({len(body)} bytes)")
+    
+    count = int(body.split('bench_seconds_count{handler="btn_list"} ')[1].split()[0])
+    expected = args.ops * (args.threads + 2)
+    print(f"observations counted: {count} (expected {expected})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Measure birthday insert throughput with and without group commit.
+
+Several threads call BirthdayDB.add concurrently (like handler threads
+during a burst). Without coalescing every insert is its own transaction;
+with it, inserts queued while a commit is in flight share the next one.
+
+Usage:
+    python -m benchmarks.bench_write_coalescer [--threads 16] [--inserts 200] [--synchronous FULL]
+"""
+import argparse
+import tempfile
+import threading
+import time
+from datetime import date
+from pathlib import Path
+
+from database import db
+from database.models import BirthdayDB, UserDB
+from database.write_coalescer import writes
+
+
+def run(threads: int, inserts: int) -> tuple:
+    """Insert `inserts` birthdays from each of `threads` threads; return (seconds, commits)."""
+    user_ids = [UserDB.create_or_get(100000 + i) for i in range(threads)]
+    commits_before = writes.commits
+    barrier = threading.Barrier(threads + 1)
+    
+    def worker(user_id):
+        barrier.wait()
+        for i in range(inserts):
+            BirthdayDB.add(user_id, f'friend {i}', date(2000, i % 12 + 1, i % 28 + 1))
+    
+    pool = [threading.Thread(target=worker, args=(user_id,)) for user_id in user_ids]
+    for thread in pool:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    
+    # Without coalescing every insert commits on its own
+    commits = writes.commits - commits_before if writes.enabled else threads * inserts
+    with db.connection() as conn:
+        conn.execute("DELETE FROM birthdays")
+    return elapsed, commits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--inserts', type=int, default=200, help='inserts per thread (limit is 500)')
+    parser.add_argument('--delay-ms', type=float, default=0)
+    parser.add_argument('--synchronous', default='FULL', help='SQLite synchronous mode (FULL fsyncs every commit)')
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db.manager.db_file = Path(tmp) / 'bench.db'
+        db.manager.pragmas = tuple(
+            (name, args.synchronous if name == 'synchronous' else value) for name, value in db.manager.pragmas
+        )
+        db.init_db()
+        total = args.threads * args.inserts
+        
+        for label, enabled in (('one commit per insert', False), ('group commit', True)):
+            writes.enabled = enabled
+            writes.max_delay = args.delay_ms / 1000
+            elapsed, commits = run(args.threads, args.inserts)
+            print(f"{label:<22} {total / elapsed:>9,.0f} inserts/sec  {commits / elapsed:>9,.0f} commits/sec  "
+                  f"{total / commits:6.1f} inserts/commit")
+        
+        writes.stop()
+        db.close_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,411 @@
+"""Local stand-in for the Telegram Bot API, for offline throughput tests.
+
+It answers sendMessage like the real API, records editMessageText and
+answerCallbackQuery, serves queued incoming updates through getUpdates, and enforces the same flood limits (~30 msg/s per bot, 1 msg/s per chat) by replying 429 with
+`retry_after`, so pacing and retry behaviour can be measured without
+touching api.telegram.org.
+
+Incoming updates can also come from a TrafficModel: scripted users who
+each send their next update once the bot has answered the previous one.
+The server then records, per update, the time from handing it out in
+getUpdates to the bot's first reply in that chat.
+
+Usage as a library:
+    server = FakeTelegramServer()
+    server.start()
+    server.install()  # Point telebot.apihelper at it
+    server.play(TrafficModel(users=500))  # Optional scripted traffic
+    ...
+    server.stop()
+
+Or standalone:
+    python -m benchmarks.fake_telegram --port 8081
+"""
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from datetime import date, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qsl, urlsplit
+
+
+class FakeTelegramServer:
+    """Threaded HTTP server emulating the parts of the Bot API the bot uses."""
+    
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, global_rate: float = 30,
+                 chat_interval: float = 1.0, latency: float = 0.0, retry_after: int = 1,
+                 enforce_limits: bool = True):
+        self.global_rate = global_rate
+        self.chat_interval = chat_interval
+        self.latency = latency
+        self.retry_after = retry_after
+        self.enforce_limits = enforce_limits
+        
+        self.lock = threading.Lock()
+        self.sent = []  # (chat_id, text, timestamp)
+        self.edited = []  # (chat_id, message_id, text, timestamp)
+        self.answered = []  # (callback_query_id, text)
+        self.rejected = 0
+        self._window = []  # timestamps of accepted messages in the last second
+        self._last_by_chat = {}
+        self._message_id = 0
+        self.updates = []  # incoming updates not yet confirmed by getUpdates offset
+        self._update_id = 0
+        self._has_updates = threading.Condition(self.lock)
+        self.traffic = None
+        self.latencies = []  # seconds from getUpdates to the first reply, per update
+        self._waiting = {}  # chat_id -> handed-out time of its unanswered update
+        self._handed_out = 0  # Highest update_id returned by getUpdates
+        self._callback_chats = {}  # callback_query_id -> chat_id
+        
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+    
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+    
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+    
+    def install(self):
+        """Point telebot at this server instead of api.telegram.org."""
+        from telebot import apihelper
+        apihelper.API_URL = self.url + '/bot{0}/{1}'
+    
+    def push_update(self, update: dict) -> int:
+        """Queue an incoming update (without update_id) for getUpdates."""
+        with self.lock:
+            return self._push(update)
+    
+    def play(self, traffic: 'TrafficModel'):
+        """Feed getUpdates from a traffic model and time every reply."""
+        with self.lock:
+            self.traffic = traffic
+            for update in traffic.start():
+                self._push(update)
+    
+    def _push(self, update: dict) -> int:
+        # Called with the lock held
+        self._update_id += 1
+        self.updates.append({**update, 'update_id': self._update_id})
+        callback = update.get('callback_query')
+        if callback:
+            self._callback_chats[callback['id']] = callback['message']['chat']['id']
+        self._has_updates.notify_all()
+        return self._update_id
+    
+    def _replied(self, chat_id: int, method: str, params: dict, message_id: int = None):
+        # Called with the lock held: closes the chat's pending update and
+        # lets the traffic model send the user's next one
+        handed_out = self._waiting.pop(chat_id, None)
+        if handed_out is None or self.traffic is None:
+            return
+        self.latencies.append(time.monotonic() - handed_out)
+        update = self.traffic.next_update(chat_id, {**params, 'method': method, 'message_id': message_id})
+        if update is not None:
+            self._push(update)
+    
+    # ==================== API METHODS ====================
+    
+    def _check_limits(self, chat_id, now):
+        """Return retry_after if the call breaks a flood limit, else None."""
+        if not self.enforce_limits:
+            return None
+        # Small tolerance for network jitter between client pacing and arrival
+        self._window = [t for t in self._window if now - t < 1.0]
+        if len(self._window) > self.global_rate:
+            return self.retry_after
+        last = self._last_by_chat.get(chat_id)
+        if last is not None and now - last < self.chat_interval * 0.9:
+            return self.retry_after
+        return None
+    
+    def _too_many_requests(self, retry_after):
+        # Called with the lock held
+        self.rejected += 1
+        return 429, {
+            'ok': False,
+            'error_code': 429,
+            'description': f'Too Many Requests: retry after {retry_after}',
+            'parameters': {'retry_after': retry_after}
+        }
+    
+    def send_message(self, params):
+        chat_id = int(params['chat_id'])
+        now = time.monotonic()
+        with self.lock:
+            retry_after = self._check_limits(chat_id, now)
+            if retry_after is not None:
+                return self._too_many_requests(retry_after)
+            self._window.append(now)
+            self._last_by_chat[chat_id] = now
+            self._message_id += 1
+            message_id = self._message_id
+            self.sent.append((chat_id, params.get('text', ''), now))
+            self._replied(chat_id, 'sendMessage', params, message_id)
+        
+        return 200, {'ok': True, 'result': {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'text': params.get('text', '')
+        }}
+    
+    def edit_message_text(self, params):
+        # Edits count against the same flood limits as new messages
+        chat_id = int(params['chat_id'])
+        now = time.monotonic()
+        with self.lock:
+            retry_after = self._check_limits(chat_id, now)
+            if retry_after is not None:
+                return self._too_many_requests(retry_after)
+            self._window.append(now)
+            self._last_by_chat[chat_id] = now
+            self.edited.append((chat_id, int(params['message_id']), params.get('text', ''), now))
+            self._replied(chat_id, 'editMessageText', params, int(params['message_id']))
+        
+        return 200, {'ok': True, 'result': {
+            'message_id': int(params['message_id']),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'text': params.get('text', '')
+        }}
+    
+    def answer_callback_query(self, params):
+        with self.lock:
+            self.answered.append((params['callback_query_id'], params.get('text')))
+            chat_id = self._callback_chats.pop(params['callback_query_id'], None)
+            if chat_id is not None:
+                self._replied(chat_id, 'answerCallbackQuery', params)
+        return 200, {'ok': True, 'result': True}
+    
+    def get_updates(self, params):
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        timeout = min(float(params.get('timeout') or 0), 1.0)
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            # Updates below the offset are confirmed and dropped, like the real API
+            self.updates = [u for u in self.updates if u['update_id'] >= offset]
+            while not self.updates and time.monotonic() < deadline:
+                self._has_updates.wait(deadline - time.monotonic())
+            batch = self.updates[:limit]
+            now = time.monotonic()
+            for update in batch:
+                # Updates handed out again (client retried) keep their first time
+                if update['update_id'] > self._handed_out:
+                    self._waiting[update_chat_id(update)] = now
+                    self._handed_out = update['update_id']
+            return 200, {'ok': True, 'result': batch}
+    
+    def set_webhook(self, params):
+        return 200, {'ok': True, 'result': True, 'description': 'Webhook was set'}
+    
+    def get_me(self, params):
+        return 200, {'ok': True, 'result': {
+            'id': 1, 'is_bot': True, 'first_name': 'FakeBot', 'username': 'fake_bot'
+        }}
+    
+    def dispatch(self, method, params):
+        handlers = {
+            'sendmessage': self.send_message,
+            'editmessagetext': self.edit_message_text,
+            'answercallbackquery': self.answer_callback_query,
+            'getme': self.get_me,
+            'getupdates': self.get_updates,
+            'setwebhook': self.set_webhook,
+            'deletewebhook': self.set_webhook,
+        }
+        handler = handlers.get(method.lower())
+        if handler is None:
+            return 404, {'ok': False, 'error_code': 404, 'description': 'Not Found'}
+        return handler(params)
+    
+    def _make_handler(self):
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def _handle(self):
+                parts = urlsplit(self.path)
+                method = parts.path.rsplit('/', 1)[-1]
+                params = dict(parse_qsl(parts.query))
+                
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    body = self.rfile.read(length).decode()
+                    if self.headers.get('Content-Type', '').startswith('application/json'):
+                        params.update(json.loads(body))
+                    else:
+                        params.update(parse_qsl(body))
+                
+                if server.latency:
+                    time.sleep(server.latency)
+                status, payload = server.dispatch(method, params)
+                
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            
+            do_GET = _handle
+            do_POST = _handle
+            
+            def log_message(self, format, *args):
+                pass
+        
+        return Handler
+
+
+def update_chat_id(update: dict) -> int:
+    """Chat of a message or callback query update."""
+    if 'callback_query' in update:
+        return update['callback_query']['message']['chat']['id']
+    return update['message']['chat']['id']
+
+
+def callback_buttons(reply: dict, prefix: str) -> list:
+    """callback_data of the inline buttons in a reply that start with prefix."""
+    markup = reply.get('reply_markup')
+    if isinstance(markup, str):
+        markup = json.loads(markup)
+    rows = (markup or {}).get('inline_keyboard', [])
+    return [button['callback_data'] for row in rows for button in row
+            if button.get('callback_data', '').startswith(prefix)]
+
+
+class TrafficModel:
+    """Scripted users driving the bot through its main flows.
+    
+    Each user runs one flow picked by weight. A flow is a generator that
+    yields the user's updates and receives the bot's first reply to each
+    one (the API call parameters plus 'method' and 'message_id'), so
+    later steps can press the buttons the bot actually sent.
+    """
+    
+    # flow name -> relative weight
+    MIX = {'start': 2, 'list': 3, 'upcoming': 2, 'add': 2, 'delete': 1}
+    
+    def __init__(self, users: int = 500, first_user_id: int = 100000, mix: dict = None, seed: int = 1):
+        self.mix = mix or self.MIX
+        rng = random.Random(seed)
+        names = list(self.mix)
+        picks = rng.choices(names, weights=[self.mix[name] for name in names], k=users)
+        self.user_ids = range(first_user_id, first_user_id + users)
+        self.flows = dict(zip(self.user_ids, picks))
+        self.finished = threading.Event()
+        self._scripts = {}
+        self._ids = itertools.count(1)
+        self._remaining = users
+        self._birthday = date(2000, 1, 1)
+    
+    def start(self) -> list:
+        """First update of every user."""
+        updates = []
+        for user_id, flow in self.flows.items():
+            script = getattr(self, f'flow_{flow}')(user_id)
+            self._scripts[user_id] = script
+            updates.append(next(script))
+        return updates
+    
+    def next_update(self, chat_id: int, reply: dict):
+        """The user's next update after the bot replied, or None once the flow is over."""
+        script = self._scripts.get(chat_id)
+        if script is None:
+            return None
+        try:
+            return script.send(reply)
+        except StopIteration:
+            del self._scripts[chat_id]
+            self._remaining -= 1
+            if not self._remaining:
+                self.finished.set()
+            return None
+    
+    # ==================== UPDATES ====================
+    
+    def message(self, user_id: int, text: str) -> dict:
+        user = {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}'}
+        message = {
+            'message_id': next(self._ids),
+            'from': user,
+            'chat': {'id': user_id, 'type': 'private', 'first_name': user['first_name']},
+            'date': int(time.time()),
+            'text': text
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return {'message': message}
+    
+    def callback(self, user_id: int, data: str, message_id: int) -> dict:
+        user = {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}'}
+        return {'callback_query': {
+            'id': str(next(self._ids)),
+            'from': user,
+            'chat_instance': str(user_id),
+            'data': data,
+            'message': {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'text': ''
+            }
+        }}
+    
+    # ==================== FLOWS ====================
+    
+    def flow_start(self, user_id):
+        yield self.message(user_id, '/start')
+    
+    def flow_list(self, user_id):
+        reply = yield self.message(user_id, '📋 Список')
+        pages = callback_buttons(reply, 'page_list:')
+        if pages:
+            yield self.callback(user_id, pages[-1], reply['message_id'])
+    
+    def flow_upcoming(self, user_id):
+        yield self.message(user_id, '🔔 Ближайшие')
+    
+    def flow_add(self, user_id):
+        self._birthday += timedelta(days=1)
+        yield self.message(user_id, '➕ Добавить')
+        yield self.message(user_id, f'Друг {user_id}')
+        yield self.message(user_id, self._birthday.strftime('%d.%m'))
+    
+    def flow_delete(self, user_id):
+        reply = yield self.message(user_id, '🗑️ Удалить')
+        buttons = callback_buttons(reply, 'delete:')
+        if buttons:
+            yield self.callback(user_id, buttons[0], reply['message_id'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake Telegram Bot API server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every call')
+    args = parser.parse_args()
+    
+    server = FakeTelegramServer(args.host, args.port, latency=args.latency)
+    print(f"Fake Bot API listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
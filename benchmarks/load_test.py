@@ -0,0 +1,130 @@
+"""End-to-end load test of the polling bot against a scripted fake Bot API.
+
+Starts the real create_bot() with the command and birthday handlers and
+lets it poll a benchmarks.fake_telegram server fed by a TrafficModel:
+every simulated user runs one flow (/start, list, upcoming, add or
+delete) and sends its next update once the bot has answered the
+previous one. Users are seeded with birthdays in a fresh SQLite file.
+
+Reports handler latency (update handed out by getUpdates -> first reply
+in its chat) at p50/p99, updates/sec and SQL statements per update.
+Handlers run on the chat executor as in main.py (--telebot-pool: on
+telebot's own thread pool instead, which does not keep a chat's
+updates in order). --dispatcher routes replies through the flood-limit
+aware dispatcher as main.py does (and makes the fake API enforce
+Telegram's limits).
+
+Usage:
+    python -m benchmarks.load_test [--users 1000] [--birthdays 30] [--latency 0.0] [--dispatcher]
+                                   [--handler-workers 16 | --telebot-pool]
+"""
+import argparse
+import itertools
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+from benchmarks.webhook_load import percentile
+
+
+def seed(user_ids, count: int):
+    """Give every user `count` birthdays spread over the year."""
+    from database.models import BirthdayDB, UserDB
+    
+    start = date(2000, 1, 1)
+    for telegram_id in user_ids:
+        user_id = UserDB.create_or_get(telegram_id)
+        BirthdayDB.add_many(user_id, [
+            (f'Друг {i}', start + timedelta(days=(telegram_id + i * 7) % 366), None)
+            for i in range(count)
+        ])
+    # Measure lookups as a freshly started process would do them
+    UserDB.cache.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000, help='simulated users, one flow each')
+    parser.add_argument('--birthdays', type=int, default=30, help='birthdays seeded per user')
+    parser.add_argument('--latency', type=float, default=0.0, help='fake Bot API latency per call (s)')
+    parser.add_argument('--dispatcher', action='store_true', help='send replies through the dispatcher')
+    parser.add_argument('--handler-workers', type=int, default=None, help='chat executor threads')
+    parser.add_argument('--telebot-pool', action='store_true', help="run handlers on telebot's thread pool")
+    parser.add_argument('--timeout', type=float, default=300, help='give up after this many seconds')
+    args = parser.parse_args()
+    
+    # The bot modules read configuration and the database at import time
+    os.environ.setdefault('BOT_TOKEN', '123456:FAKE')
+    from database import db
+    db.manager.db_file = os.path.join(tempfile.mkdtemp(), 'load.db')
+    db.init_db()
+    
+    from benchmarks.fake_telegram import FakeTelegramServer, TrafficModel
+    from bot import create_bot
+    from handlers.birthdays import register_birthday_handlers
+    from handlers.commands import register_command_handlers
+    from utils.chat_executor import ChatExecutor
+    from utils.dispatcher import start_dispatcher, stop_dispatcher
+    from config import EXECUTOR_SETTINGS
+    
+    traffic = TrafficModel(users=args.users)
+    seed(traffic.user_ids, args.birthdays)
+    
+    server = FakeTelegramServer(latency=args.latency, enforce_limits=args.dispatcher).start()
+    server.install()
+    
+    bot = create_bot(threaded=args.telebot_pool)
+    executor = None
+    if not args.telebot_pool:
+        settings = dict(EXECUTOR_SETTINGS)
+        if args.handler_workers:
+            settings['workers'] = args.handler_workers
+        executor = ChatExecutor(**settings).start()
+        executor.attach(bot)
+    if args.dispatcher:
+        start_dispatcher(bot).attach()
+    register_command_handlers(bot)
+    register_birthday_handlers(bot)
+    
+    # next() on a count is atomic, so DB threads can share it
+    statements = itertools.count()
+    db.manager.set_trace(lambda sql: next(statements))
+    
+    server.play(traffic)
+    # telebot uses `timeout` as the connect timeout too; a busy fake server may need more than 1s
+    thread = threading.Thread(
+        target=bot.polling,
+        kwargs={'non_stop': True, 'interval': 0, 'timeout': 10, 'long_polling_timeout': 1},
+        daemon=True
+    )
+    start = time.perf_counter()
+    thread.start()
+    finished = traffic.finished.wait(args.timeout)
+    elapsed = time.perf_counter() - start
+    
+    db.manager.set_trace(None)
+    executed = next(statements)
+    bot.stop_polling()
+    thread.join()
+    if executor:
+        executor.stop()
+    if args.dispatcher:
+        stop_dispatcher()
+    server.stop()
+    
+    latencies = sorted(server.latencies)
+    updates = len(latencies)
+    mix = Counter(traffic.flows.values())
+    print(f"flows: {', '.join(f'{name} {count}' for name, count in mix.most_common())}"
+          f"{'' if finished else '  (timed out)'}")
+    print(f"updates handled  {updates:>8}  in {elapsed:.2f}s  {updates / elapsed:10.1f} updates/s")
+    print(f"handler latency  p50 {percentile(latencies, 0.5) * 1000:7.2f}ms  "
+          f"p99 {percentile(latencies, 0.99) * 1000:7.2f}ms")
+    print(f"SQL statements   {executed:>8}  {executed / max(updates, 1):10.2f} per update")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""Load generator for webhook mode.
+
+Posts synthetic /help updates to a webhook endpoint the way Telegram
+does (JSON body, secret token header, parallel keep-alive connections)
+and reports acknowledged updates/sec and acknowledgement latency.
+
+With --compare it runs the bot in-process against benchmarks.fake_telegram
+and measures end-to-end updates/sec (update in, reply out) for both
+long polling and the built-in webhook server.
+
+Usage:
+    python -m benchmarks.webhook_load --url http://127.0.0.1:8443/webhook --secret s3cret
+    python -m benchmarks.webhook_load --compare [--updates 2000] [--latency 0.02]
+"""
+import argparse
+import http.client
+import json
+import os
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def make_update(i: int) -> dict:
+    """A private-chat /help message from a distinct user (so no rate limit hits)."""
+    user = {'id': 100000 + i, 'is_bot': False, 'first_name': f'User{i}'}
+    return {'message': {
+        'message_id': i + 1,
+        'from': user,
+        'chat': {'id': user['id'], 'type': 'private', 'first_name': user['first_name']},
+        'date': int(time.time()),
+        'text': '/help',
+        'entities': [{'type': 'bot_command', 'offset': 0, 'length': 5}]
+    }}
+
+
+def post_updates(url: str, secret: str, updates: int, concurrency: int) -> dict:
+    """POST updates from `concurrency` connections; return status counts and latencies."""
+    parts = urlsplit(url)
+    counter = iter(range(updates))
+    lock = threading.Lock()
+    statuses = {}
+    latencies = []
+    
+    def client():
+        conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            body = json.dumps({**make_update(i), 'update_id': i + 1})
+            headers = {'Content-Type': 'application/json', 'X-Telegram-Bot-Api-Secret-Token': secret}
+            start = time.perf_counter()
+            try:
+                conn.request('POST', parts.path or '/', body, headers)
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+                if response.will_close:
+                    conn.close()
+            except (OSError, http.client.HTTPException):
+                status = 'error'
+                conn.close()
+            elapsed = time.perf_counter() - start
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+                latencies.append(elapsed)
+        conn.close()
+    
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {'statuses': statuses, 'latencies': sorted(latencies)}
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def run_generator(args):
+    start = time.perf_counter()
+    result = post_updates(args.url, args.secret, args.updates, args.concurrency)
+    elapsed = time.perf_counter() - start
+    latencies = result['latencies']
+    print(f"sent {len(latencies)} updates in {elapsed:.2f}s: {len(latencies) / elapsed:.1f} updates/s")
+    print(f"statuses {result['statuses']}")
+    print(f"ack latency p50 {percentile(latencies, 0.5) * 1000:.1f}ms  "
+          f"p99 {percentile(latencies, 0.99) * 1000:.1f}ms")
+
+
+def wait_for_replies(server, expected: int, timeout: float = 120) -> bool:
+    deadline = time.monotonic() + timeout
+    while len(server.sent) < expected:
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def run_compare(args):
+    # The bot modules read configuration and the database at import time
+    os.environ.setdefault('BOT_TOKEN', '123456:FAKE')
+    from database import db
+    db.manager.db_file = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    db.init_db()
+    
+    import telebot
+    from benchmarks.fake_telegram import FakeTelegramServer
+    from handlers.commands import register_command_handlers
+    from utils.webhook import WebhookServer
+    
+    def make_bot():
+        bot = telebot.TeleBot('123456:FAKE', num_threads=args.threads)
+        register_command_handlers(bot)
+        return bot
+    
+    def polling():
+        bot = make_bot()
+        for i in range(args.updates):
+            server.push_update(make_update(i))
+        thread = threading.Thread(
+            target=bot.polling,
+            kwargs={'non_stop': True, 'interval': 0, 'timeout': 1, 'long_polling_timeout': 1},
+            daemon=True
+        )
+        start = time.perf_counter()
+        thread.start()
+        done = wait_for_replies(server, args.updates)
+        elapsed = time.perf_counter() - start
+        bot.stop_polling()
+        thread.join()
+        return done, elapsed
+    
+    def webhook():
+        bot = make_bot()
+        hook = WebhookServer(bot, listen='127.0.0.1', port=0, secret='bench',
+                             workers=args.threads, queue_size=args.updates).start()
+        host, port = hook.address
+        start = time.perf_counter()
+        post_updates(f'http://{host}:{port}/webhook', 'bench', args.updates, args.concurrency)
+        done = wait_for_replies(server, args.updates)
+        elapsed = time.perf_counter() - start
+        hook.stop()
+        return done, elapsed
+    
+    for label, runner in (('polling', polling), ('webhook', webhook)):
+        server = FakeTelegramServer(latency=args.latency, enforce_limits=False).start()
+        server.install()
+        done, elapsed = runner()
+        handled = len(server.sent)
+        status = '' if done else '  (timed out)'
+        print(f"{label:<8} handled {handled:>6}/{args.updates}  {elapsed:6.2f}s  "
+              f"{handled / elapsed:8.1f} updates/s{status}")
+        server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8443/webhook')
+    parser.add_argument('--secret', default='')
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=40, help='parallel connections (Telegram default: 40)')
+    parser.add_argument('--compare', action='store_true', help='compare polling and webhook in-process')
+    parser.add_argument('--latency', type=float, default=0.02, help='fake Bot API latency for --compare')
+    parser.add_argument('--threads', type=int, default=4, help='handler threads for --compare')
+    args = parser.parse_args()
+    
+    if args.compare:
+        run_compare(args)
+    else:
+        run_generator(args)
+
+
+if __name__ == '__main__':
+    main()
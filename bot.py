@@ -5,12 +5,30 @@ from config import BOT_TOKEN
 
 logger = logging.getLogger(__name__)
 
-def create_bot() -> telebot.TeleBot:
-    """Create and configure bot instance."""
+def create_bot(threaded: bool = True) -> telebot.TeleBot:
+    """Create and configure bot instance.
+    
+    Args:
+        threaded: Run handlers on telebot's thread pool (False: in the
+            thread that passes the updates in, one after another)
+    """
     if not BOT_TOKEN:
         raise ValueError("BOT_TOKEN not found in environment variables")
     
-    bot = telebot.TeleBot(BOT_TOKEN, parse_mode=None)
+    bot = telebot.TeleBot(BOT_TOKEN, parse_mode=None, threaded=threaded)
     logger.info("Bot instance created successfully")
     
-    return bot
\ No newline at end of file
+    return bot
+
+def create_async_bot():
+    """Create and configure an asyncio bot instance (needs aiohttp)."""
+    # Imported here so the threaded bot does not depend on aiohttp
+    from telebot.async_telebot import AsyncTeleBot
+    
+    if not BOT_TOKEN:
+        raise ValueError("BOT_TOKEN not found in environment variables")
+    
+    bot = AsyncTeleBot(BOT_TOKEN, parse_mode=None)
+    logger.info("Async bot instance created successfully")
+    
+    return bot
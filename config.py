@@ -7,10 +7,120 @@ load_dotenv()
 # Bot Configuration
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 
+# Storage backend: 'sqlite' (single file, default) or 'mysql' (needs mysql-connector-python)
+DB_BACKEND = os.getenv('DB_BACKEND', 'sqlite')
+
+# MySQL server and connection pool (mysql-connector allows at most 32 pooled connections)
+MYSQL_SETTINGS = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'port': int(os.getenv('DB_PORT', 3306)),
+    'user': os.getenv('DB_USER', 'bot_user'),
+    'password': os.getenv('DB_PASSWORD', ''),
+    'database': os.getenv('DB_NAME', 'birthdays_db'),
+    'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+    'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', 10))
+}
+
+# Update delivery: 'polling' (getUpdates) or 'webhook' (built-in HTTP server)
+RUN_MODE = os.getenv('RUN_MODE', 'polling')
+
+# Webhook mode; Telegram posts to WEBHOOK_URL + path, which must reach listen:port
+WEBHOOK_SETTINGS = {
+    'url': os.getenv('WEBHOOK_URL', ''),
+    'listen': os.getenv('WEBHOOK_LISTEN', '0.0.0.0'),
+    'port': int(os.getenv('WEBHOOK_PORT', 8443)),
+    'path': os.getenv('WEBHOOK_PATH', '/webhook'),
+    'secret': os.getenv('WEBHOOK_SECRET', ''),
+    'workers': int(os.getenv('WEBHOOK_WORKERS', 4)),
+    'queue_size': int(os.getenv('WEBHOOK_QUEUE_SIZE', 1000)),
+    'max_connections': int(os.getenv('WEBHOOK_MAX_CONNECTIONS', 40))
+}
+
 # Notification Settings
-NOTIFICATION_TIME = {
-    'hour': int(os.getenv('NOTIFICATION_HOUR', 9)),
-    'minute': int(os.getenv('NOTIFICATION_MINUTE', 0))
+NOTIFICATION_SETTINGS = {
+    # Used for users who have not chosen their own (/timezone, /notify_time)
+    'default_timezone': os.getenv('DEFAULT_TIMEZONE', 'Europe/Moscow'),
+    'default_hour': int(os.getenv('NOTIFICATION_HOUR', 9)),
+    # Scheduler tick; users are notified in the tick containing their local hour
+    'slot_minutes': int(os.getenv('NOTIFICATION_SLOT_MINUTES', 15)),
+    # Slots missed while the bot was down are delivered on start if this recent
+    'catch_up_hours': int(os.getenv('NOTIFICATION_CATCH_UP_HOURS', 6))
+}
+
+# Outbound message dispatcher (Telegram flood limits)
+DISPATCHER_SETTINGS = {
+    'workers': int(os.getenv('DISPATCHER_WORKERS', 4)),
+    'global_rate': float(os.getenv('DISPATCHER_GLOBAL_RATE', 30)),
+    'chat_rate': float(os.getenv('DISPATCHER_CHAT_RATE', 1)),
+    'max_retries': int(os.getenv('DISPATCHER_MAX_RETRIES', 5))
+}
+
+# Handler threads: updates of different chats run in parallel, one chat's in order
+EXECUTOR_SETTINGS = {
+    'workers': int(os.getenv('HANDLER_WORKERS', 16)),
+    'max_pending': int(os.getenv('HANDLER_QUEUE_SIZE', 10000))
+}
+
+# Multi-process mode (main_workers.py): updates are sharded by chat to worker processes
+WORKER_SETTINGS = {
+    'processes': int(os.getenv('WORKER_PROCESSES', os.cpu_count() or 1)),
+    'queue_size': int(os.getenv('WORKER_QUEUE_SIZE', 1000)),
+    'backlog': int(os.getenv('WORKER_BACKLOG', 64)),
+    'restart_delay': float(os.getenv('WORKER_RESTART_DELAY', 1))
+}
+
+# Threads running SQLite calls for the asyncio entry point (main_async.py)
+DB_EXECUTOR_WORKERS = int(os.getenv('DB_EXECUTOR_WORKERS', 4))
+
+# Group commit of birthday writes: writes queued while a commit runs share the next one
+# (a delay > 0 also waits that long for more writes before committing)
+WRITE_COALESCER_SETTINGS = {
+    'enabled': os.getenv('WRITE_COALESCING', '1') == '1',
+    'max_delay_ms': float(os.getenv('WRITE_COALESCING_DELAY_MS', 0)),
+    'max_batch': int(os.getenv('WRITE_COALESCING_MAX_BATCH', 256))
+}
+
+# Size of the telegram_id -> user id cache in UserDB
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 50000))
+
+# Keyboards that depend on a page (list navigation, delete buttons) kept serialized
+KEYBOARD_CACHE_SIZE = int(os.getenv('KEYBOARD_CACHE_SIZE', 1024))
+
+# Conversation state storage ('sqlite'/'mysql' survive restarts, 'memory' does not)
+STATE_SETTINGS = {
+    'backend': os.getenv('STATE_BACKEND', DB_BACKEND),
+    'ttl': int(os.getenv('STATE_TTL_SECONDS', 3600)),
+    'cache_size': int(os.getenv('STATE_CACHE_SIZE', 10000))
+}
+
+# Per-user rate limits ('sqlite' shares them between worker processes on one host)
+RATE_LIMIT_SETTINGS = {
+    'backend': os.getenv('RATE_LIMIT_BACKEND', 'memory'),
+    'db_file': os.getenv('RATE_LIMIT_DB_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rate_limits.db')),
+    'cache_size': int(os.getenv('RATE_LIMIT_CACHE_SIZE', 10000)),
+    # At most one "slow down" reply per user in this many seconds
+    'notice_seconds': float(os.getenv('RATE_LIMIT_NOTICE_SECONDS', 10)),
+    # Refilled buckets are dropped from the store this often
+    'purge_seconds': float(os.getenv('RATE_LIMIT_PURGE_SECONDS', 600))
+}
+
+# Logging (records are written by a background thread, see utils/logging_setup.py)
+LOGGING_SETTINGS = {
+    'level': os.getenv('LOG_LEVEL', 'INFO').upper(),
+    'file': os.getenv('LOG_FILE', 'bot.log'),  # empty: stdout only
+    'max_bytes': int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024)),
+    'backup_count': int(os.getenv('LOG_BACKUP_COUNT', 5)),
+    'format': os.getenv('LOG_FORMAT', 'text'),  # text or json
+    'stdout': os.getenv('LOG_STDOUT', '1') == '1',
+    # Keep 1 in N INFO lines of each message template from these loggers (1 = all)
+    'sample_every': int(os.getenv('LOG_SAMPLE_EVERY', 1)),
+    'sampled_loggers': tuple(name for name in os.getenv('LOG_SAMPLED_LOGGERS', 'handlers').split(',') if name)
+}
+
+# Prometheus /metrics endpoint (port 0 turns it off); keep it on a private interface
+METRICS_SETTINGS = {
+    'listen': os.getenv('METRICS_LISTEN', '127.0.0.1'),
+    'port': int(os.getenv('METRICS_PORT', 9108))
 }
 
 # Bot Messages
@@ -18,10 +128,15 @@ MESSAGES = {
     'start': '👋 Привет! Я бот-напоминалка дней рождений твоих друзей!\n\nИспользуй меню ниже для управления.',
     'help': '''📖 <b>Доступные команды:</b>\n
 /start - Запуск бота
+/menu - Меню с кнопками
 /add - Добавить день рождения
 /list - Показать все дни рождения
 /upcoming - Ближайшие дни рождения
 /delete - Удалить запись
+/import - Загрузить список из файла (CSV, vCard, JSON)
+/export - Выгрузить список (/export csv | vcf | json)
+/timezone - Часовой пояс для уведомлений
+/notify_time - Час уведомлений
 /help - Показать эту справку''',
     'error': '❌ Произошла ошибка. Попробуй еще раз.',
     'cancel': '❌ Операция отменена.'
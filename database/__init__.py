@@ -1,5 +1,14 @@
 """Database package."""
-from .db import get_connection, init_db
-from .models import UserDB, BirthdayDB
+from .db import get_connection, connection, transaction, close_all, init_db
+from .models import UserDB, BirthdayDB, NotificationDB
 
-__all__ = ['get_connection', 'init_db', 'UserDB', 'BirthdayDB']
\ No newline at end of file
+__all__ = [
+    'get_connection',
+    'connection',
+    'transaction',
+    'close_all',
+    'init_db',
+    'UserDB',
+    'BirthdayDB',
+    'NotificationDB'
+]
@@ -0,0 +1,74 @@
+"""Asyncio wrappers for the database models.
+
+sqlite3 has no async API, so the handler flows (which use the regular
+UserDB / BirthdayDB / state store code) run on a dedicated thread pool.
+The event loop never blocks on disk I/O: thousands of conversations can
+wait on the database at once while only DB_EXECUTOR_WORKERS threads
+(each with its own pooled connection) touch SQLite. States already held
+in the store's cache are read without leaving the event loop.
+"""
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from config import DB_EXECUTOR_WORKERS
+from .state_store import states
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix='db')
+
+
+async def run_db(func, *args, **kwargs):
+    """Run a blocking database call on the DB executor and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+
+def shutdown_executor(wait: bool = True):
+    """Stop the DB executor (call after the event loop is done)."""
+    executor.shutdown(wait=wait)
+
+
+class AsyncStateStore:
+    """Async view of a StateStore.
+    
+    Reads of chats held in the store's LRU are served inline; misses,
+    expired dialogs (whose read deletes the state) and all writes go
+    through the DB executor.
+    """
+    
+    def __init__(self, store):
+        self.store = store
+    
+    async def get_state(self, chat_id: int):
+        entry = self.store.cached(chat_id)
+        if entry is not None:
+            return entry.state
+        return await run_db(self.store.get_state, chat_id)
+    
+    async def get_data(self, chat_id: int) -> dict:
+        entry = self.store.cached(chat_id)
+        if entry is not None:
+            return dict(entry.data)
+        return await run_db(self.store.get_data, chat_id)
+    
+    async def has_state(self, chat_id: int) -> bool:
+        entry = self.store.cached(chat_id)
+        if entry is not None:
+            return entry.state is not None
+        return await run_db(self.store.has_state, chat_id)
+    
+    async def set_state(self, chat_id: int, state: str, data: dict = None):
+        await run_db(self.store.set_state, chat_id, state, data)
+    
+    async def update_data(self, chat_id: int, **values):
+        await run_db(self.store.update_data, chat_id, **values)
+    
+    async def clear(self, chat_id: int):
+        await run_db(self.store.clear, chat_id)
+
+
+# Async view of the shared store used by the handlers
+async_states = AsyncStateStore(states)
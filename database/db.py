@@ -1,82 +1,373 @@
-"""Database connection and initialization."""
+"""Database connection and initialization.
+
+Storage is pluggable: the models only use connection() / transaction()
+and a few dialect attributes of the active backend, so SQLite (default)
+and MySQL can be swapped with DB_BACKEND without touching the handlers.
+"""
 import sqlite3
 import logging
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 
+from config import DB_BACKEND, MYSQL_SETTINGS
+from utils.timezones import DEFAULT_NOTIFY_HOUR, DEFAULT_TIMEZONE, notification_columns
+
 logger = logging.getLogger(__name__)
 
 # Database file path
 DB_FILE = Path(__file__).parent.parent / 'birthdays.db'
 
+# Applied once per connection when it is opened
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('foreign_keys', 'ON'),
+    ('mmap_size', 256 * 1024 * 1024),
+    ('cache_size', -16000),  # Negative value = size in KiB
+    ('temp_store', 'MEMORY'),
+    ('busy_timeout', 5000),
+)
+
+
+class StorageBackend:
+    """Interface of a storage backend.
+    
+    Connections yielded by connection() and transaction() behave like
+    sqlite3 connections: execute(sql, params) takes `?` placeholders and
+    returns a cursor with fetchone/fetchall/iteration, rowcount and
+    lastrowid; rows are addressed by column name and dates come back as
+    ISO strings. SQL that differs between engines goes through the
+    dialect attributes below.
+    """
+    
+    name = None
+    # Prefix of an INSERT that skips rows violating a unique key
+    insert_ignore = 'INSERT OR IGNORE'
+    
+    def values_row(self, width: int) -> str:
+        """One row of a VALUES table constructor with `width` placeholders."""
+        return '(' + ', '.join('?' * width) + ')'
+    
+    def describe(self) -> str:
+        """Human-readable location of the database, for logs."""
+        return self.name
+    
+    def get(self):
+        """Get the connection bound to the current thread."""
+        raise NotImplementedError
+    
+    def in_transaction(self) -> bool:
+        """Check whether the current thread is inside transaction()."""
+        return getattr(self._local, 'depth', 0) > 0
+    
+    def connection(self):
+        """Context manager yielding a connection for reads."""
+        raise NotImplementedError
+    
+    def transaction(self):
+        """Context manager yielding a connection inside a write transaction."""
+        raise NotImplementedError
+    
+    def init_schema(self):
+        """Create missing tables and indexes and migrate old ones."""
+        raise NotImplementedError
+    
+    def close_all(self):
+        """Close every connection opened by this backend."""
+        raise NotImplementedError
+
+
+class SQLiteBackend(StorageBackend):
+    """Keeps one configured SQLite connection alive per thread.
+    
+    Connections are opened lazily on first use in a thread and reused by
+    every later call from that thread, so handlers no longer pay for a
+    file open and PRAGMA setup on each query.
+    """
+    
+    name = 'sqlite'
+    
+    def __init__(self, db_file=DB_FILE, pragmas=PRAGMAS):
+        self.db_file = db_file
+        self.pragmas = pragmas
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # thread ident -> (thread, connection), used for cleanup
+        self._connections = {}
+        self._trace = None
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open and configure a new connection for the current thread."""
+        # isolation_level=None: autocommit reads, explicit BEGIN for writes
+        conn = sqlite3.connect(self.db_file, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row  # Access columns by name
+        for name, value in self.pragmas:
+            conn.execute(f'PRAGMA {name} = {value}')
+        
+        thread = threading.current_thread()
+        with self._lock:
+            self._prune_dead_threads()
+            self._connections[thread.ident] = (thread, conn)
+            conn.set_trace_callback(self._trace)
+        return conn
+    
+    def set_trace(self, callback):
+        """Trace every statement run on this backend's connections.
+        
+        callback(sql) is installed on the open connections and on those
+        opened later; None turns tracing off. Meant for benchmarks and
+        debugging: it slows every query down.
+        """
+        with self._lock:
+            self._trace = callback
+            for thread, conn in self._connections.values():
+                conn.set_trace_callback(callback)
+    
+    def _prune_dead_threads(self):
+        """Close connections owned by threads that have exited."""
+        for ident, (thread, conn) in list(self._connections.items()):
+            if not thread.is_alive():
+                conn.close()
+                del self._connections[ident]
+    
+    def get(self) -> sqlite3.Connection:
+        """Get the connection bound to the current thread."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+    
+    @contextmanager
+    def connection(self):
+        """Context manager yielding the thread's connection for reads."""
+        yield self.get()
+    
+    @contextmanager
+    def transaction(self):
+        """Context manager wrapping the block in a write transaction.
+        
+        Nested blocks join the outermost transaction; only the outermost
+        one commits or rolls back.
+        """
+        conn = self.get()
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+        
+        conn.execute('BEGIN IMMEDIATE')
+        self._local.depth = 1
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+        finally:
+            self._local.depth = 0
+    
+    def close_all(self):
+        """Close every connection opened by this manager."""
+        with self._lock:
+            for thread, conn in self._connections.values():
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+    
+    def describe(self) -> str:
+        return str(self.db_file)
+    
+    def init_schema(self):
+        with self.transaction() as conn:
+            _create_sqlite_schema(conn.cursor())
+
+
+# Name used before other backends existed
+ConnectionManager = SQLiteBackend
+
+
+def create_backend(name: str = DB_BACKEND) -> StorageBackend:
+    """Create the storage backend selected by DB_BACKEND."""
+    if name == 'sqlite':
+        return SQLiteBackend()
+    if name == 'mysql':
+        # Optional dependency, only imported when MySQL is selected
+        from .mysql_backend import MySQLBackend
+        return MySQLBackend(**MYSQL_SETTINGS)
+    raise ValueError(f"Unknown DB_BACKEND: {name!r} (expected 'sqlite' or 'mysql')")
+
+
+# Shared backend used by the models
+manager = create_backend()
+
+
+def backend() -> StorageBackend:
+    """Get the active storage backend (for its SQL dialect attributes)."""
+    return manager
+
+
 def get_connection():
-    """Get SQLite connection.
+    """Get the connection bound to the current thread.
+    
+    The connection is shared by later calls from the same thread and
+    must not be closed by the caller.
     
     Returns:
         Database connection
     """
     try:
-        conn = sqlite3.connect(DB_FILE, check_same_thread=False)
-        conn.row_factory = sqlite3.Row  # Access columns by name
-        return conn
+        return manager.get()
     except Exception as e:
-        logger.error(f"Error connecting to database: {e}")
+        logger.error("Error connecting to database: %s", e)
         raise
 
+
+def connection():
+    """Context manager yielding the pooled connection for reads."""
+    return manager.connection()
+
+
+def transaction():
+    """Context manager yielding the pooled connection inside a transaction."""
+    return manager.transaction()
+
+
+def close_all():
+    """Close all pooled connections (call on shutdown)."""
+    manager.close_all()
+
+
+def _migrate_month_day(cursor):
+    """Add and backfill the MMDD sort key on databases created before it existed."""
+    columns = {row['name'] for row in cursor.execute('PRAGMA table_info(birthdays)')}
+    if 'month_day' in columns:
+        return
+    
+    cursor.execute('ALTER TABLE birthdays ADD COLUMN month_day INTEGER')
+    cursor.execute(
+        "UPDATE birthdays SET month_day = CAST(strftime('%m%d', birth_date) AS INTEGER)"
+    )
+    logger.info("Migrated birthdays: backfilled month_day for %s rows", cursor.rowcount)
+
+
+def _migrate_notification_columns(cursor):
+    """Add the per-user notification time columns, filled with the defaults."""
+    columns = {row['name'] for row in cursor.execute('PRAGMA table_info(users)')}
+    if 'notify_slot' in columns:
+        return
+    
+    for column in ('timezone TEXT', 'notify_hour INTEGER', 'utc_offset_minutes INTEGER', 'notify_slot INTEGER'):
+        cursor.execute(f'ALTER TABLE users ADD COLUMN {column}')
+    cursor.execute(
+        '''UPDATE users SET timezone = :timezone, notify_hour = :notify_hour,
+               utc_offset_minutes = :utc_offset_minutes, notify_slot = :notify_slot''',
+        notification_columns(DEFAULT_TIMEZONE, DEFAULT_NOTIFY_HOUR)
+    )
+    logger.info("Migrated users: default notification time set for %s rows", cursor.rowcount)
+
+
+def _create_sqlite_schema(cursor):
+    """Create the SQLite tables and indexes."""
+    # Users table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            telegram_id INTEGER UNIQUE NOT NULL,
+            username TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            timezone TEXT,
+            notify_hour INTEGER,
+            utc_offset_minutes INTEGER,
+            notify_slot INTEGER
+        )
+    ''')
+    
+    _migrate_notification_columns(cursor)
+    
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_telegram_id ON users(telegram_id)')
+    # Scheduler tick: users whose local notification hour falls in a UTC slot
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_users_notify_slot ON users(notify_slot, utc_offset_minutes)'
+    )
+    # Offset refresh after DST changes reads the distinct zones from this index
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_users_timezone ON users(timezone, notify_hour, utc_offset_minutes)'
+    )
+    
+    # Birthdays table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS birthdays (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            friend_name TEXT NOT NULL,
+            birth_date DATE NOT NULL,
+            birth_year INTEGER,
+            remind_days_before INTEGER DEFAULT 1,
+            month_day INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    ''')
+    
+    _migrate_month_day(cursor)
+    
+    # (user_id, month_day) serves per-user lookups, the sorted list
+    # and the upcoming range scan, so the plain user_id index is dropped
+    cursor.execute('DROP INDEX IF EXISTS idx_user_id')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_month_day ON birthdays(user_id, month_day)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_birth_date ON birthdays(birth_date)')
+    # Daily scheduler scan: birthdays and reminders due on a date
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_month_day_remind ON birthdays(month_day, remind_days_before)'
+    )
+    
+    # User states table for persistent state management
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_states (
+            telegram_id INTEGER PRIMARY KEY,
+            state TEXT,
+            data TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_updated ON user_states(updated_at)')
+    
+    # Ledger of delivered scheduler notifications (makes daily runs resumable)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS notifications_sent (
+            birthday_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            target_date DATE NOT NULL,
+            sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (birthday_id, kind, target_date)
+        ) WITHOUT ROWID
+    ''')
+    
+    # One run per UTC date and send slot
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scheduler_slots (
+            run_date DATE NOT NULL,
+            slot INTEGER NOT NULL,
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            completed_at TIMESTAMP,
+            PRIMARY KEY (run_date, slot)
+        ) WITHOUT ROWID
+    ''')
+
+
 def init_db():
     """Initialize database tables."""
-    conn = None
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        # Users table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                telegram_id INTEGER UNIQUE NOT NULL,
-                username TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_telegram_id ON users(telegram_id)')
-        
-        # Birthdays table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS birthdays (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                friend_name TEXT NOT NULL,
-                birth_date DATE NOT NULL,
-                birth_year INTEGER,
-                remind_days_before INTEGER DEFAULT 1,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-        ''')
-        
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_id ON birthdays(user_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_birth_date ON birthdays(birth_date)')
-        
-        # User states table for persistent state management
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_states (
-                telegram_id INTEGER PRIMARY KEY,
-                state TEXT,
-                data TEXT,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_updated ON user_states(updated_at)')
-        
-        conn.commit()
-        logger.info(f"Database initialized successfully at {DB_FILE}")
+        manager.init_schema()
+        logger.info("Database initialized successfully at %s", manager.describe())
     except Exception as e:
-        logger.error(f"Error initializing database: {e}")
-        if conn:
-            conn.rollback()
+        logger.error("Error initializing database: %s", e)
         raise
-    finally:
-        if conn:
-            conn.close()
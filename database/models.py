@@ -1,119 +1,359 @@
 """Database models for users and birthdays."""
 import logging
 import html
-from datetime import datetime, date
-from .db import get_connection
-from utils.date_helpers import days_until_birthday
+from datetime import date, timedelta
+from functools import lru_cache
+from .db import connection, transaction, backend
+from .write_coalescer import writes
+from config import USER_CACHE_SIZE
+from utils.lru import LRUCache, MISSING
+from utils.metrics import timed_queries
+from utils.date_helpers import (
+    date_table,
+    month_day_key,
+    celebrated_month_days,
+    upcoming_month_day_ranges
+)
+from utils.timezones import (
+    DEFAULT_NOTIFY_HOUR,
+    DEFAULT_TIMEZONE,
+    notification_columns,
+    send_slot,
+    utc_offset_minutes
+)
 
 logger = logging.getLogger(__name__)
 
 # Constants
 MAX_BIRTHDAYS_PER_USER = 500  # Limit to prevent abuse
+MAX_REMIND_DAYS = 365  # Longest possible gap until a birthday
 
+# Notification kinds recorded in the ledger
+KIND_BIRTHDAY = 'birthday'
+KIND_REMINDER = 'reminder'
+
+# Bound parameters per statement on SQLite builds before 3.32
+MAX_SQL_PARAMS = 999
+
+
+@lru_cache(maxsize=8)
+def _reminder_targets(today: date) -> tuple:
+    """(month_day, days_before, target_date) rows of the reminders due on a date.
+    
+    Cached: the scheduler asks for the same few local dates for every
+    slot and UTC offset of a day.
+    
+    Returns:
+        Tuple of chunks, each a flat parameter tuple of at most
+        MAX_SQL_PARAMS values
+    """
+    today_keys = celebrated_month_days(today)
+    params = []
+    for days_before in range(1, MAX_REMIND_DAYS + 1):
+        target_date = today + timedelta(days=days_before)
+        for key in celebrated_month_days(target_date):
+            # A full year ahead lands on today's own birthdays again
+            if key not in today_keys:
+                params.extend((key, days_before, target_date.isoformat()))
+    
+    # Whole rows, leaving room for the kind and slot parameters
+    size = MAX_SQL_PARAMS - MAX_SQL_PARAMS % 3 - 3
+    return tuple(tuple(params[i:i + size]) for i in range(0, len(params), size))
+
+@timed_queries
 class UserDB:
-    """User database operations."""
+    """User database operations (public methods are timed in bot_db_query_seconds)."""
+    
+    # telegram_id -> users.id; the mapping never changes once created
+    cache = LRUCache(USER_CACHE_SIZE)
     
     @staticmethod
     def create_or_get(telegram_id: int, username: str = None) -> int:
-        """Create user or get existing user ID."""
-        conn = None
+        """Create user or get existing user ID.
+        
+        Served from an in-process LRU after the first lookup. New users are
+        inserted with an atomic insert-or-ignore, so concurrent first
+        messages from the same user cannot race on the UNIQUE constraint.
+        """
+        user_id = UserDB.cache.get(telegram_id)
+        if user_id is not MISSING:
+            return user_id
+        
         try:
-            conn = get_connection()
-            cursor = conn.cursor()
-            
-            # Try to get existing user
-            cursor.execute(
-                "SELECT id FROM users WHERE telegram_id = ?",
-                (telegram_id,)
-            )
-            result = cursor.fetchone()
+            with connection() as conn:
+                # Try to get existing user
+                result = conn.execute(
+                    "SELECT id FROM users WHERE telegram_id = ?",
+                    (telegram_id,)
+                ).fetchone()
             
             if result:
-                return result['id']
+                user_id = result['id']
+            else:
+                # Create new user
+                defaults = notification_columns(DEFAULT_TIMEZONE, DEFAULT_NOTIFY_HOUR)
+                with transaction() as conn:
+                    cursor = conn.execute(
+                        f'''{backend().insert_ignore} INTO users
+                            (telegram_id, username, timezone, notify_hour, utc_offset_minutes, notify_slot)
+                            VALUES (?, ?, ?, ?, ?, ?)''',
+                        (telegram_id, username, defaults['timezone'], defaults['notify_hour'],
+                         defaults['utc_offset_minutes'], defaults['notify_slot'])
+                    )
+                    
+                    if cursor.rowcount == 1:
+                        user_id = cursor.lastrowid
+                        logger.info("Created new user: %s", telegram_id)
+                    else:
+                        # Another thread or process inserted it first
+                        user_id = conn.execute(
+                            "SELECT id FROM users WHERE telegram_id = ?",
+                            (telegram_id,)
+                        ).fetchone()['id']
             
-            # Create new user
-            cursor.execute(
-                "INSERT INTO users (telegram_id, username) VALUES (?, ?)",
-                (telegram_id, username)
-            )
-            user_id = cursor.lastrowid
-            conn.commit()
-            logger.info(f"Created new user: {telegram_id}")
+            UserDB.cache.set(telegram_id, user_id)
             return user_id
-                
+        
+        except Exception as e:
+            logger.error("Error in create_or_get user: %s", e)
+            raise
+    
+    @staticmethod
+    def cache_stats() -> dict:
+        """Get size and hit/miss counters of the telegram_id cache."""
+        return UserDB.cache.stats()
+    
+    @staticmethod
+    def get_notification_settings(user_id: int) -> dict:
+        """Get a user's notification timezone and local hour.
+        
+        Returns:
+            Dict with timezone and notify_hour
+        """
+        try:
+            with connection() as conn:
+                result = conn.execute(
+                    "SELECT timezone, notify_hour FROM users WHERE id = ?",
+                    (user_id,)
+                ).fetchone()
+            if result is None:
+                return {'timezone': DEFAULT_TIMEZONE, 'notify_hour': DEFAULT_NOTIFY_HOUR}
+            return dict(result)
+        except Exception as e:
+            logger.error("Error getting notification settings: %s", e)
+            raise
+    
+    @staticmethod
+    def set_notification_settings(user_id: int, timezone: str = None, notify_hour: int = None) -> dict:
+        """Change a user's notification timezone and/or local hour.
+        
+        The UTC offset and send slot are recomputed, so the scheduler
+        picks the user up in the slot of the new local time.
+        
+        Returns:
+            Dict with the new timezone and notify_hour
+        """
+        try:
+            with transaction() as conn:
+                current = conn.execute(
+                    "SELECT timezone, notify_hour FROM users WHERE id = ?",
+                    (user_id,)
+                ).fetchone()
+                columns = notification_columns(timezone or current['timezone'],
+                                               current['notify_hour'] if notify_hour is None else notify_hour)
+                conn.execute(
+                    '''UPDATE users SET timezone = ?, notify_hour = ?, utc_offset_minutes = ?, notify_slot = ?
+                       WHERE id = ?''',
+                    (columns['timezone'], columns['notify_hour'], columns['utc_offset_minutes'],
+                     columns['notify_slot'], user_id)
+                )
+            logger.info("User %s notifications set to %s:00 %s", user_id, columns['notify_hour'], columns['timezone'])
+            return {'timezone': columns['timezone'], 'notify_hour': columns['notify_hour']}
+        except Exception as e:
+            logger.error("Error setting notification settings: %s", e)
+            raise
+    
+    @staticmethod
+    def offsets_in_slot(slot: int) -> list:
+        """Get the distinct UTC offsets of users notified in a send slot.
+        
+        Served from the (notify_slot, utc_offset_minutes) index alone.
+        """
+        try:
+            with connection() as conn:
+                rows = conn.execute(
+                    "SELECT DISTINCT utc_offset_minutes FROM users WHERE notify_slot = ?",
+                    (slot,)
+                ).fetchall()
+            return [row['utc_offset_minutes'] for row in rows]
+        except Exception as e:
+            logger.error("Error reading offsets of slot %s: %s", slot, e)
+            raise
+    
+    @staticmethod
+    def refresh_utc_offsets(at=None) -> int:
+        """Move users whose timezone changed its UTC offset (DST) to their new slot.
+        
+        Reads the distinct (timezone, notify_hour, offset) groups from the
+        idx_users_timezone index and updates only the groups whose offset
+        differs at `at` (defaults to now).
+        
+        Returns:
+            Number of users moved
+        """
+        try:
+            with connection() as conn:
+                groups = conn.execute(
+                    "SELECT DISTINCT timezone, notify_hour, utc_offset_minutes FROM users"
+                ).fetchall()
+            
+            moved = 0
+            for group in groups:
+                try:
+                    offset = utc_offset_minutes(group['timezone'], at)
+                except ValueError as e:
+                    logger.error("Skipping users in unknown timezone: %s", e)
+                    continue
+                if offset == group['utc_offset_minutes']:
+                    continue
+                with transaction() as conn:
+                    moved += conn.execute(
+                        '''UPDATE users SET utc_offset_minutes = ?, notify_slot = ?
+                           WHERE timezone = ? AND notify_hour = ? AND utc_offset_minutes = ?''',
+                        (offset, send_slot(group['notify_hour'], offset),
+                         group['timezone'], group['notify_hour'], group['utc_offset_minutes'])
+                    ).rowcount
+            if moved:
+                logger.info("Moved %s users to new send slots after UTC offset changes", moved)
+            return moved
         except Exception as e:
-            logger.error(f"Error in create_or_get user: {e}")
-            if conn:
-                conn.rollback()
+            logger.error("Error refreshing UTC offsets: %s", e)
             raise
-        finally:
-            if conn:
-                conn.close()
 
+@timed_queries
 class BirthdayDB:
-    """Birthday database operations."""
+    """Birthday database operations (public methods are timed in bot_db_query_seconds)."""
+    
+    @staticmethod
+    def _insert(conn, user_id: int, friend_name: str, birth_date: date,
+                birth_year: int = None, remind_days: int = 1) -> int:
+        """Insert a birthday on `conn`, enforcing the per-user limit."""
+        # Check birthday count limit
+        result = conn.execute(
+            "SELECT COUNT(*) as count FROM birthdays WHERE user_id = ?",
+            (user_id,)
+        ).fetchone()
+        
+        if result['count'] >= MAX_BIRTHDAYS_PER_USER:
+            raise ValueError(f"Birthday limit reached ({MAX_BIRTHDAYS_PER_USER} max)")
+        
+        # Add birthday
+        cursor = conn.execute(
+            '''INSERT INTO birthdays
+               (user_id, friend_name, birth_date, birth_year, remind_days_before, month_day)
+               VALUES (?, ?, ?, ?, ?, ?)''',
+            (user_id, friend_name, birth_date.isoformat(), birth_year, remind_days,
+             month_day_key(birth_date))
+        )
+        return cursor.lastrowid
+    
+    @staticmethod
+    def _insert_many(conn, user_id: int, rows: list) -> int:
+        """Insert prepared birthday rows on `conn`, checking the limit once for all of them."""
+        result = conn.execute(
+            "SELECT COUNT(*) as count FROM birthdays WHERE user_id = ?",
+            (user_id,)
+        ).fetchone()
+        
+        if result['count'] + len(rows) > MAX_BIRTHDAYS_PER_USER:
+            raise ValueError(f"Birthday limit reached ({MAX_BIRTHDAYS_PER_USER} max)")
+        
+        conn.executemany(
+            '''INSERT INTO birthdays
+               (user_id, friend_name, birth_date, birth_year, remind_days_before, month_day)
+               VALUES (?, ?, ?, ?, ?, ?)''',
+            rows
+        )
+        return len(rows)
     
     @staticmethod
-    def add(user_id: int, friend_name: str, birth_date: date, 
+    def _delete(conn, birthday_id: int, user_id: int) -> bool:
+        """Delete a birthday on `conn` if it belongs to the user."""
+        cursor = conn.execute(
+            "DELETE FROM birthdays WHERE id = ? AND user_id = ?",
+            (birthday_id, user_id)
+        )
+        return cursor.rowcount > 0
+    
+    @staticmethod
+    def add(user_id: int, friend_name: str, birth_date: date,
             birth_year: int = None, remind_days: int = 1) -> int:
-        """Add new birthday with validation and limits."""
-        conn = None
+        """Add new birthday with validation and limits.
+        
+        Goes through the write coalescer, so concurrent adds and deletes
+        share a commit; the limit is still checked per call.
+        """
         try:
             # Sanitize friend name
             friend_name = html.escape(friend_name.strip())
             
-            conn = get_connection()
-            cursor = conn.cursor()
-            
-            # Check birthday count limit
-            cursor.execute(
-                "SELECT COUNT(*) as count FROM birthdays WHERE user_id = ?",
-                (user_id,)
-            )
-            result = cursor.fetchone()
-            
-            if result['count'] >= MAX_BIRTHDAYS_PER_USER:
-                raise ValueError(f"Birthday limit reached ({MAX_BIRTHDAYS_PER_USER} max)")
-            
-            # Add birthday
-            cursor.execute(
-                '''INSERT INTO birthdays 
-                   (user_id, friend_name, birth_date, birth_year, remind_days_before)
-                   VALUES (?, ?, ?, ?, ?)''',
-                (user_id, friend_name, birth_date.isoformat(), birth_year, remind_days)
+            birthday_id = writes.run(
+                BirthdayDB._insert, user_id, friend_name, birth_date, birth_year, remind_days
             )
-            birthday_id = cursor.lastrowid
-            conn.commit()
-            logger.info(f"Added birthday {birthday_id} for user {user_id}")
+            logger.info("Added birthday %s for user %s", birthday_id, user_id)
             return birthday_id
-                
+        
         except ValueError:
             raise  # Re-raise validation errors
         except Exception as e:
-            logger.error(f"Error adding birthday: {e}")
-            if conn:
-                conn.rollback()
+            logger.error("Error adding birthday: %s", e)
+            raise
+    
+    @staticmethod
+    def add_many(user_id: int, birthdays: list, remind_days: int = 1) -> int:
+        """Add a batch of validated birthdays in one transaction.
+        
+        The per-user limit is checked once for the whole batch: either
+        every birthday is added or, if they would not fit, none is.
+        
+        Args:
+            user_id: User ID
+            birthdays: (friend_name, birth_date, birth_year) tuples
+            remind_days: Reminder offset for every added birthday
+        
+        Returns:
+            Number of birthdays added
+        """
+        rows = [
+            (user_id, html.escape(friend_name.strip()), birth_date.isoformat(), birth_year,
+             remind_days, month_day_key(birth_date))
+            for friend_name, birth_date, birth_year in birthdays
+        ]
+        if not rows:
+            return 0
+        
+        try:
+            added = writes.run(BirthdayDB._insert_many, user_id, rows)
+            logger.info("Added %s birthdays for user %s", added, user_id)
+            return added
+        
+        except ValueError:
+            raise  # Re-raise validation errors
+        except Exception as e:
+            logger.error("Error adding birthdays: %s", e)
             raise
-        finally:
-            if conn:
-                conn.close()
     
     @staticmethod
     def get_all(user_id: int) -> list:
         """Get all birthdays for a user."""
-        conn = None
         try:
-            conn = get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                '''SELECT id, friend_name, birth_date, birth_year, remind_days_before
-                   FROM birthdays WHERE user_id = ?
-                   ORDER BY strftime('%m-%d', birth_date)''',
-                (user_id,)
-            )
-            
-            results = cursor.fetchall()
+            with connection() as conn:
+                results = conn.execute(
+                    '''SELECT id, friend_name, birth_date, birth_year, remind_days_before
+                       FROM birthdays WHERE user_id = ?
+                       ORDER BY month_day, id''',
+                    (user_id,)
+                ).fetchall()
             
             # Convert to list of dicts and parse dates
             birthdays = []
@@ -123,75 +363,333 @@ class BirthdayDB:
                 birthdays.append(bd)
             
             return birthdays
+        
+        except Exception as e:
+            logger.error("Error getting birthdays: %s", e)
+            raise
+    
+    @staticmethod
+    def count(user_id: int) -> int:
+        """Count a user's birthdays (an index-only scan)."""
+        try:
+            with connection() as conn:
+                result = conn.execute(
+                    "SELECT COUNT(*) as count FROM birthdays WHERE user_id = ?",
+                    (user_id,)
+                ).fetchone()
+            return result['count']
+        except Exception as e:
+            logger.error("Error counting birthdays: %s", e)
+            raise
+    
+    @staticmethod
+    def get_page(user_id: int, limit: int, after: tuple = None, before: tuple = None) -> tuple:
+        """Get one page of a user's birthdays in list order (month_day, id).
+        
+        Keyset pagination: the page starts right after the `after` key or
+        ends right before the `before` key, so every page is a single
+        range read on the (user_id, month_day) index, however deep it is.
+        
+        Args:
+            user_id: User ID
+            limit: Page size
+            after: (month_day, id) of the last row of the previous page
+            before: (month_day, id) of the first row of the next page
+        
+        Returns:
+            (rows, has_more) tuple; rows are in list order and include
+            month_day, has_more tells whether more rows exist past the
+            page in the direction read
+        """
+        if after is not None:
+            condition, params, order = 'AND (month_day, id) > (?, ?)', list(after), 'month_day, id'
+        elif before is not None:
+            condition, params, order = 'AND (month_day, id) < (?, ?)', list(before), 'month_day DESC, id DESC'
+        else:
+            condition, params, order = '', [], 'month_day, id'
+        
+        try:
+            with connection() as conn:
+                results = conn.execute(
+                    f'''SELECT id, friend_name, birth_date, birth_year, remind_days_before, month_day
+                        FROM birthdays WHERE user_id = ? {condition}
+                        ORDER BY {order} LIMIT ?''',
+                    [user_id, *params, limit + 1]
+                ).fetchall()
+            
+            birthdays = []
+            for row in results[:limit]:
+                bd = dict(row)
+                bd['birth_date'] = date.fromisoformat(bd['birth_date'])
+                birthdays.append(bd)
+            if before is not None:
+                birthdays.reverse()
             
+            return birthdays, len(results) > limit
         except Exception as e:
-            logger.error(f"Error getting birthdays: {e}")
+            logger.error("Error getting birthday page: %s", e)
+            raise
+    
+    @staticmethod
+    def iter_all(user_id: int):
+        """Stream all birthdays of a user in list order, one row at a time.
+        
+        Yields:
+            Dicts with id, friend_name, birth_date, birth_year and
+            remind_days_before (as in get_all)
+        """
+        try:
+            with connection() as conn:
+                cursor = conn.execute(
+                    '''SELECT id, friend_name, birth_date, birth_year, remind_days_before
+                       FROM birthdays WHERE user_id = ?
+                       ORDER BY month_day, id''',
+                    (user_id,)
+                )
+                for row in cursor:
+                    bd = dict(row)
+                    bd['birth_date'] = date.fromisoformat(bd['birth_date'])
+                    yield bd
+        except Exception as e:
+            logger.error("Error streaming birthdays: %s", e)
             raise
-        finally:
-            if conn:
-                conn.close()
     
     @staticmethod
     def delete(birthday_id: int, user_id: int) -> bool:
         """Delete birthday by ID."""
-        conn = None
         try:
-            conn = get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                "DELETE FROM birthdays WHERE id = ? AND user_id = ?",
-                (birthday_id, user_id)
-            )
-            conn.commit()
-            deleted = cursor.rowcount > 0
+            deleted = writes.run(BirthdayDB._delete, birthday_id, user_id)
             if deleted:
-                logger.info(f"Deleted birthday {birthday_id} for user {user_id}")
+                logger.info("Deleted birthday %s for user %s", birthday_id, user_id)
             return deleted
         except Exception as e:
-            logger.error(f"Error deleting birthday: {e}")
-            if conn:
-                conn.rollback()
+            logger.error("Error deleting birthday: %s", e)
             raise
-        finally:
-            if conn:
-                conn.close()
     
     @staticmethod
     def get_upcoming(user_id: int, days: int = 30) -> list:
-        """Get upcoming birthdays within specified days."""
-        conn = None
+        """Get upcoming birthdays within specified days.
+        
+        Each MMDD range is read off the (user_id, month_day) index in
+        order, so only matching rows are loaded and they come back
+        already sorted by days left.
+        """
         try:
-            conn = get_connection()
-            cursor = conn.cursor()
+            today = date.today()
+            ranges = upcoming_month_day_ranges(days, today)
             
-            # Get all birthdays for user
-            cursor.execute(
-                '''SELECT id, friend_name, birth_date, birth_year
-                   FROM birthdays WHERE user_id = ?''',
-                (user_id,)
-            )
-            all_birthdays = cursor.fetchall()
+            # Each arm is ordered by the index; SQLite's UNION ALL keeps arm order
+            arm = '''SELECT * FROM (
+                         SELECT id, friend_name, birth_date, birth_year, month_day
+                         FROM birthdays
+                         WHERE user_id = ? AND month_day BETWEEN ? AND ?
+                         ORDER BY month_day, id) AS arm'''
+            query = ' UNION ALL '.join([arm] * len(ranges))
+            params = [value for low, high in ranges for value in (user_id, low, high)]
             
-            # Filter using date_helpers for consistency
-            today = date.today()
-            upcoming = []
+            with connection() as conn:
+                results = conn.execute(query, params).fetchall()
             
-            for row in all_birthdays:
+            # One table lookup per row instead of building dates
+            days_until = date_table(today).days_until
+            upcoming = []
+            for row in results:
                 bd = dict(row)
                 bd['birth_date'] = date.fromisoformat(bd['birth_date'])
-                days_until = days_until_birthday(bd['birth_date'], today)
-                
-                if 0 <= days_until <= days:
-                    upcoming.append(bd)
-            
-            # Sort by days until birthday
-            upcoming.sort(key=lambda x: days_until_birthday(x['birth_date'], today))
+                bd['days_until'] = days_until(bd['month_day'])
+                upcoming.append(bd)
             
+            # Other engines may drop ORDER BY inside derived tables; for SQLite
+            # the rows are already in this order and the sort is a linear pass
+            upcoming.sort(key=lambda bd: (bd['days_until'], bd['month_day'], bd['id']))
             return upcoming
         except Exception as e:
-            logger.error(f"Error getting upcoming birthdays: {e}")
+            logger.error("Error getting upcoming birthdays: %s", e)
+            raise
+    
+    @staticmethod
+    def _slot_filter(slot: int, utc_offset: int) -> tuple:
+        """SQL condition on the users joined as `u` selecting one send slot.
+        
+        Matches the idx_users_notify_slot index, so a scheduler tick reads
+        only the users whose local notification time falls in the slot.
+        
+        Returns:
+            (sql, params); empty when slot is None
+        """
+        if slot is None:
+            return '', []
+        return ' AND u.notify_slot = ? AND u.utc_offset_minutes = ?', [slot, utc_offset]
+    
+    @staticmethod
+    def iter_birthdays_on(target_date: date, slot: int = None, utc_offset: int = None):
+        """Stream birthdays celebrated on a date.
+        
+        Rows are read from the (month_day, remind_days_before) index and
+        yielded one at a time, so memory does not grow with table size.
+        Birthdays already recorded in the notification ledger are skipped.
+        With `slot` and `utc_offset`, only users notified in that send slot
+        with that UTC offset are read (see _slot_filter).
+        
+        Yields:
+            Dicts with id, friend_name, birth_date, birth_year, telegram_id
+            and ledger_key (see NotificationDB.mark_sent)
+        """
+        keys = celebrated_month_days(target_date)
+        placeholders = ', '.join('?' * len(keys))
+        target = target_date.isoformat()
+        user_filter, user_params = BirthdayDB._slot_filter(slot, utc_offset)
+        try:
+            with connection() as conn:
+                cursor = conn.execute(
+                    f'''SELECT b.id, b.friend_name, b.birth_date, b.birth_year, u.telegram_id
+                        FROM birthdays b
+                        JOIN users u ON u.id = b.user_id
+                        WHERE b.month_day IN ({placeholders})
+                        AND NOT EXISTS (
+                            SELECT 1 FROM notifications_sent n
+                            WHERE n.birthday_id = b.id AND n.kind = ? AND n.target_date = ?
+                        ){user_filter}''',
+                    [*keys, KIND_BIRTHDAY, target, *user_params]
+                )
+                for row in cursor:
+                    bd = dict(row)
+                    bd['birth_date'] = date.fromisoformat(bd['birth_date'])
+                    bd['ledger_key'] = (bd['id'], KIND_BIRTHDAY, target)
+                    yield bd
+        except Exception as e:
+            logger.error("Error streaming birthdays for %s: %s", target_date, e)
+            raise
+    
+    @staticmethod
+    def iter_reminders_due(today: date, slot: int = None, utc_offset: int = None):
+        """Stream birthdays whose reminder (birthday minus remind_days_before) is today.
+        
+        One (month_day, remind_days_before) index lookup is made per
+        possible offset, so the cost depends on the number of reminders
+        due, not on the number of stored birthdays. The offsets come from
+        _reminder_targets, built once per date and bound in statements
+        of at most MAX_SQL_PARAMS parameters. Reminders already
+        recorded in the notification ledger are skipped. `slot` and
+        `utc_offset` restrict the users as in iter_birthdays_on.
+        
+        Yields:
+            Dicts with id, friend_name, birth_date, remind_days_before,
+            telegram_id, target_date (the upcoming birthday date) and
+            ledger_key (see NotificationDB.mark_sent)
+        """
+        user_filter, user_params = BirthdayDB._slot_filter(slot, utc_offset)
+        try:
+            for params in _reminder_targets(today):
+                values = ', '.join([backend().values_row(3)] * (len(params) // 3))
+                with connection() as conn:
+                    cursor = conn.execute(
+                        f'''WITH targets(month_day, days_before, target_date) AS (VALUES {values})
+                            SELECT b.id, b.friend_name, b.birth_date, b.remind_days_before,
+                                   u.telegram_id, t.target_date
+                            FROM targets t
+                            JOIN birthdays b
+                              ON b.month_day = t.month_day AND b.remind_days_before = t.days_before
+                            JOIN users u ON u.id = b.user_id
+                            WHERE NOT EXISTS (
+                                SELECT 1 FROM notifications_sent n
+                                WHERE n.birthday_id = b.id AND n.kind = ? AND n.target_date = t.target_date
+                            ){user_filter}''',
+                        [*params, KIND_REMINDER, *user_params]
+                    )
+                    for row in cursor:
+                        bd = dict(row)
+                        bd['birth_date'] = date.fromisoformat(bd['birth_date'])
+                        bd['ledger_key'] = (bd['id'], KIND_REMINDER, bd['target_date'])
+                        bd['target_date'] = date.fromisoformat(bd['target_date'])
+                        yield bd
+        except Exception as e:
+            logger.error("Error streaming reminders for %s: %s", today, e)
+            raise
+
+class NotificationDB:
+    """Ledger of delivered scheduler notifications and slot runs.
+    
+    Lets an interrupted or missed check resume without sending anything
+    twice: delivered notifications are recorded per (birthday_id, kind,
+    target_date) and excluded by the BirthdayDB iter_* queries; the run
+    of a (UTC date, send slot) is marked complete once nothing is left.
+    """
+    
+    @staticmethod
+    def mark_sent(ledger_keys: list):
+        """Record delivered notifications.
+        
+        Args:
+            ledger_keys: (birthday_id, kind, target_date) tuples
+        """
+        if not ledger_keys:
+            return
+        try:
+            with transaction() as conn:
+                conn.executemany(
+                    f'''{backend().insert_ignore} INTO notifications_sent (birthday_id, kind, target_date)
+                        VALUES (?, ?, ?)''',
+                    ledger_keys
+                )
+        except Exception as e:
+            logger.error("Error recording sent notifications: %s", e)
+            raise
+    
+    @staticmethod
+    def start_run(run_date: date, slot: int):
+        """Register the run of a send slot (no-op if it was already started)."""
+        try:
+            with transaction() as conn:
+                conn.execute(
+                    f"{backend().insert_ignore} INTO scheduler_slots (run_date, slot) VALUES (?, ?)",
+                    (run_date.isoformat(), slot)
+                )
+        except Exception as e:
+            logger.error("Error starting scheduler run: %s", e)
+            raise
+    
+    @staticmethod
+    def complete_run(run_date: date, slot: int):
+        """Mark the run of a send slot as fully delivered."""
+        try:
+            with transaction() as conn:
+                conn.execute(
+                    "UPDATE scheduler_slots SET completed_at = CURRENT_TIMESTAMP WHERE run_date = ? AND slot = ?",
+                    (run_date.isoformat(), slot)
+                )
+        except Exception as e:
+            logger.error("Error completing scheduler run: %s", e)
+            raise
+    
+    @staticmethod
+    def completed_runs(since: date) -> set:
+        """Get the (run_date, slot) pairs delivered completely since a date."""
+        try:
+            with connection() as conn:
+                rows = conn.execute(
+                    "SELECT run_date, slot FROM scheduler_slots WHERE run_date >= ? AND completed_at IS NOT NULL",
+                    (since.isoformat(),)
+                ).fetchall()
+            return {(date.fromisoformat(row['run_date']), row['slot']) for row in rows}
+        except Exception as e:
+            logger.error("Error reading scheduler runs: %s", e)
+            raise
+    
+    @staticmethod
+    def prune(before: date) -> int:
+        """Delete ledger entries and runs older than a date."""
+        try:
+            with transaction() as conn:
+                deleted = conn.execute(
+                    "DELETE FROM notifications_sent WHERE target_date < ?",
+                    (before.isoformat(),)
+                ).rowcount
+                conn.execute(
+                    "DELETE FROM scheduler_slots WHERE run_date < ?",
+                    (before.isoformat(),)
+                )
+            return deleted
+        except Exception as e:
+            logger.error("Error pruning notification ledger: %s", e)
             raise
-        finally:
-            if conn:
-                conn.close()
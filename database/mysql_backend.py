@@ -0,0 +1,327 @@
+"""MySQL storage backend (requires mysql-connector-python).
+
+Connections come from a fixed-size MySQLConnectionPool and every
+statement runs as a server-side prepared statement. Prepared statements
+are cached per connection, so hot queries are parsed by the server once
+per connection instead of once per call.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from utils.timezones import DEFAULT_NOTIFY_HOUR, DEFAULT_TIMEZONE, notification_columns
+
+from .db import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+# Prepared statements kept open per pooled connection
+STATEMENT_CACHE_SIZE = 64
+
+SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS users (
+           id INT AUTO_INCREMENT PRIMARY KEY,
+           telegram_id BIGINT NOT NULL,
+           username VARCHAR(255),
+           created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+           timezone VARCHAR(64),
+           notify_hour TINYINT,
+           utc_offset_minutes SMALLINT,
+           notify_slot SMALLINT,
+           UNIQUE KEY idx_telegram_id (telegram_id),
+           KEY idx_users_notify_slot (notify_slot, utc_offset_minutes),
+           KEY idx_users_timezone (timezone, notify_hour, utc_offset_minutes)
+       ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4''',
+    # friend_name holds HTML-escaped names (up to 6x the 100 character limit)
+    '''CREATE TABLE IF NOT EXISTS birthdays (
+           id INT AUTO_INCREMENT PRIMARY KEY,
+           user_id INT NOT NULL,
+           friend_name VARCHAR(600) NOT NULL,
+           birth_date DATE NOT NULL,
+           birth_year SMALLINT,
+           remind_days_before SMALLINT DEFAULT 1,
+           month_day SMALLINT,
+           created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+           KEY idx_user_month_day (user_id, month_day),
+           KEY idx_month_day_remind (month_day, remind_days_before),
+           FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+       ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4''',
+    '''CREATE TABLE IF NOT EXISTS user_states (
+           telegram_id BIGINT PRIMARY KEY,
+           state VARCHAR(64),
+           data TEXT,
+           updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+           KEY idx_updated (updated_at)
+       ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4''',
+    '''CREATE TABLE IF NOT EXISTS notifications_sent (
+           birthday_id INT NOT NULL,
+           kind VARCHAR(16) NOT NULL,
+           target_date DATE NOT NULL,
+           sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+           PRIMARY KEY (birthday_id, kind, target_date)
+       ) ENGINE=InnoDB''',
+    # One run per UTC date and send slot
+    '''CREATE TABLE IF NOT EXISTS scheduler_slots (
+           run_date DATE NOT NULL,
+           slot SMALLINT NOT NULL,
+           started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+           completed_at TIMESTAMP NULL,
+           PRIMARY KEY (run_date, slot)
+       ) ENGINE=InnoDB''',
+)
+
+# Per-user notification time, for users tables created before it existed
+NOTIFICATION_COLUMNS_MIGRATION = '''
+    ALTER TABLE users
+        ADD COLUMN timezone VARCHAR(64),
+        ADD COLUMN notify_hour TINYINT,
+        ADD COLUMN utc_offset_minutes SMALLINT,
+        ADD COLUMN notify_slot SMALLINT,
+        ADD KEY idx_users_notify_slot (notify_slot, utc_offset_minutes),
+        ADD KEY idx_users_timezone (timezone, notify_hour, utc_offset_minutes)
+'''
+
+
+def _to_sqlite_value(value):
+    """Return column values the way sqlite3 does (dates as ISO strings)."""
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode()
+    return value
+
+
+class MySQLCursor:
+    """sqlite3-style view of a prepared cursor: rows are dicts keyed by column."""
+    
+    def __init__(self, cursor):
+        self._cursor = cursor
+    
+    def _row(self, values):
+        if values is None:
+            return None
+        return dict(zip(self._cursor.column_names, map(_to_sqlite_value, values)))
+    
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+    
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+    
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+    
+    def fetchall(self) -> list:
+        return [self._row(values) for values in self._cursor.fetchall()]
+    
+    def __iter__(self):
+        while True:
+            values = self._cursor.fetchone()
+            if values is None:
+                return
+            yield self._row(values)
+
+
+class MySQLConnection:
+    """Pooled connection exposing the sqlite3 interface used by the models.
+    
+    Statements use `?` placeholders, which MySQL prepared statements
+    accept natively.
+    """
+    
+    def __init__(self, pooled):
+        self.pooled = pooled
+    
+    @property
+    def _statements(self) -> OrderedDict:
+        # Lives on the physical connection so it survives pool round trips;
+        # a reconnect invalidates the server-side statements
+        raw = self.pooled._cnx
+        cache = getattr(raw, 'statement_cache', None)
+        if cache is None or cache.connection_id != raw.connection_id:
+            cache = OrderedDict()
+            cache.connection_id = raw.connection_id
+            raw.statement_cache = cache
+        return cache
+    
+    def _prepared(self, sql: str):
+        """Get a cursor holding `sql` prepared on this connection."""
+        statements = self._statements
+        entry = statements.get(sql)
+        if entry is None:
+            entry = (sql, self.pooled.cursor(prepared=True))
+            statements[sql] = entry
+            if len(statements) > STATEMENT_CACHE_SIZE:
+                _, (_, old_cursor) = statements.popitem(last=False)
+                old_cursor.close()
+        else:
+            statements.move_to_end(sql)
+        return entry
+    
+    def execute(self, sql: str, params=()) -> MySQLCursor:
+        # The cursor re-prepares unless it gets the very same string object
+        prepared_sql, cursor = self._prepared(sql)
+        cursor.execute(prepared_sql, tuple(params))
+        return MySQLCursor(cursor)
+    
+    def executemany(self, sql: str, seq_of_params) -> MySQLCursor:
+        prepared_sql, cursor = self._prepared(sql)
+        for params in seq_of_params:
+            cursor.execute(prepared_sql, tuple(params))
+        return MySQLCursor(cursor)
+    
+    def cursor(self):
+        return self
+    
+    def commit(self):
+        self.pooled.commit()
+    
+    def rollback(self):
+        self.pooled.rollback()
+
+
+class MySQLBackend(StorageBackend):
+    """Storage on a MySQL 8.0.19+ server through a fixed-size connection pool.
+    
+    A thread keeps the connection it checked out for the whole outermost
+    connection()/transaction() block, so nested blocks join it. When all
+    connections are busy, callers wait up to `pool_timeout` seconds
+    instead of failing straight away.
+    """
+    
+    name = 'mysql'
+    insert_ignore = 'INSERT IGNORE'
+    
+    def __init__(self, host: str = 'localhost', port: int = 3306, user: str = None,
+                 password: str = None, database: str = None, pool_size: int = 5,
+                 pool_timeout: float = 10.0):
+        self.config = {
+            'host': host,
+            'port': port,
+            'user': user,
+            'password': password,
+            'database': database,
+            'charset': 'utf8mb4',
+            'autocommit': True,  # Reads see fresh data; writes use explicit transactions
+            'consume_results': True,  # An abandoned streaming read must not block the next query
+        }
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._available = threading.BoundedSemaphore(pool_size)
+        self._local = threading.local()
+    
+    def describe(self) -> str:
+        return f"mysql://{self.config['host']}:{self.config['port']}/{self.config['database']}"
+    
+    def values_row(self, width: int) -> str:
+        return 'ROW(' + ', '.join('?' * width) + ')'
+    
+    def _get_pool(self):
+        # Created on first use so importing the models does not connect
+        with self._pool_lock:
+            if self._pool is None:
+                from mysql.connector import pooling
+                self._pool = pooling.MySQLConnectionPool(
+                    pool_name='bot_pool',
+                    pool_size=self.pool_size,
+                    # Resetting the session would drop the cached prepared statements
+                    pool_reset_session=False,
+                    **self.config
+                )
+                logger.info("MySQL pool of %s connections opened to %s", self.pool_size, self.describe())
+            return self._pool
+    
+    def get(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            raise RuntimeError("MySQL connections are only available inside connection() or transaction()")
+        return conn
+    
+    @contextmanager
+    def connection(self):
+        """Context manager yielding this thread's pooled connection."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+        
+        pool = self._get_pool()
+        if not self._available.acquire(timeout=self.pool_timeout):
+            raise TimeoutError(f"No MySQL connection available within {self.pool_timeout}s")
+        try:
+            conn = MySQLConnection(pool.get_connection())
+            self._local.conn = conn
+            self._local.depth = 0
+            try:
+                yield conn
+            finally:
+                self._local.conn = None
+                conn.pooled.close()  # Returns it to the pool
+        finally:
+            self._available.release()
+    
+    @contextmanager
+    def transaction(self):
+        """Context manager wrapping the block in a transaction (nested blocks join it)."""
+        with self.connection() as conn:
+            if self._local.depth:
+                self._local.depth += 1
+                try:
+                    yield conn
+                finally:
+                    self._local.depth -= 1
+                return
+            
+            conn.pooled.start_transaction()
+            self._local.depth = 1
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+            finally:
+                self._local.depth = 0
+    
+    def init_schema(self):
+        with self.connection() as conn:
+            cursor = conn.pooled.cursor()
+            try:
+                for statement in SCHEMA:
+                    cursor.execute(statement)
+                self._migrate_notification_columns(cursor)
+            finally:
+                cursor.close()
+    
+    @staticmethod
+    def _migrate_notification_columns(cursor):
+        """Add the per-user notification time columns, filled with the defaults."""
+        cursor.execute(
+            """SELECT COUNT(*) FROM information_schema.COLUMNS
+               WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'users' AND COLUMN_NAME = 'notify_slot'"""
+        )
+        if cursor.fetchone()[0]:
+            return
+        
+        cursor.execute(NOTIFICATION_COLUMNS_MIGRATION)
+        defaults = notification_columns(DEFAULT_TIMEZONE, DEFAULT_NOTIFY_HOUR)
+        cursor.execute(
+            'UPDATE users SET timezone = %s, notify_hour = %s, utc_offset_minutes = %s, notify_slot = %s',
+            (defaults['timezone'], defaults['notify_hour'], defaults['utc_offset_minutes'], defaults['notify_slot'])
+        )
+        logger.info("Migrated users: default notification time set for %s rows", cursor.rowcount)
+    
+    def close_all(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool._remove_connections()
+                self._pool = None
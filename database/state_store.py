@@ -0,0 +1,254 @@
+"""Persistent conversation state (FSM) storage."""
+import json
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from config import STATE_SETTINGS
+from utils.lru import LRUCache, MISSING
+from .db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+# state: FSM state name or None, data: dict, updated: unix time of last write
+StateEntry = namedtuple('StateEntry', ['state', 'data', 'updated'])
+EMPTY = StateEntry(None, {}, 0)
+
+
+class StateBackend:
+    """Interface of a persistent state backend."""
+    
+    def load(self, chat_id: int):
+        """Get the stored StateEntry for a chat, or None."""
+        raise NotImplementedError
+    
+    def save(self, chat_id: int, state: str, data: dict):
+        """Store the state and data of a chat."""
+        raise NotImplementedError
+    
+    def delete(self, chat_id: int):
+        """Remove the state of a chat."""
+        raise NotImplementedError
+    
+    def purge_expired(self, ttl: int) -> int:
+        """Remove states not updated for `ttl` seconds; return how many."""
+        raise NotImplementedError
+
+
+class MemoryStateBackend(StateBackend):
+    """Process-local backend (state is lost on restart)."""
+    
+    def __init__(self):
+        self._states = {}
+        self._lock = threading.Lock()
+    
+    def load(self, chat_id):
+        with self._lock:
+            return self._states.get(chat_id)
+    
+    def save(self, chat_id, state, data):
+        entry = StateEntry(state, data, time.time())
+        with self._lock:
+            self._states[chat_id] = entry
+    
+    def delete(self, chat_id):
+        with self._lock:
+            self._states.pop(chat_id, None)
+    
+    def purge_expired(self, ttl):
+        cutoff = time.time() - ttl
+        with self._lock:
+            expired = [key for key, entry in self._states.items() if entry.updated < cutoff]
+            for key in expired:
+                self._states.pop(key, None)
+        return len(expired)
+
+
+class SQLiteStateBackend(StateBackend):
+    """Backend storing states in the user_states table.
+    
+    Data is stored as JSON; expiry uses the updated_at index.
+    """
+    
+    def load(self, chat_id):
+        with connection() as conn:
+            row = conn.execute(
+                '''SELECT state, data, CAST(strftime('%s', updated_at) AS INTEGER) AS updated
+                   FROM user_states WHERE telegram_id = ?''',
+                (chat_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return StateEntry(row['state'], json.loads(row['data']) if row['data'] else {}, row['updated'])
+    
+    def save(self, chat_id, state, data):
+        with transaction() as conn:
+            conn.execute(
+                '''INSERT INTO user_states (telegram_id, state, data, updated_at)
+                   VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                   ON CONFLICT(telegram_id) DO UPDATE SET
+                       state = excluded.state,
+                       data = excluded.data,
+                       updated_at = excluded.updated_at''',
+                (chat_id, state, json.dumps(data, ensure_ascii=False))
+            )
+    
+    def delete(self, chat_id):
+        with transaction() as conn:
+            conn.execute("DELETE FROM user_states WHERE telegram_id = ?", (chat_id,))
+    
+    def purge_expired(self, ttl):
+        with transaction() as conn:
+            return conn.execute(
+                "DELETE FROM user_states WHERE updated_at < datetime('now', ?)",
+                (f'-{int(ttl)} seconds',)
+            ).rowcount
+
+
+class MySQLStateBackend(SQLiteStateBackend):
+    """Backend storing states in the user_states table of the MySQL backend."""
+    
+    def load(self, chat_id):
+        with connection() as conn:
+            row = conn.execute(
+                '''SELECT state, data, CAST(UNIX_TIMESTAMP(updated_at) AS SIGNED) AS updated
+                   FROM user_states WHERE telegram_id = ?''',
+                (chat_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return StateEntry(row['state'], json.loads(row['data']) if row['data'] else {}, row['updated'])
+    
+    def save(self, chat_id, state, data):
+        with transaction() as conn:
+            conn.execute(
+                '''INSERT INTO user_states (telegram_id, state, data, updated_at)
+                   VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                   ON DUPLICATE KEY UPDATE
+                       state = VALUES(state),
+                       data = VALUES(data),
+                       updated_at = VALUES(updated_at)''',
+                (chat_id, state, json.dumps(data, ensure_ascii=False))
+            )
+    
+    def purge_expired(self, ttl):
+        with transaction() as conn:
+            return conn.execute(
+                "DELETE FROM user_states WHERE updated_at < NOW() - INTERVAL ? SECOND",
+                (int(ttl),)
+            ).rowcount
+
+
+# Backends selectable with STATE_BACKEND
+BACKENDS = {
+    'memory': MemoryStateBackend,
+    'sqlite': SQLiteStateBackend,
+    'mysql': MySQLStateBackend,
+}
+
+
+class StateStore:
+    """Conversation state with an in-memory LRU in front of a backend.
+    
+    Writes go through to the backend immediately, so a restarted process
+    (or another worker sharing the database) sees the same state. Reads
+    are served from the LRU, which also remembers chats that have no
+    state, so the common "not in a dialog" check costs no query.
+    
+    Each chat must be served by one process at a time for the cache to
+    stay coherent; set the cache size to 0 otherwise. Within a process,
+    reads and updates of one chat's state are not atomic: the bot runs a
+    chat's handlers one at a time (utils/chat_executor.py) instead.
+    """
+    
+    def __init__(self, backend: StateBackend, ttl: int = 3600, cache_size: int = 10000):
+        self.backend = backend
+        self.ttl = ttl
+        self._cache = LRUCache(cache_size)
+    
+    def _entry(self, chat_id) -> StateEntry:
+        entry = self._cache.get(chat_id)
+        if entry is MISSING:
+            try:
+                entry = self.backend.load(chat_id) or EMPTY
+            except Exception as e:
+                logger.error("Error loading state for %s: %s", chat_id, e)
+                return EMPTY
+            self._cache.set(chat_id, entry)
+        
+        if self._expired(entry):
+            self.clear(chat_id)
+            return EMPTY
+        return entry
+    
+    def _expired(self, entry: StateEntry) -> bool:
+        # Abandoned dialogs expire
+        return entry.state is not None and time.time() - entry.updated > self.ttl
+    
+    def cached(self, chat_id: int):
+        """Get a chat's cached entry if reading it needs no backend I/O.
+        
+        Returns:
+            StateEntry, or None if the chat is not cached or its dialog
+            expired (reading it would delete the state)
+        """
+        entry = self._cache.get(chat_id)
+        if entry is MISSING or self._expired(entry):
+            return None
+        return entry
+    
+    def get_state(self, chat_id: int):
+        """Get the current FSM state of a chat (None if idle)."""
+        return self._entry(chat_id).state
+    
+    def get_data(self, chat_id: int) -> dict:
+        """Get a copy of the dialog data of a chat."""
+        return dict(self._entry(chat_id).data)
+    
+    def has_state(self, chat_id: int) -> bool:
+        """Check whether a chat is in the middle of a dialog."""
+        return self._entry(chat_id).state is not None
+    
+    def set_state(self, chat_id: int, state: str, data: dict = None):
+        """Set the state of a chat.
+        
+        Args:
+            chat_id: Chat ID
+            state: New FSM state
+            data: New dialog data (None keeps the current data)
+        """
+        if data is None:
+            data = self._entry(chat_id).data
+        entry = StateEntry(state, dict(data), time.time())
+        self.backend.save(chat_id, entry.state, entry.data)
+        self._cache.set(chat_id, entry)
+    
+    def update_data(self, chat_id: int, **values):
+        """Merge values into the dialog data of a chat."""
+        entry = self._entry(chat_id)
+        self.set_state(chat_id, entry.state, {**entry.data, **values})
+    
+    def clear(self, chat_id: int):
+        """Reset a chat to idle (no backend write if it is known to be idle)."""
+        if self._cache.get(chat_id) == EMPTY:
+            return
+        self.backend.delete(chat_id)
+        self._cache.set(chat_id, EMPTY)
+    
+    def purge_expired(self) -> int:
+        """Delete expired states from the backend."""
+        purged = self.backend.purge_expired(self.ttl)
+        if purged:
+            logger.info("Purged %s expired conversation states", purged)
+        return purged
+
+
+def create_state_store() -> StateStore:
+    """Create the state store configured in STATE_SETTINGS."""
+    backend = BACKENDS[STATE_SETTINGS['backend']]()
+    return StateStore(backend, ttl=STATE_SETTINGS['ttl'], cache_size=STATE_SETTINGS['cache_size'])
+
+
+# Shared store used by the handlers
+states = create_state_store()
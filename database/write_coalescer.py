@@ -0,0 +1,166 @@
+"""Group commit for birthday writes."""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from config import WRITE_COALESCER_SETTINGS
+from .db import transaction, backend
+
+logger = logging.getLogger(__name__)
+
+
+class WriteCoalescer:
+    """Applies writes from all threads in shared transactions.
+    
+    Callers hand over a function taking a connection; a single writer
+    thread takes everything queued (up to `max_batch` operations, waiting
+    up to `max_delay` seconds for more) and runs the lot in one
+    transaction, so a burst of writes costs one commit instead of one
+    per write. Writes arriving while a commit is in flight form the next
+    batch, so no delay is needed for batching under load. Every
+    operation runs inside its own savepoint: if it raises, only its
+    changes are rolled back and the exception goes back to its caller,
+    while the rest of the batch still commits.
+    """
+    
+    def __init__(self, max_delay: float = 0.0, max_batch: int = 256, enabled: bool = True):
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self.enabled = enabled
+        self.commits = 0
+        self.operations = 0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+    
+    def run(self, func, *args, **kwargs):
+        """Run func(conn, *args, **kwargs) in a write transaction and return its result.
+        
+        Blocks until the batch containing the call is committed. Runs
+        inline when coalescing is disabled, on the writer thread itself,
+        or when the calling thread already holds a transaction (the
+        writer would wait for that transaction's lock).
+        """
+        if (not self.enabled
+                or threading.current_thread() is self._thread
+                or backend().in_transaction()):
+            with transaction() as conn:
+                return func(conn, *args, **kwargs)
+        return self.submit(func, *args, **kwargs).result()
+    
+    def submit(self, func, *args, **kwargs) -> Future:
+        """Queue func(conn, *args, **kwargs) for the next batch."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((func, args, kwargs, future))
+        return future
+    
+    def stop(self):
+        """Apply the queued writes and stop the writer thread."""
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return
+            self._queue.put(None)
+        thread.join()
+        with self._lock:
+            self._thread = None
+        
+        # Writes submitted while the writer was shutting down
+        leftovers = []
+        while True:
+            try:
+                op = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if op is not None:
+                leftovers.append(op)
+        if leftovers:
+            self._apply(leftovers)
+    
+    def stats(self) -> dict:
+        """Get commit and operation counters."""
+        return {
+            'commits': self.commits,
+            'operations': self.operations,
+            'ops_per_commit': self.operations / self.commits if self.commits else 0.0
+        }
+    
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker, name='db-writer', daemon=True)
+                self._thread.start()
+    
+    def _worker(self):
+        stopping = False
+        while not stopping:
+            op = self._queue.get()
+            if op is None:
+                break
+            batch = [op]
+            
+            # Gather the rest of the burst
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    timeout = deadline - time.monotonic()
+                    op = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if op is None:
+                    stopping = True
+                    break
+                batch.append(op)
+            
+            self._apply(batch)
+    
+    def _apply(self, batch):
+        outcomes = []
+        try:
+            with transaction() as conn:
+                for func, args, kwargs, future in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    conn.execute('SAVEPOINT coalesced_write')
+                    try:
+                        result = func(conn, *args, **kwargs)
+                    except Exception as e:
+                        conn.execute('ROLLBACK TO SAVEPOINT coalesced_write')
+                        conn.execute('RELEASE SAVEPOINT coalesced_write')
+                        outcomes.append((future, None, e))
+                    else:
+                        conn.execute('RELEASE SAVEPOINT coalesced_write')
+                        outcomes.append((future, result, None))
+        except Exception as e:
+            # The transaction was rolled back: nothing in the batch was written
+            logger.error("Error committing batch of %s writes: %s", len(batch), e)
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        self.commits += 1
+        self.operations += len(outcomes)
+        # Results are released only once they are durable
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+def create_write_coalescer() -> WriteCoalescer:
+    """Create the coalescer configured in WRITE_COALESCER_SETTINGS."""
+    settings = WRITE_COALESCER_SETTINGS
+    return WriteCoalescer(
+        max_delay=settings['max_delay_ms'] / 1000,
+        max_batch=settings['max_batch'],
+        enabled=settings['enabled']
+    )
+
+
+# Shared coalescer used by the models
+writes = create_write_coalescer()
@@ -0,0 +1,100 @@
+"""Handlers for the asyncio bot (AsyncTeleBot).
+
+Registers the flows of handlers.commands and handlers.birthdays. Each
+flow runs on the DB executor (database.async_models.run_db), so its
+SQLite calls never block the event loop, and the reply actions it
+returns (handlers.replies) are awaited here. Only the state lookup that
+picks a dialog step runs on the loop, and only for cached chats.
+"""
+import logging
+from functools import wraps
+from telebot.async_telebot import AsyncTeleBot
+from telebot.asyncio_helper import ApiTelegramException
+from database.async_models import async_states, run_db
+from config import MESSAGES
+from . import views
+from .birthdays import COMMANDS as BIRTHDAY_COMMANDS, callbacks, messages
+from .commands import COMMANDS
+from .replies import Document, Download, Edit, Notice, ReplyTo, Send, is_not_modified
+
+logger = logging.getLogger(__name__)
+
+
+async def perform(bot: AsyncTeleBot, message, actions) -> str:
+    """Deliver a flow's actions in the chat of `message` (see handlers.replies.perform)."""
+    notice = None
+    for action in actions or ():
+        if isinstance(action, Send):
+            await bot.send_message(message.chat.id, action.text, reply_markup=action.markup,
+                                   parse_mode=action.parse_mode)
+        elif isinstance(action, ReplyTo):
+            await bot.reply_to(message, action.text, reply_markup=action.markup)
+        elif isinstance(action, Edit):
+            try:
+                await bot.edit_message_text(action.text, message.chat.id, message.message_id,
+                                            reply_markup=action.markup, parse_mode='HTML')
+            except ApiTelegramException as e:
+                if not is_not_modified(e):
+                    raise
+        elif isinstance(action, Document):
+            with action.file:
+                await bot.send_document(message.chat.id, action.file, visible_file_name=action.filename,
+                                        caption=action.caption)
+        elif isinstance(action, Notice):
+            notice = action.text
+        elif isinstance(action, Download):
+            try:
+                file_info = await bot.get_file(action.file_id)
+                data = await bot.download_file(file_info.file_path)
+            except Exception as e:
+                logger.error("Error downloading file: %s", e)
+                await bot.reply_to(message, MESSAGES['error'])
+                continue
+            actions = await run_db(action.flow, message, data, *action.args)
+            notice = await perform(bot, message, actions) or notice
+    return notice
+
+
+def deliver(bot: AsyncTeleBot, flow):
+    """AsyncTeleBot message handler running `flow` on the DB executor."""
+    @wraps(flow)
+    async def handler(message):
+        await perform(bot, message, await run_db(flow, message))
+    return handler
+
+
+def register_async_command_handlers(bot: AsyncTeleBot):
+    """Register command handlers on the async bot."""
+    for name, flow in COMMANDS.items():
+        bot.register_message_handler(deliver(bot, flow), commands=[name])
+
+
+def register_async_birthday_handlers(bot: AsyncTeleBot):
+    """Register birthday handlers on the async bot."""
+    for name, flow in BIRTHDAY_COMMANDS.items():
+        bot.register_message_handler(deliver(bot, flow), commands=[name])
+    
+    @bot.callback_query_handler(func=lambda call: True)
+    async def on_callback(call):
+        """Route every button tap through the dispatch table."""
+        handler = callbacks.resolve(call.data)
+        if handler is None:
+            await bot.answer_callback_query(call.id, views.OUTDATED_BUTTON)
+            return
+        
+        try:
+            notice = await perform(bot, call.message, await run_db(handler, call))
+        except Exception as e:
+            logger.error("Error in %s: %s", handler.__name__, e)
+            notice = MESSAGES['error']
+        # Stops the loading indicator on the button
+        await bot.answer_callback_query(call.id, notice)
+    
+    @bot.message_handler(content_types=messages.content_types())
+    async def on_message(message):
+        """Route every non-command message through the dispatch table."""
+        handler = messages.for_text(message)
+        if handler is None:
+            handler = messages.for_state(await async_states.get_state(message.chat.id), message)
+        if handler is not None:
+            await perform(bot, message, await run_db(handler, message))
@@ -0,0 +1,377 @@
+"""Bulk import and export of birthdays as CSV, vCard or JSON files.
+
+Like handlers.views this module does no database or network I/O: the
+handlers download the upload, pass it here and store the validated rows
+with a single BirthdayDB.add_many call. Uploads are parsed record by
+record from a text stream and every record goes through the same
+validation as the add dialog (views.parse_name / views.parse_birth_date).
+"""
+import csv
+import io
+import json
+import html as html_module
+import re
+from datetime import date
+from itertools import chain
+
+from database.models import MAX_BIRTHDAYS_PER_USER
+from . import views
+from .views import InputError
+
+# Supported formats and their file extensions
+FORMATS = ('csv', 'vcf', 'json')
+EXTENSIONS = {
+    'csv': 'csv',
+    'txt': 'csv',
+    'vcf': 'vcf',
+    'vcard': 'vcf',
+    'json': 'json'
+}
+MIME_TYPES = {
+    'text/csv': 'csv',
+    'text/comma-separated-values': 'csv',
+    'text/vcard': 'vcf',
+    'text/x-vcard': 'vcf',
+    'application/json': 'json'
+}
+
+# Telegram bots can download files up to 20 MB; a full list is far smaller
+MAX_IMPORT_FILE_SIZE = 1024 * 1024
+# Invalid records listed in the import report
+MAX_REPORTED_ERRORS = 5
+# Characters read per step when scanning a JSON array
+JSON_CHUNK_SIZE = 64 * 1024
+
+# Dates written by other programs: ISO (1990-05-31), vCard basic (19900531)
+# and year-less vCard (--05-31, --0531)
+ISO_DATE_PATTERN = re.compile(r'(\d{4})-?(\d{2})-?(\d{2})(?:T.*)?')
+NO_YEAR_DATE_PATTERN = re.compile(r'--(\d{2})-?(\d{2})')
+
+HEADER_NAMES = {'name', 'имя'}
+
+ASK_IMPORT = (
+    '📥 <b>Отправь файл с днями рождения</b>\n\n'
+    '• <b>CSV</b>: <code>имя,дата</code> в каждой строке (разделитель <code>,</code> или <code>;</code>)\n'
+    '• <b>vCard</b> (<code>.vcf</code>): экспорт контактов с телефона\n'
+    '• <b>JSON</b>: <code>[{"name": "Иван", "date": "25.12.2000"}]</code>\n\n'
+    f'Дата: ДД.ММ.ГГГГ или ДД.ММ. Не больше {MAX_BIRTHDAYS_PER_USER} записей.'
+)
+WAITING_FILE = '📎 Жду файл (CSV, vCard или JSON). Для выхода нажми «❌ Отмена».'
+UNSUPPORTED_FORMAT = '❌ Не знаю такой формат. Поддерживаются .csv, .vcf и .json'
+FILE_TOO_LARGE = f'❌ Файл слишком большой (максимум {MAX_IMPORT_FILE_SIZE // 1024} КБ)'
+NOT_UTF8 = '❌ Файл должен быть в кодировке UTF-8'
+NOTHING_TO_EXPORT = '📅 <b>Нечего экспортировать: список пуст.</b>'
+
+
+class ImportResult:
+    """Validated rows of an upload plus the records that were rejected."""
+    
+    def __init__(self):
+        # (name, birth_date, birth_year) tuples ready for BirthdayDB.add_many
+        self.birthdays = []
+        # (record number, reply text) for invalid records
+        self.errors = []
+        # Records without a birthday (e.g. contacts in a phone export)
+        self.skipped = 0
+        # Stopped reading because the upload cannot fit the limit anyway
+        self.truncated = False
+
+
+def detect_format(file_name: str = None, mime_type: str = None) -> str:
+    """Pick the import format from the file extension or MIME type.
+    
+    Raises:
+        InputError: Neither is a supported format
+    """
+    _, dot, extension = (file_name or '').rpartition('.')
+    fmt = (EXTENSIONS.get(extension.lower()) if dot else None) or MIME_TYPES.get((mime_type or '').lower())
+    if fmt is None:
+        raise InputError(UNSUPPORTED_FORMAT)
+    return fmt
+
+
+def parse_export_format(text: str) -> str:
+    """Get the format requested with /export (CSV by default).
+    
+    Raises:
+        InputError: Unknown format
+    """
+    parts = (text or '').split(maxsplit=1)
+    if len(parts) < 2:
+        return 'csv'
+    fmt = EXTENSIONS.get(parts[1].strip().lower().lstrip('.'))
+    if fmt is None:
+        raise InputError(f'❌ Неизвестный формат. Используй: /export {" | ".join(FORMATS)}')
+    return fmt
+
+
+def normalize_date(text: str) -> str:
+    """Rewrite ISO and vCard dates as ДД.ММ.ГГГГ / ДД.ММ; other text is returned stripped."""
+    text = (text or '').strip()
+    match = NO_YEAR_DATE_PATTERN.fullmatch(text)
+    if match:
+        month, day = match.groups()
+        return f'{day}.{month}'
+    match = ISO_DATE_PATTERN.fullmatch(text)
+    if match:
+        year, month, day = match.groups()
+        return f'{day}.{month}.{year}'
+    return text
+
+
+# ==================== IMPORT ====================
+
+def _iter_csv(stream):
+    """Yield (name, date) text pairs from CSV rows."""
+    first = stream.readline()
+    # Spreadsheets in Russian locales separate cells with ';'
+    delimiter = ';' if first.count(';') > first.count(',') else ','
+    reader = csv.reader(chain([first], stream), delimiter=delimiter)
+    
+    for number, row in enumerate(reader, 1):
+        cells = [cell.strip() for cell in row]
+        if not any(cells):
+            continue
+        if number == 1 and cells[0].lower() in HEADER_NAMES:
+            continue
+        if len(cells) < 2:
+            yield cells[0], None
+        else:
+            yield cells[0], cells[1]
+
+
+def _vcard_unescape(value: str) -> str:
+    return (value.replace('\\n', ' ').replace('\\N', ' ')
+            .replace('\\,', ',').replace('\\;', ';').replace('\\\\', '\\'))
+
+
+def _iter_vcard_lines(stream):
+    """Yield logical vCard lines (folded continuation lines joined)."""
+    pending = None
+    for line in stream:
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and pending is not None:
+            pending += line[1:]
+            continue
+        if pending is not None:
+            yield pending
+        pending = line
+    if pending is not None:
+        yield pending
+
+
+def _iter_vcard(stream):
+    """Yield (name, date) pairs from vCard contacts; contacts without BDAY give date None."""
+    card = None
+    for line in _iter_vcard_lines(stream):
+        key, sep, value = line.partition(':')
+        if not sep:
+            continue
+        # "item1.BDAY;VALUE=date" -> "BDAY"
+        prop = key.split(';', 1)[0].rsplit('.', 1)[-1].upper()
+        
+        if prop == 'BEGIN' and value.strip().upper() == 'VCARD':
+            card = {}
+        elif card is None:
+            continue
+        elif prop == 'END':
+            name = card.get('FN')
+            if not name and card.get('N'):
+                # N is Family;Given;Additional;Prefix;Suffix
+                family, _, rest = card['N'].partition(';')
+                given = rest.split(';', 1)[0]
+                name = f'{given} {family}'.strip()
+            yield name or '', card.get('BDAY')
+            card = None
+        elif prop in ('FN', 'N', 'BDAY') and prop not in card:
+            card[prop] = value if prop == 'N' else _vcard_unescape(value).strip()
+
+
+def _iter_json(stream, chunk_size: int = JSON_CHUNK_SIZE):
+    """Yield (name, date) pairs from a JSON array of objects, one element at a time."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+    started = False
+    
+    while True:
+        # Skip whitespace and separators, refilling the buffer as needed
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buffer) or eof:
+                break
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+        
+        if not started:
+            if buffer[pos:pos + 1] != '[':
+                raise InputError('❌ JSON должен быть списком: <code>[{"name": ..., "date": ...}]</code>')
+            started = True
+            pos += 1
+            continue
+        if pos >= len(buffer):
+            raise InputError('❌ JSON обрывается: нет закрывающей скобки <code>]</code>')
+        if buffer[pos] == ']':
+            return
+        
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise InputError('❌ Файл не похож на JSON')
+            # The element continues in the next chunk
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        
+        pos = end
+        if isinstance(item, dict):
+            name, birth_date = item.get('name'), item.get('date', item.get('birthday'))
+            yield (str(name) if name is not None else ''), (str(birth_date) if birth_date is not None else None)
+        else:
+            yield '', None
+
+
+PARSERS = {
+    'csv': _iter_csv,
+    'vcf': _iter_vcard,
+    'json': _iter_json
+}
+
+
+def read_upload(data: bytes, fmt: str, max_rows: int = MAX_BIRTHDAYS_PER_USER,
+                today: date = None) -> ImportResult:
+    """Parse and validate an uploaded file.
+    
+    Records are read lazily; reading stops as soon as more than
+    `max_rows` valid rows were found, since such an upload is rejected
+    as a whole anyway.
+    
+    Raises:
+        InputError: The file is not UTF-8 or not valid in its format
+    """
+    result = ImportResult()
+    stream = io.TextIOWrapper(io.BytesIO(data), encoding='utf-8-sig', newline='')
+    
+    try:
+        for number, (name_text, date_text) in enumerate(PARSERS[fmt](stream), 1):
+            if date_text is None and fmt == 'vcf':
+                result.skipped += 1
+                continue
+            try:
+                name = views.parse_name(name_text)
+                if date_text is None:
+                    raise InputError(views.FORMAT_ERROR)
+                birth_date, birth_year = views.parse_birth_date(normalize_date(date_text), today)
+            except InputError as e:
+                result.errors.append((number, str(e)))
+                continue
+            
+            result.birthdays.append((name, birth_date, birth_year))
+            if len(result.birthdays) > max_rows:
+                result.truncated = True
+                break
+    except UnicodeDecodeError:
+        raise InputError(NOT_UTF8)
+    except csv.Error:
+        raise InputError('❌ Не удалось прочитать CSV')
+    
+    return result
+
+
+def render_import_report(added: int, result: ImportResult) -> str:
+    """Single reply summarising an import."""
+    text = f'📥 <b>Импортировано: {added}</b>'
+    if result.skipped:
+        text += f'\nБез даты рождения пропущено: {result.skipped}'
+    if result.errors:
+        text += f'\nС ошибками пропущено: {len(result.errors)}\n'
+        for number, error in result.errors[:MAX_REPORTED_ERRORS]:
+            # Validation texts start with an emoji and may span lines
+            first_line = error.split('\n', 1)[0].lstrip('❌ ')
+            text += f'\n• запись {number}: {first_line}'
+        if len(result.errors) > MAX_REPORTED_ERRORS:
+            text += f'\n• … и еще {len(result.errors) - MAX_REPORTED_ERRORS}'
+    return text
+
+
+def render_import_limit(result: ImportResult) -> str:
+    """Reply when the upload does not fit the per-user limit."""
+    found = f'больше {MAX_BIRTHDAYS_PER_USER}' if result.truncated else str(len(result.birthdays))
+    return (f'❌ <b>Импорт не выполнен:</b> в файле {found} записей, а всего можно хранить '
+            f'{MAX_BIRTHDAYS_PER_USER}.\n\nУдали лишние записи из файла или из списка и попробуй снова.')
+
+
+# ==================== EXPORT ====================
+
+def _format_date(bd: dict) -> str:
+    if bd['birth_year']:
+        return bd['birth_date'].strftime('%d.%m.%Y')
+    return bd['birth_date'].strftime('%d.%m')
+
+
+def _vcard_escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace(',', '\\,').replace(';', '\\;').replace('\n', '\\n')
+
+
+def write_export(birthdays, fmt: str, stream) -> int:
+    """Write birthdays to a binary stream in the given format.
+    
+    Args:
+        birthdays: Iterable of birthday dicts (e.g. BirthdayDB.iter_all),
+            written as they arrive
+        fmt: One of FORMATS
+        stream: Binary file object; left open
+    
+    Returns:
+        Number of birthdays written
+    """
+    out = io.TextIOWrapper(stream, encoding='utf-8', newline='', write_through=True)
+    count = 0
+    try:
+        if fmt == 'csv':
+            writer = csv.writer(out)
+            writer.writerow(['name', 'date'])
+            for bd in birthdays:
+                # Names are stored HTML-escaped
+                writer.writerow([html_module.unescape(bd['friend_name']), _format_date(bd)])
+                count += 1
+        
+        elif fmt == 'vcf':
+            for bd in birthdays:
+                name = _vcard_escape(html_module.unescape(bd['friend_name']))
+                if bd['birth_year']:
+                    bday = bd['birth_date'].strftime('%Y%m%d')
+                else:
+                    bday = bd['birth_date'].strftime('--%m%d')
+                out.write(f'BEGIN:VCARD\r\nVERSION:4.0\r\nFN:{name}\r\nBDAY:{bday}\r\nEND:VCARD\r\n')
+                count += 1
+        
+        elif fmt == 'json':
+            out.write('[')
+            for bd in birthdays:
+                record = {'name': html_module.unescape(bd['friend_name']), 'date': _format_date(bd)}
+                out.write(('\n  ' if not count else ',\n  ') + json.dumps(record, ensure_ascii=False))
+                count += 1
+            out.write('\n]\n')
+        
+        else:
+            raise ValueError(f"Unknown export format: {fmt!r}")
+    finally:
+        # Hand the stream back to the caller instead of closing it
+        out.detach()
+    
+    return count
+
+
+def export_filename(fmt: str, today: date = None) -> str:
+    """File name shown for an export."""
+    if today is None:
+        today = date.today()
+    return f'birthdays_{today.isoformat()}.{fmt}'
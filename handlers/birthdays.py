@@ -1,452 +1,417 @@
-"""Birthday-related handlers."""
+"""Birthday-related handlers.
+
+Every command, button, dialog step and inline view is a flow that
+returns reply actions (see handlers.replies); register_birthday_handlers
+delivers them on TeleBot, handlers.async_handlers on AsyncTeleBot.
+"""
 import telebot
-from telebot import types
 import logging
-from datetime import datetime, date
+import tempfile
+from datetime import date
 from database.models import UserDB, BirthdayDB, MAX_BIRTHDAYS_PER_USER
+from database.state_store import states as user_states
 from keyboards.reply_keyboards import get_main_menu, get_cancel_keyboard
+from keyboards import inline_keyboards
+from keyboards.inline_keyboards import get_list_keyboard, get_delete_keyboard, get_back_to_menu
 from config import MESSAGES
 from utils.rate_limiter import rate_limit
-from utils.date_helpers import calculate_age, days_until_birthday
-import html as html_module
+from utils.callback_router import CallbackRouter
+from utils.message_router import MessageRouter
+from . import views, birthday_files
+from .replies import Document, Download, Edit, Notice, ReplyTo, Send, command, deliver, perform
+from .views import InputError
 
 logger = logging.getLogger(__name__)
 
-# User states
-user_states = {}
-user_data = {}
+def load_page(user_id: int, size: int, number: int = 1, cursor: str = '') -> views.Page:
+    """Read one keyset page of a user's birthdays.
+    
+    A page whose rows were all deleted in the meantime falls back to the
+    first page.
+    
+    Raises:
+        InputError: Malformed cursor
+    """
+    query = views.page_query(cursor)
+    rows, has_more = BirthdayDB.get_page(user_id, size, **query)
+    if not rows and cursor:
+        number, cursor = 1, ''
+        rows, has_more = BirthdayDB.get_page(user_id, size)
+    
+    # The first page of a short list needs no separate COUNT
+    total = len(rows) if not cursor and not has_more else BirthdayDB.count(user_id)
+    return views.make_page(rows, has_more, number, size, total, cursor)
 
-# Constants
-MAX_NAME_LENGTH = 100
+def dialog_cancel_keyboard(data: dict):
+    """Cancel keyboard for the add dialog: inline if it was started from the inline menu."""
+    return inline_keyboards.get_cancel_keyboard() if data.get('confirm') else get_cancel_keyboard()
 
-def register_birthday_handlers(bot: telebot.TeleBot):
-    """Register all birthday handlers."""
+# ==================== COMMANDS ====================
+
+# /command -> flow, registered on the sync and the async bot
+COMMANDS = {}
+
+@command(COMMANDS, 'cancel')
+def cmd_cancel(message):
+    """Cancel current operation."""
+    if user_states.has_state(message.chat.id):
+        user_states.clear(message.chat.id)
+        return [Send(views.CANCELLED, get_main_menu())]
+    return [Send(views.NOTHING_TO_CANCEL)]
+
+@command(COMMANDS, 'import')
+@rate_limit(seconds=2, action='edit')
+def cmd_import(message):
+    """Ask for a file to import."""
+    user_states.set_state(message.chat.id, 'waiting_import', {})
+    return [Send(birthday_files.ASK_IMPORT, get_cancel_keyboard(), 'HTML')]
+
+@command(COMMANDS, 'export')
+@rate_limit(seconds=5, action='export')
+def cmd_export(message):
+    """Send all birthdays as a CSV, vCard or JSON file."""
+    try:
+        fmt = birthday_files.parse_export_format(message.text)
+    except InputError as e:
+        return [Send(str(e), parse_mode='HTML')]
     
-    # ==================== COMMANDS ====================
+    file = tempfile.SpooledTemporaryFile(max_size=birthday_files.MAX_IMPORT_FILE_SIZE)
+    try:
+        user_id = UserDB.create_or_get(message.from_user.id, message.from_user.username)
+        # Rows go from the cursor straight into the file
+        count = birthday_files.write_export(BirthdayDB.iter_all(user_id), fmt, file)
+    except Exception as e:
+        file.close()
+        logger.error("Error in cmd_export: %s", e)
+        return [ReplyTo(MESSAGES['error'])]
     
-    @bot.message_handler(commands=['cancel'])
-    def cmd_cancel(message):
-        """Cancel current operation."""
-        if message.chat.id in user_states:
-            user_states.pop(message.chat.id, None)
-            user_data.pop(message.chat.id, None)
-            bot.send_message(
-                message.chat.id,
-                '❌ Отменено',
-                reply_markup=get_main_menu()
-            )
-        else:
-            bot.send_message(message.chat.id, 'ℹ️ Нет активных операций')
+    if not count:
+        file.close()
+        return [Send(birthday_files.NOTHING_TO_EXPORT, parse_mode='HTML')]
     
-    # ==================== TEXT BUTTON HANDLERS ====================
+    file.seek(0)
+    logger.info("Exported %s birthdays as %s for %s", count, fmt, message.from_user.id)
+    return [Document(file, birthday_files.export_filename(fmt), f'📤 Экспортировано: {count}')]
+
+# ==================== TEXT BUTTON HANDLERS ====================
+
+messages = MessageRouter()
+
+@messages.text('❌ Отмена')
+def btn_cancel(message):
+    """Cancel button - should work regardless of state."""
+    logger.info("CANCEL clicked by %s", message.from_user.id)
+    user_states.clear(message.chat.id)
+    return [Send(views.CANCELLED, get_main_menu())]
+
+@messages.text('С днем рождения')
+def btn_sdr(message):
+    """Birthday greeting button."""
+    logger.info("Button SDR clicked by %s", message.from_user.id)
+    return [ReplyTo('С днем рождения', get_main_menu())]
+
+@messages.text('➕ Добавить')
+@rate_limit(seconds=2, action='edit')
+def btn_add(message):
+    """Add birthday button."""
+    logger.info("Button ADD clicked by %s", message.from_user.id)
     
-    @bot.message_handler(func=lambda m: m.text == '❌ Отмена')
-    def btn_cancel(message):
-        """Cancel button - should work regardless of state."""
-        logger.info(f"CANCEL clicked by {message.from_user.id}")
-        user_states.pop(message.chat.id, None)
-        user_data.pop(message.chat.id, None)
+    try:
+        # Check birthday limit before starting
+        user_id = UserDB.create_or_get(message.from_user.id, message.from_user.username)
         
-        bot.send_message(
-            message.chat.id,
-            '❌ Отменено',
-            reply_markup=get_main_menu()
-        )
+        if BirthdayDB.count(user_id) >= MAX_BIRTHDAYS_PER_USER:
+            return [Send(views.LIMIT_REACHED, parse_mode='HTML')]
+    except Exception as e:
+        logger.error("Error checking birthday limit: %s", e)
+        return [ReplyTo(MESSAGES['error'])]
+    
+    # Replaces any previous state
+    user_states.set_state(message.chat.id, 'waiting_name', {})
+    return [Send(views.ASK_NAME, get_cancel_keyboard(), 'HTML')]
 
-    @bot.message_handler(func=lambda m: m.text == 'С днем рождения')
-    def btn_sdr(message):
-        logger.info(f"CANCEL clicked by {message.from_user.id}")
-        bot.reply_to(
-        message,
-        'С днем рождения',
-        reply_markup=get_main_menu()
-    )
+@messages.text('📋 Список')
+@rate_limit(seconds=2, action='view', burst=3)
+def btn_list(message):
+    """List birthdays button."""
+    logger.info("Button LIST clicked by %s", message.from_user.id)
+    
+    try:
+        user_id = UserDB.create_or_get(message.from_user.id, message.from_user.username)
+        page = load_page(user_id, views.LIST_PAGE_SIZE)
+    except Exception as e:
+        logger.error("Error in btn_list: %s", e)
+        return [ReplyTo(MESSAGES['error'])]
+    
+    return [Send(views.render_birthday_page(page), get_list_keyboard(page), 'HTML')]
 
+@messages.text('🔔 Ближайшие')
+@rate_limit(seconds=2, action='view', burst=3)
+def btn_upcoming(message):
+    """Upcoming birthdays button."""
+    logger.info("Button UPCOMING clicked by %s", message.from_user.id)
     
-    @bot.message_handler(func=lambda m: m.text == '➕ Добавить')
-    @rate_limit(seconds=2)
-    def btn_add(message):
-        """Add birthday button."""
-        logger.info(f"Button ADD clicked by {message.from_user.id}")
-        
-        try:
-            # Check birthday limit before starting
-            user_id = UserDB.create_or_get(message.from_user.id, message.from_user.username)
-            birthdays = BirthdayDB.get_all(user_id)
-            
-            if len(birthdays) >= MAX_BIRTHDAYS_PER_USER:
-                bot.send_message(
-                    message.chat.id,
-                    f'❌ <b>Достигнут лимит:</b> {MAX_BIRTHDAYS_PER_USER} дней рождения.\n\n'
-                    'Удали старые записи перед добавлением новых.',
-                    parse_mode='HTML'
-                )
-                return
-        except Exception as e:
-            logger.error(f"Error checking birthday limit: {e}")
-            bot.reply_to(message, MESSAGES['error'])
-            return
-        
-        # Clear any previous state
-        user_states.pop(message.chat.id, None)
-        user_data.pop(message.chat.id, None)
-        
-        user_states[message.chat.id] = 'waiting_name'
-        bot.send_message(
+    try:
+        user_id = UserDB.create_or_get(message.from_user.id, message.from_user.username)
+        birthdays = BirthdayDB.get_upcoming(user_id, days=30)
+    except Exception as e:
+        logger.error("Error in btn_upcoming: %s", e)
+        return [ReplyTo(MESSAGES['error'])]
+    
+    return [Send(views.render_upcoming(birthdays, days=30), parse_mode='HTML')]
+
+@messages.text('🗑️ Удалить')
+@rate_limit(seconds=2, action='view', burst=3)
+def btn_delete(message):
+    """Delete birthday button."""
+    logger.info("Button DELETE clicked by %s", message.from_user.id)
+    
+    try:
+        user_id = UserDB.create_or_get(message.from_user.id, message.from_user.username)
+        page = load_page(user_id, views.DELETE_PAGE_SIZE)
+    except Exception as e:
+        logger.error("Error in btn_delete: %s", e)
+        return [ReplyTo(MESSAGES['error'])]
+    
+    if not page.rows:
+        return [Send(views.NO_BIRTHDAYS_TO_DELETE, parse_mode='HTML')]
+    return [Send(views.render_delete_page(page), get_delete_keyboard(page), 'HTML')]
+
+# ==================== STATE HANDLERS ====================
+
+@messages.state('waiting_name')
+def state_waiting_name(message):
+    """Get name with validation."""
+    data = user_states.get_data(message.chat.id)
+    try:
+        name = views.parse_name(message.text)
+    except InputError as e:
+        return [Send(str(e), dialog_cancel_keyboard(data), 'HTML')]
+    
+    logger.info("Got name: %s", name)
+    user_states.set_state(message.chat.id, 'waiting_date', {**data, 'name': name})
+    return [Send(views.ASK_DATE, dialog_cancel_keyboard(data), 'HTML')]
+
+@messages.state('waiting_date')
+def state_waiting_date(message):
+    """Get date and save with improved validation."""
+    logger.info("Got date: %s", message.text)
+    data = user_states.get_data(message.chat.id)
+    try:
+        birth_date, birth_year = views.parse_birth_date(message.text)
+    except InputError as e:
+        return [Send(str(e), dialog_cancel_keyboard(data), 'HTML')]
+    
+    name = data['name']
+    if data.get('confirm'):
+        # Started from the inline menu: saved by the confirm button
+        user_states.set_state(
             message.chat.id,
-            '👤 <b>Введи имя друга:</b>\n\n<i>Максимум 100 символов</i>',
-            reply_markup=get_cancel_keyboard(),
-            parse_mode='HTML'
+            'waiting_confirm',
+            {'name': name, 'birth_date': birth_date.isoformat(), 'birth_year': birth_year}
         )
+        return [Send(
+            views.render_confirm_add(name, birth_date, birth_year),
+            inline_keyboards.get_confirm_keyboard(),
+            'HTML'
+        )]
     
-    @bot.message_handler(func=lambda m: m.text == '📋 Список')
-    @rate_limit(seconds=2)
-    def btn_list(message):
-        """List birthdays button."""
-        logger.info(f"Button LIST clicked by {message.from_user.id}")
+    try:
+        # Save to DB
+        user_id = UserDB.create_or_get(message.from_user.id, message.from_user.username)
         
-        try:
-            user_id = UserDB.create_or_get(message.from_user.id, message.from_user.username)
-            birthdays = BirthdayDB.get_all(user_id)
-            
-            if not birthdays:
-                bot.send_message(
-                    message.chat.id,
-                    '📅 <b>У тебя еще нет сохраненных дней рождения.</b>',
-                    parse_mode='HTML'
-                )
-                return
-            
-            text = '🎉 <b>Список дней рождения:</b>\n\n'
-            today = date.today()
-            
-            for bd in birthdays:
-                date_str = bd['birth_date'].strftime('%d.%m')
-                # Names are already escaped in DB
-                text += f'👤 <b>{bd["friend_name"]}</b> - {date_str}'
-                
-                if bd['birth_year']:
-                    age = calculate_age(bd['birth_year'], bd['birth_date'], today)
-                    text += f' ({age} лет)'
-                
-                text += '\n'
-            
-            bot.send_message(message.chat.id, text, parse_mode='HTML')
-        except Exception as e:
-            logger.error(f"Error in btn_list: {e}")
-            bot.reply_to(message, MESSAGES['error'])
-
-    @bot.message_handler(func=lambda m: m.text == 'С дне')
-    @rate_limit(seconds=2)
-    def btn_upcoming(message):
-        """Upcoming birthdays button."""
-        logger.info(f"Button UPCOMING clicked by {message.from_user.id}")
+        birthday_id = BirthdayDB.add(
+            user_id=user_id,
+            friend_name=name,
+            birth_date=birth_date,
+            birth_year=birth_year
+        )
         
-        try:
-            user_id = UserDB.create_or_get(message.from_user.id, message.from_user.username)
-            birthdays = BirthdayDB.get_upcoming(user_id, days=30)
-            
-            if not birthdays:
-                bot.send_message(
-                    message.chat.id,
-                    '📅 <b>В ближайшие 30 дней нет дней рождения.</b>',
-                    parse_mode='HTML'
-                )
-                return
-            
-            text = '🔔 <b>Ближайшие дни рождения:</b>\n\n'
-            today = date.today()
-            
-            for bd in birthdays:
-                date_str = bd['birth_date'].strftime('%d.%m')
-                days_left = days_until_birthday(bd['birth_date'], today)
-                
-                text += f'👤 <b>{bd["friend_name"]}</b> - {date_str}'
-                
-                if days_left == 0:
-                    text += ' 🎉 <b>СЕГОДНЯ!</b>'
-                elif days_left == 1:
-                    text += ' (завтра)'
-                else:
-                    text += f' (через {days_left} дн.)'
-                
-                text += '\n'
-            
-            bot.send_message(message.chat.id, text, parse_mode='HTML')
-        except Exception as e:
-            logger.error(f"Error in btn_upcoming: {e}")
-            bot.reply_to(message, MESSAGES['error'])
-    
-    @bot.message_handler(func=lambda m: m.text == '🔔 Ближайшие')
-    @rate_limit(seconds=2)
-    def btn_upcoming(message):
-        """Upcoming birthdays button."""
-        logger.info(f"Button UPCOMING clicked by {message.from_user.id}")
+        logger.info("Birthday saved with ID: %s", birthday_id)
         
-        try:
-            user_id = UserDB.create_or_get(message.from_user.id, message.from_user.username)
-            birthdays = BirthdayDB.get_upcoming(user_id, days=30)
-            
-            if not birthdays:
-                bot.send_message(
-                    message.chat.id,
-                    '📅 <b>В ближайшие 30 дней нет дней рождения.</b>',
-                    parse_mode='HTML'
-                )
-                return
-            
-            text = '🔔 <b>Ближайшие дни рождения:</b>\n\n'
-            today = date.today()
-            
-            for bd in birthdays:
-                date_str = bd['birth_date'].strftime('%d.%m')
-                days_left = days_until_birthday(bd['birth_date'], today)
-                
-                text += f'👤 <b>{bd["friend_name"]}</b> - {date_str}'
-                
-                if days_left == 0:
-                    text += ' 🎉 <b>СЕГОДНЯ!</b>'
-                elif days_left == 1:
-                    text += ' (завтра)'
-                else:
-                    text += f' (через {days_left} дн.)'
-                
-                text += '\n'
-            
-            bot.send_message(message.chat.id, text, parse_mode='HTML')
-        except Exception as e:
-            logger.error(f"Error in btn_upcoming: {e}")
-            bot.reply_to(message, MESSAGES['error'])
+        # Clear state
+        user_states.clear(message.chat.id)
     
-    @bot.message_handler(func=lambda m: m.text == '🗑️ Удалить')
-    @rate_limit(seconds=2)
-    def btn_delete(message):
-        """Delete birthday button."""
-        logger.info(f"Button DELETE clicked by {message.from_user.id}")
-        
-        try:
-            user_id = UserDB.create_or_get(message.from_user.id, message.from_user.username)
-            birthdays = BirthdayDB.get_all(user_id)
-            
-            if not birthdays:
-                bot.send_message(
-                    message.chat.id,
-                    '📅 <b>У тебя нет сохраненных дней рождения.</b>',
-                    parse_mode='HTML'
-                )
-                return
-            
-            user_states[message.chat.id] = 'waiting_delete'
-            user_data[message.chat.id] = {'birthdays': birthdays}
-            
-            text = '🗑️ <b>Введи номер для удаления:</b>\n\n'
-            for i, bd in enumerate(birthdays, 1):
-                date_str = bd['birth_date'].strftime('%d.%m')
-                text += f'{i}. {bd["friend_name"]} - {date_str}\n'
-            
-            bot.send_message(
-                message.chat.id,
-                text,
-                reply_markup=get_cancel_keyboard(),
-                parse_mode='HTML'
-            )
-        except Exception as e:
-            logger.error(f"Error in btn_delete: {e}")
-            bot.reply_to(message, MESSAGES['error'])
+    except ValueError as e:
+        logger.error("Validation error in state_waiting_date: %s", e)
+        if views.is_limit_error(e):
+            return [Send(views.LIMIT_REACHED_ON_SAVE, get_main_menu(), 'HTML')]
+        return [Send(views.SAVE_ERROR, get_main_menu())]
+    except Exception as e:
+        logger.error("Error in state_waiting_date: %s", e, exc_info=True)
+        return [Send(views.SAVE_ERROR, get_main_menu())]
     
-    # ==================== STATE HANDLERS ====================
+    # Success
+    return [Send(views.render_added(name, birth_date, birth_year), get_main_menu(), 'HTML')]
+
+@messages.state('waiting_import', content_type='document')
+def state_waiting_import(message):
+    """Check an uploaded file, then import it once downloaded."""
+    document = message.document
+    try:
+        fmt = birthday_files.detect_format(document.file_name, document.mime_type)
+        if document.file_size and document.file_size > birthday_files.MAX_IMPORT_FILE_SIZE:
+            raise InputError(birthday_files.FILE_TOO_LARGE)
+    except InputError as e:
+        return [Send(str(e), get_cancel_keyboard(), 'HTML')]
     
-    @bot.message_handler(func=lambda m: user_states.get(m.chat.id) == 'waiting_name')
-    def state_waiting_name(message):
-        """Get name with validation."""
-        name = message.text.strip()
-        
-        # Validate name length
-        if len(name) > MAX_NAME_LENGTH:
-            bot.send_message(
-                message.chat.id,
-                f'❌ Слишком длинное имя! Максимум {MAX_NAME_LENGTH} символов.\n'
-                f'Твоё имя: {len(name)} символов.',
-                reply_markup=get_cancel_keyboard(),
-                parse_mode='HTML'
-            )
-            return
-        
-        if len(name) < 1:
-            bot.send_message(
-                message.chat.id,
-                '❌ Имя не может быть пустым!',
-                reply_markup=get_cancel_keyboard()
-            )
-            return
-        
-        logger.info(f"Got name: {name}")
-        user_data[message.chat.id] = {'name': name}
-        user_states[message.chat.id] = 'waiting_date'
+    return [Download(document.file_id, import_file, (fmt,))]
+
+def import_file(message, data: bytes, fmt: str):
+    """Import a downloaded file in one transaction."""
+    try:
+        upload = birthday_files.read_upload(data, fmt)
+    except InputError as e:
+        return [Send(str(e), get_cancel_keyboard(), 'HTML')]
+    except Exception as e:
+        logger.error("Error reading import file: %s", e)
+        return [ReplyTo(MESSAGES['error'])]
+    
+    try:
+        user_id = UserDB.create_or_get(message.from_user.id, message.from_user.username)
+        if upload.truncated:
+            raise ValueError(f"Birthday limit reached ({MAX_BIRTHDAYS_PER_USER} max)")
+        added = BirthdayDB.add_many(user_id, upload.birthdays)
         
-        bot.send_message(
-            message.chat.id,
-            '📅 <b>Введи дату рождения</b>\nФормат: ДД.ММ.ГГГГ или ДД.ММ\n\nПример: <code>25.12.2000</code>',
-            reply_markup=get_cancel_keyboard(),
-            parse_mode='HTML'
-        )
+        user_states.clear(message.chat.id)
+        logger.info("Imported %s birthdays from %s for %s", added, fmt, message.from_user.id)
+    except ValueError as e:
+        logger.error("Validation error in import_file: %s", e)
+        text = birthday_files.render_import_limit(upload) if views.is_limit_error(e) else views.SAVE_ERROR
+        return [Send(text, get_cancel_keyboard(), 'HTML')]
+    except Exception as e:
+        logger.error("Error in import_file: %s", e, exc_info=True)
+        user_states.clear(message.chat.id)
+        return [Send(views.SAVE_ERROR, get_main_menu())]
     
-    @bot.message_handler(func=lambda m: user_states.get(m.chat.id) == 'waiting_date')
-    def state_waiting_date(message):
-        """Get date and save with improved validation."""
-        logger.info(f"Got date: {message.text}")
-        try:
-            date_text = message.text.strip()
-            birth_date = None
-            birth_year = None
-            
-            # Try parsing different formats
-            for fmt in ['%d.%m.%Y', '%d.%m']:
-                try:
-                    parsed = datetime.strptime(date_text, fmt)
-                    
-                    # Validate the date actually exists
-                    try:
-                        if fmt == '%d.%m.%Y':
-                            birth_year = parsed.year
-                            birth_date = date(parsed.year, parsed.month, parsed.day)
-                            
-                            # Validate year is reasonable
-                            current_year = datetime.now().year
-                            if birth_year < 1900 or birth_year > current_year:
-                                bot.send_message(
-                                    message.chat.id,
-                                    f'❌ Неверный год! Год должен быть между 1900 и {current_year}.',
-                                    reply_markup=get_cancel_keyboard(),
-                                    parse_mode='HTML'
-                                )
-                                return
-                        else:
-                            # For dates without year, use leap year for validation
-                            # This handles Feb 29 correctly
-                            try:
-                                birth_date = date(2000, parsed.month, parsed.day)
-                            except ValueError:
-                                bot.send_message(
-                                    message.chat.id,
-                                    f'❌ Неверная дата! Такой даты не существует.\nПример: <code>25.12.2000</code>',
-                                    reply_markup=get_cancel_keyboard(),
-                                    parse_mode='HTML'
-                                )
-                                return
-                    except ValueError:
-                        # Invalid date like 31.02 or 30.02
-                        bot.send_message(
-                            message.chat.id,
-                            f'❌ Неверная дата! Такой даты не существует.\nПример: <code>25.12.2000</code>',
-                            reply_markup=get_cancel_keyboard(),
-                            parse_mode='HTML'
-                        )
-                        return
-                    
-                    break
-                except ValueError:
-                    continue
-            
-            if not birth_date:
-                bot.send_message(
-                    message.chat.id,
-                    '❌ Неверный формат! Используй ДД.ММ.ГГГГ или ДД.ММ\nПример: <code>25.12.2000</code>',
-                    reply_markup=get_cancel_keyboard(),
-                    parse_mode='HTML'
-                )
-                return
-            
-            # Save to DB
-            user_id = UserDB.create_or_get(message.from_user.id, message.from_user.username)
-            name = user_data[message.chat.id]['name']
-            
-            birthday_id = BirthdayDB.add(
-                user_id=user_id,
-                friend_name=name,
-                birth_date=birth_date,
-                birth_year=birth_year
-            )
-            
-            logger.info(f"Birthday saved with ID: {birthday_id}")
-            
-            # Clear state
-            user_states.pop(message.chat.id, None)
-            user_data.pop(message.chat.id, None)
-            
-            # Success
-            date_str = birth_date.strftime('%d.%m.%Y') if birth_year else birth_date.strftime('%d.%m')
-            bot.send_message(
-                message.chat.id,
-                f'✅ <b>Добавлено!</b>\n\n👤 {html_module.escape(name)}\n📅 {date_str}',
-                reply_markup=get_main_menu(),
-                parse_mode='HTML'
-            )
-            
-        except ValueError as e:
-            logger.error(f"Validation error in state_waiting_date: {e}")
-            if 'Birthday limit reached' in str(e):
-                bot.send_message(
-                    message.chat.id,
-                    f'❌ <b>Достигнут лимит:</b> {MAX_BIRTHDAYS_PER_USER} дней рождения',
-                    reply_markup=get_main_menu(),
-                    parse_mode='HTML'
-                )
-            else:
-                bot.send_message(
-                    message.chat.id,
-                    '❌ Ошибка при сохранении',
-                    reply_markup=get_main_menu()
-                )
-        except Exception as e:
-            logger.error(f"Error in state_waiting_date: {e}", exc_info=True)
-            bot.send_message(
-                message.chat.id,
-                '❌ Ошибка при сохранении',
-                reply_markup=get_main_menu()
-            )
+    return [Send(birthday_files.render_import_report(added, upload), get_main_menu(), 'HTML')]
+
+@messages.state('waiting_import')
+def state_waiting_import_text(message):
+    """Remind that a file is expected."""
+    return [Send(birthday_files.WAITING_FILE, get_cancel_keyboard())]
+
+# ==================== FALLBACK HANDLER ====================
+
+@messages.fallback
+def fallback_handler(message):
+    """Handle unknown messages."""
+    # Only respond if user is not in any state
+    if not user_states.has_state(message.chat.id):
+        return [Send(views.UNKNOWN_COMMAND, parse_mode='HTML')]
+
+# ==================== INLINE VIEWS ====================
+
+callbacks = CallbackRouter()
+
+@callbacks.route(inline_keyboards.BACK_TO_MENU)
+def cb_menu(call):
+    """Show the inline main menu."""
+    return [Edit(views.MENU, inline_keyboards.get_main_menu())]
+
+@callbacks.route(inline_keyboards.MENU_ADD)
+def cb_add(call):
+    """Start the add dialog (saved through the confirm button)."""
+    user_id = UserDB.create_or_get(call.from_user.id, call.from_user.username)
+    if BirthdayDB.count(user_id) >= MAX_BIRTHDAYS_PER_USER:
+        return [Edit(views.LIMIT_REACHED, get_back_to_menu())]
+    
+    user_states.set_state(call.message.chat.id, 'waiting_name', {'confirm': True})
+    return [Edit(views.ASK_NAME, inline_keyboards.get_cancel_keyboard())]
+
+@callbacks.route(inline_keyboards.MENU_LIST, inline_keyboards.LIST_PAGE)
+def cb_list(call):
+    """Show a page of the list."""
+    number, cursor = inline_keyboards.parse_page_callback(call.data)
+    user_id = UserDB.create_or_get(call.from_user.id, call.from_user.username)
+    page = load_page(user_id, views.LIST_PAGE_SIZE, number, cursor)
+    return [Edit(views.render_birthday_page(page), get_list_keyboard(page))]
+
+@callbacks.route(inline_keyboards.MENU_UPCOMING)
+def cb_upcoming(call):
+    """Show upcoming birthdays."""
+    user_id = UserDB.create_or_get(call.from_user.id, call.from_user.username)
+    birthdays = BirthdayDB.get_upcoming(user_id, days=30)
+    return [Edit(views.render_upcoming(birthdays, days=30), get_back_to_menu())]
+
+@callbacks.route(inline_keyboards.MENU_DELETE, inline_keyboards.DELETE_PAGE)
+def cb_delete_page(call):
+    """Show a page of the delete view."""
+    number, cursor = inline_keyboards.parse_page_callback(call.data)
+    user_id = UserDB.create_or_get(call.from_user.id, call.from_user.username)
+    page = load_page(user_id, views.DELETE_PAGE_SIZE, number, cursor)
+    return [Edit(views.render_delete_page(page), get_delete_keyboard(page))]
+
+@callbacks.route(inline_keyboards.DELETE)
+def cb_delete(call):
+    """Delete the birthday on the button and re-render its page."""
+    birthday_id, number, cursor = inline_keyboards.parse_delete_callback(call.data)
+    user_id = UserDB.create_or_get(call.from_user.id, call.from_user.username)
+    
+    # Ownership is checked by the query
+    deleted = BirthdayDB.delete(birthday_id, user_id)
+    page = load_page(user_id, views.DELETE_PAGE_SIZE, number, cursor)
+    
+    return [
+        Edit(views.render_delete_page(page), get_delete_keyboard(page)),
+        Notice(views.DELETED if deleted else views.DELETE_NOT_FOUND)
+    ]
+
+@callbacks.route(inline_keyboards.CONFIRM_ADD)
+def cb_confirm_add(call):
+    """Save the birthday summarised in the confirmation."""
+    if user_states.get_state(call.message.chat.id) != 'waiting_confirm':
+        return [Notice(views.OUTDATED_BUTTON)]
     
-    @bot.message_handler(func=lambda m: user_states.get(m.chat.id) == 'waiting_delete')
-    def state_waiting_delete(message):
-        """Delete by number."""
+    data = user_states.get_data(call.message.chat.id)
+    birth_date = date.fromisoformat(data['birth_date'])
+    user_id = UserDB.create_or_get(call.from_user.id, call.from_user.username)
+    try:
+        birthday_id = BirthdayDB.add(user_id, data['name'], birth_date, data['birth_year'])
+    except ValueError as e:
+        if not views.is_limit_error(e):
+            raise
+        user_states.clear(call.message.chat.id)
+        return [Edit(views.LIMIT_REACHED_ON_SAVE, get_back_to_menu())]
+    
+    logger.info("Birthday saved with ID: %s", birthday_id)
+    user_states.clear(call.message.chat.id)
+    return [Edit(views.render_added(data['name'], birth_date, data['birth_year']), get_back_to_menu())]
+
+@callbacks.route(inline_keyboards.CANCEL, inline_keyboards.CANCEL_ADD)
+def cb_cancel(call):
+    """Cancel the dialog started from the inline menu."""
+    user_states.clear(call.message.chat.id)
+    return [Edit(views.CANCELLED, get_back_to_menu())]
+
+# ==================== REGISTRATION ====================
+
+def register_birthday_handlers(bot: telebot.TeleBot):
+    """Register all birthday handlers."""
+    for name, flow in COMMANDS.items():
+        bot.register_message_handler(deliver(bot, flow), commands=[name])
+    
+    @bot.callback_query_handler(func=lambda call: True)
+    def on_callback(call):
+        """Route every button tap through the dispatch table."""
+        handler = callbacks.resolve(call.data)
+        if handler is None:
+            bot.answer_callback_query(call.id, views.OUTDATED_BUTTON)
+            return
+        
         try:
-            num = int(message.text)
-            birthdays = user_data[message.chat.id]['birthdays']
-            
-            if num < 1 or num > len(birthdays):
-                bot.send_message(message.chat.id, '❌ Неверный номер!')
-                return
-            
-            bd = birthdays[num - 1]
-            user_id = UserDB.create_or_get(message.from_user.id, message.from_user.username)
-            
-            if BirthdayDB.delete(bd['id'], user_id):
-                user_states.pop(message.chat.id, None)
-                user_data.pop(message.chat.id, None)
-                
-                bot.send_message(
-                    message.chat.id,
-                    '✅ <b>Удалено!</b>',
-                    reply_markup=get_main_menu(),
-                    parse_mode='HTML'
-                )
-            else:
-                bot.send_message(message.chat.id, '❌ Ошибка удаления')
-        except ValueError:
-            bot.send_message(message.chat.id, '❌ Введи номер!')
+            notice = perform(bot, call.message, handler(call))
         except Exception as e:
-            logger.error(f"Error in state_waiting_delete: {e}")
-            bot.send_message(message.chat.id, '❌ Ошибка')
-    
-    # ==================== FALLBACK HANDLER ====================
+            logger.error("Error in %s: %s", handler.__name__, e)
+            notice = MESSAGES['error']
+        # Stops the loading indicator on the button
+        bot.answer_callback_query(call.id, notice)
     
-    @bot.message_handler(func=lambda m: True)
-    def fallback_handler(message):
-        """Handle unknown messages."""
-        # Only respond if user is not in any state
-        if message.chat.id not in user_states:
-            bot.send_message(
-                message.chat.id,
-                'ℹ️ Не понимаю эту команду.\n\nИспользуй кнопки меню или /help для справки.',
-                parse_mode='HTML'
-            )
+    @bot.message_handler(content_types=messages.content_types())
+    def on_message(message):
+        """Route every non-command message through the dispatch table."""
+        handler = messages.for_text(message)
+        if handler is None:
+            handler = messages.for_state(user_states.get_state(message.chat.id), message)
+        if handler is not None:
+            perform(bot, message, handler(message))
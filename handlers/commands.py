@@ -4,46 +4,109 @@ from telebot import types
 import logging
 from config import MESSAGES
 from keyboards.reply_keyboards import get_main_menu
+from keyboards import inline_keyboards
 from database.models import UserDB
-from utils.rate_limiter import rate_limit
+from utils.rate_limiter import rate_limit, limiter
+from .replies import ReplyTo, Send, command, deliver
+from .views import (
+    MENU,
+    InputError,
+    parse_notify_hour,
+    parse_timezone,
+    render_notification_settings,
+    render_slow_down
+)
 
 logger = logging.getLogger(__name__)
 
-def register_command_handlers(bot: telebot.TeleBot):
-    """Register all command handlers."""
+# /command -> flow, registered on the sync and the async bot
+COMMANDS = {}
+
+
+@limiter.on_throttled
+def reply_slow_down(message: types.Message, wait: float):
+    """Tell a throttled user when to try again."""
+    return [Send(render_slow_down(wait))]
+
+
+@command(COMMANDS, 'start')
+@rate_limit(seconds=3, action='start')
+def cmd_start(message: types.Message):
+    """Handle /start command."""
+    try:
+        # Create or get user
+        UserDB.create_or_get(
+            telegram_id=message.from_user.id,
+            username=message.from_user.username
+        )
+    except Exception as e:
+        logger.error("Error in cmd_start: %s", e)
+        return [ReplyTo(MESSAGES['error'])]
     
-    @bot.message_handler(commands=['start'])
-    @rate_limit(seconds=3)
-    def cmd_start(message: types.Message):
-        """Handle /start command."""
-        try:
-            # Create or get user
-            UserDB.create_or_get(
-                telegram_id=message.from_user.id,
-                username=message.from_user.username
-            )
-            
-            bot.send_message(
-                message.chat.id,
-                MESSAGES['start'],
-                reply_markup=get_main_menu(),
-                parse_mode='HTML'
-            )
-            logger.info(f"User {message.from_user.id} started bot")
-        except Exception as e:
-            logger.error(f"Error in cmd_start: {e}")
-            bot.reply_to(message, MESSAGES['error'])
+    logger.info("User %s started bot", message.from_user.id)
+    return [Send(MESSAGES['start'], get_main_menu(), 'HTML')]
+
+
+@command(COMMANDS, 'help')
+@rate_limit(seconds=2, action='info', burst=3)
+def cmd_help(message: types.Message):
+    """Handle /help command."""
+    return [Send(MESSAGES['help'], parse_mode='HTML')]
+
+
+@command(COMMANDS, 'menu')
+@rate_limit(seconds=2, action='info', burst=3)
+def cmd_menu(message: types.Message):
+    """Handle /menu command: inline menu that updates in place."""
+    return [Send(MENU, inline_keyboards.get_main_menu(), 'HTML')]
+
+
+def notification_settings(message: types.Message, timezone: str = None, notify_hour: int = None):
+    """Show the user's notification time, changing it first if a value is given."""
+    user_id = UserDB.create_or_get(message.from_user.id, message.from_user.username)
+    if timezone is None and notify_hour is None:
+        settings = UserDB.get_notification_settings(user_id)
+    else:
+        settings = UserDB.set_notification_settings(user_id, timezone=timezone, notify_hour=notify_hour)
+    return [Send(
+        render_notification_settings(settings, saved=timezone is not None or notify_hour is not None),
+        parse_mode='HTML'
+    )]
+
+
+@command(COMMANDS, 'timezone')
+@rate_limit(seconds=2, action='edit')
+def cmd_timezone(message: types.Message):
+    """Handle /timezone [IANA name]: show or change the notification timezone."""
+    try:
+        timezone = parse_timezone(message.text)
+    except InputError as e:
+        return [Send(str(e), parse_mode='HTML')]
+    
+    try:
+        return notification_settings(message, timezone=timezone)
+    except Exception as e:
+        logger.error("Error in cmd_timezone: %s", e)
+        return [ReplyTo(MESSAGES['error'])]
+
+
+@command(COMMANDS, 'notify_time')
+@rate_limit(seconds=2, action='edit')
+def cmd_notify_time(message: types.Message):
+    """Handle /notify_time [hour]: show or change the local notification hour."""
+    try:
+        notify_hour = parse_notify_hour(message.text)
+    except InputError as e:
+        return [Send(str(e), parse_mode='HTML')]
     
-    @bot.message_handler(commands=['help'])
-    @rate_limit(seconds=2)
-    def cmd_help(message: types.Message):
-        """Handle /help command."""
-        try:
-            bot.send_message(
-                message.chat.id,
-                MESSAGES['help'],
-                parse_mode='HTML'
-            )
-        except Exception as e:
-            logger.error(f"Error in cmd_help: {e}")
-            bot.reply_to(message, MESSAGES['error'])
\ No newline at end of file
+    try:
+        return notification_settings(message, notify_hour=notify_hour)
+    except Exception as e:
+        logger.error("Error in cmd_notify_time: %s", e)
+        return [ReplyTo(MESSAGES['error'])]
+
+
+def register_command_handlers(bot: telebot.TeleBot):
+    """Register all command handlers."""
+    for name, flow in COMMANDS.items():
+        bot.register_message_handler(deliver(bot, flow), commands=[name])
@@ -0,0 +1,95 @@
+"""Replies returned by the handler flows, and their delivery on TeleBot.
+
+The flows in handlers.commands and handlers.birthdays do the database
+and state work for an update and return a list of the actions below
+instead of calling the Bot API. TeleBot and AsyncTeleBot therefore run
+the same flows: perform() delivers the actions on the handler thread,
+handlers.async_handlers runs the flow on the DB executor and awaits
+the API calls.
+"""
+import logging
+from collections import namedtuple
+from functools import wraps
+
+from telebot import apihelper
+
+from config import MESSAGES
+from utils.metrics import timed_handler
+
+logger = logging.getLogger(__name__)
+
+# Message to the chat of the update
+Send = namedtuple('Send', ['text', 'markup', 'parse_mode'], defaults=(None, None))
+# Reply quoting the user's message
+ReplyTo = namedtuple('ReplyTo', ['text', 'markup'], defaults=(None,))
+# New HTML text for the message an inline button belongs to
+Edit = namedtuple('Edit', ['text', 'markup'], defaults=(None,))
+# File to send; the file object is closed once sent
+Document = namedtuple('Document', ['file', 'filename', 'caption'])
+# Notification answering a callback query
+Notice = namedtuple('Notice', ['text'])
+# Download a file, then run flow(message, data, *args) and deliver its actions
+Download = namedtuple('Download', ['file_id', 'flow', 'args'], defaults=((),))
+
+
+def command(table: dict, name: str):
+    """Decorator adding a flow to a {command: flow} table (timed like routed handlers)."""
+    def decorator(func):
+        table[name] = timed_handler(func)
+        return func
+    return decorator
+
+
+def is_not_modified(error) -> bool:
+    """Whether an edit failed because the message already shows the view (double tap)."""
+    return 'message is not modified' in str(error)
+
+
+def perform(bot, message, actions) -> str:
+    """Deliver a flow's actions in the chat of `message`.
+    
+    Args:
+        bot: TeleBot
+        message: Message of the update (for callback queries, call.message)
+        actions: List of actions; None for nothing to send
+    
+    Returns:
+        Text of the Notice among the actions (None if there is none)
+    """
+    notice = None
+    for action in actions or ():
+        if isinstance(action, Send):
+            bot.send_message(message.chat.id, action.text, reply_markup=action.markup,
+                             parse_mode=action.parse_mode)
+        elif isinstance(action, ReplyTo):
+            bot.reply_to(message, action.text, reply_markup=action.markup)
+        elif isinstance(action, Edit):
+            try:
+                bot.edit_message_text(action.text, message.chat.id, message.message_id,
+                                      reply_markup=action.markup, parse_mode='HTML')
+            except apihelper.ApiTelegramException as e:
+                if not is_not_modified(e):
+                    raise
+        elif isinstance(action, Document):
+            with action.file:
+                bot.send_document(message.chat.id, action.file, visible_file_name=action.filename,
+                                  caption=action.caption)
+        elif isinstance(action, Notice):
+            notice = action.text
+        elif isinstance(action, Download):
+            try:
+                data = bot.download_file(bot.get_file(action.file_id).file_path)
+            except Exception as e:
+                logger.error("Error downloading file: %s", e)
+                bot.reply_to(message, MESSAGES['error'])
+                continue
+            notice = perform(bot, message, action.flow(message, data, *action.args)) or notice
+    return notice
+
+
+def deliver(bot, flow):
+    """TeleBot message handler running `flow` and performing its actions."""
+    @wraps(flow)
+    def handler(message):
+        perform(bot, message, flow(message))
+    return handler
@@ -0,0 +1,325 @@
+"""Message texts and input validation shared by the sync and async handlers.
+
+Everything here is pure (no I/O), so the TeleBot handlers and the
+AsyncTeleBot handlers only differ in how they reach the database and
+send replies.
+"""
+import math
+import re
+import html as html_module
+from datetime import date, datetime
+
+from database.models import MAX_BIRTHDAYS_PER_USER
+from utils.date_helpers import date_table
+from utils.timezones import get_zone
+
+# Constants
+MAX_NAME_LENGTH = 100
+MIN_BIRTH_YEAR = 1900
+# Year-less dates are stored in a leap year so 29.02 is valid
+NO_YEAR = 2000
+# Rows per page of the list and of the delete view (one button per row)
+LIST_PAGE_SIZE = 20
+DELETE_PAGE_SIZE = 10
+
+# ДД.ММ or ДД.ММ.ГГГГ, checked before parsing to tell bad format from bad date
+DATE_PATTERN = re.compile(r'\d{1,2}\.\d{1,2}(\.\d{4})?')
+# /notify_time argument: 9, 09, 9:00 or 09:00
+NOTIFY_HOUR_PATTERN = re.compile(r'(\d{1,2})(:00)?')
+
+FORMAT_ERROR = '❌ Неверный формат! Используй ДД.ММ.ГГГГ или ДД.ММ\nПример: <code>25.12.2000</code>'
+INVALID_DATE_ERROR = '❌ Неверная дата! Такой даты не существует.\nПример: <code>25.12.2000</code>'
+
+ASK_NAME = '👤 <b>Введи имя друга:</b>\n\n<i>Максимум 100 символов</i>'
+ASK_DATE = '📅 <b>Введи дату рождения</b>\nФормат: ДД.ММ.ГГГГ или ДД.ММ\n\nПример: <code>25.12.2000</code>'
+LIMIT_REACHED = (f'❌ <b>Достигнут лимит:</b> {MAX_BIRTHDAYS_PER_USER} дней рождения.\n\n'
+                 'Удали старые записи перед добавлением новых.')
+LIMIT_REACHED_ON_SAVE = f'❌ <b>Достигнут лимит:</b> {MAX_BIRTHDAYS_PER_USER} дней рождения'
+SAVE_ERROR = '❌ Ошибка при сохранении'
+CANCELLED = '❌ Отменено'
+NOTHING_TO_CANCEL = 'ℹ️ Нет активных операций'
+# Plain text: shown as a callback query notification
+DELETED = '✅ Удалено'
+DELETE_ERROR = '❌ Ошибка удаления'
+NO_BIRTHDAYS = '📅 <b>У тебя еще нет сохраненных дней рождения.</b>'
+NO_BIRTHDAYS_TO_DELETE = '📅 <b>У тебя нет сохраненных дней рождения.</b>'
+DELETE_NOT_FOUND = 'Запись уже удалена'
+MENU = '🏠 <b>Главное меню</b>\n\nВыбери действие:'
+# Plain text: shown as a callback query notification
+OUTDATED_BUTTON = 'Кнопка устарела'
+SLOW_DOWN = '⏳ Не так быстро! Попробуй через {seconds} сек.'
+UNKNOWN_COMMAND = 'ℹ️ Не понимаю эту команду.\n\nИспользуй кнопки меню или /help для справки.'
+TIMEZONE_ERROR = ('❌ Неизвестный часовой пояс.\n'
+                  'Пример: <code>/timezone Europe/Moscow</code> или <code>/timezone Asia/Yekaterinburg</code>')
+NOTIFY_HOUR_ERROR = '❌ Укажи час от 0 до 23.\nПример: <code>/notify_time 9</code>'
+
+
+class InputError(ValueError):
+    """User input that cannot be accepted; str(error) is the reply text (HTML)."""
+
+
+def parse_name(text: str) -> str:
+    """Validate a friend's name.
+    
+    Returns:
+        Stripped name
+    
+    Raises:
+        InputError: Name is empty or too long
+    """
+    name = (text or '').strip()
+    
+    if len(name) > MAX_NAME_LENGTH:
+        raise InputError(
+            f'❌ Слишком длинное имя! Максимум {MAX_NAME_LENGTH} символов.\n'
+            f'Твоё имя: {len(name)} символов.'
+        )
+    if not name:
+        raise InputError('❌ Имя не может быть пустым!')
+    
+    return name
+
+
+def parse_birth_date(text: str, today: date = None) -> tuple:
+    """Parse a birth date typed as ДД.ММ.ГГГГ or ДД.ММ.
+    
+    Args:
+        text: User input
+        today: Reference date for the year check (defaults to today)
+    
+    Returns:
+        (birth_date, birth_year) tuple; birth_year is None and birth_date
+        falls in year 2000 when no year was given
+    
+    Raises:
+        InputError: Wrong format, non-existent date or unreasonable year
+    """
+    if today is None:
+        today = date.today()
+    
+    date_text = (text or '').strip()
+    match = DATE_PATTERN.fullmatch(date_text)
+    if not match:
+        raise InputError(FORMAT_ERROR)
+    
+    has_year = match.group(1) is not None
+    try:
+        parsed = datetime.strptime(date_text if has_year else f'{date_text}.{NO_YEAR}', '%d.%m.%Y')
+    except ValueError:
+        # Invalid date like 31.02 or 30.02
+        raise InputError(INVALID_DATE_ERROR)
+    
+    if not has_year:
+        return parsed.date(), None
+    
+    if parsed.year < MIN_BIRTH_YEAR or parsed.year > today.year:
+        raise InputError(f'❌ Неверный год! Год должен быть между {MIN_BIRTH_YEAR} и {today.year}.')
+    
+    return parsed.date(), parsed.year
+
+
+def command_argument(text: str) -> str:
+    """Text after the command word (empty if there is none)."""
+    parts = (text or '').split(maxsplit=1)
+    return parts[1].strip() if len(parts) > 1 else ''
+
+
+def parse_timezone(text: str) -> str:
+    """Get the IANA timezone given with /timezone.
+    
+    Returns:
+        Timezone name, or None if the command has no argument
+    
+    Raises:
+        InputError: Unknown timezone
+    """
+    name = command_argument(text)
+    if not name:
+        return None
+    try:
+        get_zone(name)
+    except ValueError:
+        raise InputError(TIMEZONE_ERROR)
+    return name
+
+
+def parse_notify_hour(text: str) -> int:
+    """Get the local hour given with /notify_time.
+    
+    Returns:
+        Hour 0-23, or None if the command has no argument
+    
+    Raises:
+        InputError: Not an hour
+    """
+    value = command_argument(text)
+    if not value:
+        return None
+    match = NOTIFY_HOUR_PATTERN.fullmatch(value)
+    if not match or int(match.group(1)) > 23:
+        raise InputError(NOTIFY_HOUR_ERROR)
+    return int(match.group(1))
+
+
+def is_limit_error(error: ValueError) -> bool:
+    """Check whether BirthdayDB rejected a birthday because of the per-user limit."""
+    return 'Birthday limit reached' in str(error)
+
+
+def render_added(name: str, birth_date: date, birth_year: int = None) -> str:
+    """Confirmation after a birthday was saved."""
+    date_str = birth_date.strftime('%d.%m.%Y') if birth_year else birth_date.strftime('%d.%m')
+    return f'✅ <b>Добавлено!</b>\n\n👤 {html_module.escape(name)}\n📅 {date_str}'
+
+
+def render_confirm_add(name: str, birth_date: date, birth_year: int = None) -> str:
+    """Summary shown before saving a birthday added from the inline menu."""
+    date_str = birth_date.strftime('%d.%m.%Y') if birth_year else birth_date.strftime('%d.%m')
+    return f'❓ <b>Добавить день рождения?</b>\n\n👤 {html_module.escape(name)}\n📅 {date_str}'
+
+
+def render_slow_down(wait: float) -> str:
+    """Reply to a throttled user; `wait` is in seconds."""
+    return SLOW_DOWN.format(seconds=max(1, math.ceil(wait)))
+
+
+def render_notification_settings(settings: dict, saved: bool = False) -> str:
+    """Notification time of a user (as returned by UserDB.get_notification_settings)."""
+    text = (f'🔔 Уведомления приходят в <b>{settings["notify_hour"]:02d}:00</b> '
+            f'по времени <code>{html_module.escape(settings["timezone"])}</code>.\n\n'
+            'Изменить: <code>/timezone Europe/Moscow</code>, <code>/notify_time 9</code>')
+    return '✅ <b>Сохранено!</b>\n\n' + text if saved else text
+
+
+def render_upcoming(birthdays: list, days: int = 30) -> str:
+    """Upcoming birthdays (as returned by BirthdayDB.get_upcoming)."""
+    if not birthdays:
+        return f'📅 <b>В ближайшие {days} дней нет дней рождения.</b>'
+    
+    text = '🔔 <b>Ближайшие дни рождения:</b>\n\n'
+    for bd in birthdays:
+        date_str = bd['birth_date'].strftime('%d.%m')
+        days_left = bd['days_until']
+        
+        text += f'👤 <b>{bd["friend_name"]}</b> - {date_str}'
+        
+        if days_left == 0:
+            text += ' 🎉 <b>СЕГОДНЯ!</b>'
+        elif days_left == 1:
+            text += ' (завтра)'
+        else:
+            text += f' (через {days_left} дн.)'
+        
+        text += '\n'
+    
+    return text
+
+
+class Page:
+    """One keyset page of a user's birthdays.
+    
+    Pages are addressed by a cursor string instead of an offset:
+    '' is the first page, 'a<month_day>.<id>' the rows after that key and
+    'b<month_day>.<id>' the rows before it. Cursors fit in callback_data,
+    so navigation needs no per-user state.
+    """
+    
+    def __init__(self, rows: list, number: int, size: int, total: int, cursor: str,
+                 has_prev: bool, has_next: bool):
+        self.rows = rows
+        self.number = number
+        self.size = size
+        self.total = total
+        self.cursor = cursor
+        self.has_prev = has_prev
+        self.has_next = has_next
+    
+    @property
+    def pages(self) -> int:
+        return max(1, -(-self.total // self.size))
+    
+    @property
+    def prev_cursor(self) -> str:
+        """Cursor of the previous page (None on the first one)."""
+        if not self.has_prev or not self.rows:
+            return None
+        return encode_cursor('b', self.rows[0])
+    
+    @property
+    def next_cursor(self) -> str:
+        """Cursor of the next page (None on the last one)."""
+        if not self.has_next or not self.rows:
+            return None
+        return encode_cursor('a', self.rows[-1])
+
+
+def encode_cursor(direction: str, bd: dict) -> str:
+    """Cursor reading after ('a') or before ('b') a row."""
+    return f"{direction}{bd['month_day']}.{bd['id']}"
+
+
+def page_query(cursor: str) -> dict:
+    """Keyword arguments for BirthdayDB.get_page selecting a cursor's rows.
+    
+    Raises:
+        InputError: Malformed cursor (e.g. forged callback data)
+    """
+    if not cursor:
+        return {}
+    try:
+        month_day, birthday_id = (int(part) for part in cursor[1:].split('.'))
+    except ValueError:
+        raise InputError('Bad page cursor')
+    if cursor[0] == 'a':
+        return {'after': (month_day, birthday_id)}
+    if cursor[0] == 'b':
+        return {'before': (month_day, birthday_id)}
+    raise InputError('Bad page cursor')
+
+
+def make_page(rows: list, has_more: bool, number: int, size: int, total: int, cursor: str) -> Page:
+    """Build a Page from the result of BirthdayDB.get_page(**page_query(cursor))."""
+    backwards = cursor.startswith('b')
+    page = Page(
+        rows,
+        number=number,
+        size=size,
+        total=total,
+        cursor=cursor,
+        has_prev=has_more if backwards else bool(cursor),
+        has_next=True if backwards else has_more
+    )
+    # Page numbers travel in callback data and drift when rows are deleted
+    page.number = min(max(number, 1), page.pages)
+    return page
+
+
+def _page_header(title: str, page: Page) -> str:
+    if page.pages > 1:
+        return f'{title} <i>(стр. {page.number}/{page.pages})</i>\n\n'
+    return f'{title}\n\n'
+
+
+def render_birthday_page(page: Page, today: date = None) -> str:
+    """One page of the birthday list with ages where the year is known."""
+    if not page.rows:
+        return NO_BIRTHDAYS
+    age = date_table(today).age
+    
+    lines = []
+    for bd in page.rows:
+        date_str = bd['birth_date'].strftime('%d.%m')
+        # Names are already escaped in DB
+        line = f'👤 <b>{bd["friend_name"]}</b> - {date_str}'
+        if bd['birth_year']:
+            line += f' ({age(bd["birth_year"], bd["month_day"])} лет)'
+        lines.append(line)
+    
+    return _page_header('🎉 <b>Список дней рождения:</b>', page) + '\n'.join(lines)
+
+
+def render_delete_page(page: Page) -> str:
+    """Header of the delete view (the rows are buttons)."""
+    if not page.rows:
+        return NO_BIRTHDAYS_TO_DELETE
+    return _page_header('🗑️ <b>Нажми на запись, чтобы удалить:</b>', page).rstrip('\n')
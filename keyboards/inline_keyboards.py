@@ -1,54 +1,129 @@
 """Inline keyboards for the bot."""
+import html
 from telebot import types
 
+from .registry import keyboards
+
+# callback_data keys, routed by utils.callback_router ("<key>" or "<key>:<arguments>")
+MENU_ADD = 'menu_add'
+MENU_LIST = 'menu_list'
+MENU_UPCOMING = 'menu_upcoming'
+MENU_DELETE = 'menu_delete'
+BACK_TO_MENU = 'back_to_menu'
+CANCEL = 'cancel'
+CONFIRM_ADD = 'confirm_add'
+CANCEL_ADD = 'cancel_add'
+# Paginated views: "<key>:<page number>:<cursor>"
+LIST_PAGE = 'page_list'
+DELETE_PAGE = 'page_delete'
+# Delete buttons: "delete:<birthday id>:<page number>:<cursor>" (re-render the same page)
+DELETE = 'delete'
+
+def parse_page_callback(data: str) -> tuple:
+    """Split page callback data into (page number, cursor); ValueError if malformed.
+    
+    Data without arguments (the menu buttons) opens the first page.
+    """
+    _, sep, page = data.partition(':')
+    if not sep:
+        return 1, ''
+    number, _, cursor = page.partition(':')
+    return int(number), cursor
+
+def parse_delete_callback(data: str) -> tuple:
+    """Split delete button data into (birthday_id, page number, cursor); ValueError if malformed."""
+    _, birthday_id, number, cursor = data.split(':', 3)
+    return int(birthday_id), int(number), cursor
+
+@keyboards.static
 def get_main_menu() -> types.InlineKeyboardMarkup:
     """Get main inline menu with 4 buttons."""
     markup = types.InlineKeyboardMarkup(row_width=2)
     
-    btn_add = types.InlineKeyboardButton('➕ Добавить ДР', callback_data='menu_add')
-    btn_list = types.InlineKeyboardButton('📋 Список', callback_data='menu_list')
-    btn_upcoming = types.InlineKeyboardButton('🔔 Ближайшие', callback_data='menu_upcoming')
-    btn_delete = types.InlineKeyboardButton('🗑️ Удалить', callback_data='menu_delete')
+    btn_add = types.InlineKeyboardButton('➕ Добавить ДР', callback_data=MENU_ADD)
+    btn_list = types.InlineKeyboardButton('📋 Список', callback_data=MENU_LIST)
+    btn_upcoming = types.InlineKeyboardButton('🔔 Ближайшие', callback_data=MENU_UPCOMING)
+    btn_delete = types.InlineKeyboardButton('🗑️ Удалить', callback_data=MENU_DELETE)
     
     markup.add(btn_add, btn_list)
     markup.add(btn_upcoming, btn_delete)
     
     return markup
 
+def _back_button() -> types.InlineKeyboardButton:
+    return types.InlineKeyboardButton('🔙 Главное меню', callback_data=BACK_TO_MENU)
+
+@keyboards.static
 def get_back_to_menu() -> types.InlineKeyboardMarkup:
     """Get back to menu button."""
     markup = types.InlineKeyboardMarkup()
-    btn_back = types.InlineKeyboardButton('🔙 Главное меню', callback_data='back_to_menu')
-    markup.add(btn_back)
+    markup.add(_back_button())
     return markup
 
+@keyboards.static
 def get_cancel_keyboard() -> types.InlineKeyboardMarkup:
     """Get cancel keyboard."""
     markup = types.InlineKeyboardMarkup()
-    btn_cancel = types.InlineKeyboardButton('❌ Отменить', callback_data='cancel')
+    btn_cancel = types.InlineKeyboardButton('❌ Отменить', callback_data=CANCEL)
     markup.add(btn_cancel)
     return markup
 
+@keyboards.static
 def get_confirm_keyboard() -> types.InlineKeyboardMarkup:
     """Get confirmation keyboard."""
     markup = types.InlineKeyboardMarkup(row_width=2)
-    btn_confirm = types.InlineKeyboardButton('✅ Подтвердить', callback_data='confirm_add')
-    btn_cancel = types.InlineKeyboardButton('❌ Отмена', callback_data='cancel_add')
+    btn_confirm = types.InlineKeyboardButton('✅ Подтвердить', callback_data=CONFIRM_ADD)
+    btn_cancel = types.InlineKeyboardButton('❌ Отмена', callback_data=CANCEL_ADD)
     markup.add(btn_confirm, btn_cancel)
     return markup
 
-def get_delete_keyboard(birthdays: list) -> types.InlineKeyboardMarkup:
-    """Get delete keyboard with birthday list."""
+def _navigation_row(prefix: str, page) -> list:
+    """Previous/next buttons for a views.Page (empty on a single page)."""
+    row = []
+    if page.prev_cursor is not None:
+        row.append(types.InlineKeyboardButton(
+            '◀️ Назад', callback_data=f'{prefix}:{page.number - 1}:{page.prev_cursor}'
+        ))
+    if page.next_cursor is not None:
+        row.append(types.InlineKeyboardButton(
+            'Вперед ▶️', callback_data=f'{prefix}:{page.number + 1}:{page.next_cursor}'
+        ))
+    return row
+
+def _navigation_key(page) -> tuple:
+    return page.number, page.prev_cursor, page.next_cursor
+
+def _delete_key(page) -> tuple:
+    rows = tuple((bd['id'], bd['friend_name'], bd['birth_date']) for bd in page.rows)
+    return _navigation_key(page) + (page.cursor, rows)
+
+@keyboards.memoize(_navigation_key)
+def get_list_keyboard(page) -> types.InlineKeyboardMarkup:
+    """Get page navigation for the birthday list."""
+    markup = types.InlineKeyboardMarkup()
+    row = _navigation_row(LIST_PAGE, page)
+    if row:
+        markup.row(*row)
+    markup.add(_back_button())
+    return markup
+
+@keyboards.memoize(_delete_key)
+def get_delete_keyboard(page) -> types.InlineKeyboardMarkup:
+    """Get delete keyboard: one button per birthday on the page plus navigation."""
     markup = types.InlineKeyboardMarkup(row_width=1)
     
-    for bd in birthdays:
+    for bd in page.rows:
         date_str = bd['birth_date'].strftime('%d.%m')
-        btn_text = f"🗑️ {bd['friend_name']} - {date_str}"
-        btn = types.InlineKeyboardButton(btn_text, callback_data=f"delete_{bd['id']}")
+        # Button texts are plain text, names are stored HTML-escaped
+        btn_text = f"🗑️ {html.unescape(bd['friend_name'])} - {date_str}"
+        btn = types.InlineKeyboardButton(
+            btn_text, callback_data=f"{DELETE}:{bd['id']}:{page.number}:{page.cursor}"
+        )
         markup.add(btn)
     
-    # Back button
-    btn_back = types.InlineKeyboardButton('🔙 Назад', callback_data='back_to_menu')
-    markup.add(btn_back)
+    row = _navigation_row(DELETE_PAGE, page)
+    if row:
+        markup.row(*row)
+    markup.add(_back_button())
     
-    return markup
\ No newline at end of file
+    return markup
@@ -0,0 +1,85 @@
+"""Keyboards built and serialized once instead of on every reply."""
+from functools import wraps
+
+from telebot import types
+
+from config import KEYBOARD_CACHE_SIZE
+from utils.lru import LRUCache, MISSING
+
+
+class FrozenMarkup(types.JsonSerializable):
+    """Keyboard whose JSON is computed once.
+    
+    telebot calls to_json() on reply_markup for every request, so a
+    shared markup would be serialized again on each reply. This wrapper
+    returns the stored string instead. Attribute reads go through to the
+    wrapped markup; it must not be modified after freezing.
+    """
+    
+    def __init__(self, markup):
+        self.markup = markup
+        self._json = markup.to_json()
+    
+    def to_json(self) -> str:
+        return self._json
+    
+    def to_dict(self) -> dict:
+        return self.markup.to_dict()
+    
+    def __getattr__(self, name):
+        return getattr(self.markup, name)
+
+
+class KeyboardRegistry:
+    """Registry of keyboard builders.
+    
+    Builders without arguments are decorated with static(): they run
+    once at import time and every call returns the same FrozenMarkup.
+    Builders that depend on their arguments (pages, delete buttons) are
+    decorated with memoize(key): the frozen result is kept in an LRU
+    cache under key(*args), so a bounded number of layouts stays ready.
+    """
+    
+    def __init__(self, cache_size: int = 1024):
+        self._static = {}
+        self._cache = LRUCache(cache_size)
+    
+    def static(self, build):
+        """Build a parameterless keyboard now and return it on every call."""
+        name = f'{build.__module__}.{build.__qualname__}'
+        if name in self._static:
+            raise ValueError(f"Keyboard {name} is already registered")
+        frozen = self._static[name] = FrozenMarkup(build())
+        
+        @wraps(build)
+        def get():
+            return frozen
+        return get
+    
+    def memoize(self, key):
+        """Cache the keyboards of a builder under key(*args) (bounded LRU)."""
+        def decorator(build):
+            name = f'{build.__module__}.{build.__qualname__}'
+            
+            @wraps(build)
+            def get(*args):
+                cache_key = (name, key(*args))
+                frozen = self._cache.get(cache_key)
+                if frozen is MISSING:
+                    frozen = FrozenMarkup(build(*args))
+                    self._cache.set(cache_key, frozen)
+                return frozen
+            return get
+        return decorator
+    
+    def names(self) -> list:
+        """Names of the static keyboards."""
+        return list(self._static)
+    
+    def stats(self) -> dict:
+        """Hit/miss counters of the memoized keyboards."""
+        return self._cache.stats()
+
+
+# Shared registry used by the keyboard modules
+keyboards = KeyboardRegistry(KEYBOARD_CACHE_SIZE)
@@ -1,6 +1,9 @@
 """Reply keyboards for the bot."""
 from telebot import types
 
+from .registry import keyboards
+
+@keyboards.static
 def get_main_menu() -> types.ReplyKeyboardMarkup:
     """Get main menu keyboard."""
     markup = types.ReplyKeyboardMarkup(resize_keyboard=True, row_width=2)
@@ -17,6 +20,7 @@ def get_main_menu() -> types.ReplyKeyboardMarkup:
     
     return markup
 
+@keyboards.static
 def get_cancel_keyboard() -> types.ReplyKeyboardMarkup:
     """Get cancel keyboard."""
     markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
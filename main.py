@@ -2,20 +2,21 @@
 import logging
 import sys
 from bot import create_bot
-from database import init_db
+from config import RUN_MODE
+from database import init_db, close_all
+from database.state_store import states
+from database.write_coalescer import writes
 from handlers.commands import register_command_handlers
 from handlers.birthdays import register_birthday_handlers
+from utils.chat_executor import start_executor, stop_executor
+from utils.dispatcher import start_dispatcher, stop_dispatcher
+from utils.logging_setup import setup_logging
+from utils.metrics import start_metrics_server
+from utils.webhook import run_webhook
 # from utils.scheduler import start_scheduler, stop_scheduler
 
-# Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO,
-    handlers=[
-        logging.FileHandler('bot.log'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# Configure logging (queued, rotating; see LOGGING_SETTINGS)
+setup_logging()
 
 logger = logging.getLogger(__name__)
 
@@ -38,9 +39,17 @@ def main():
         # Initialize database
         logger.info("Initializing database...")
         init_db()
+        states.purge_expired()
         
-        # Create bot instance
-        bot = create_bot()
+        # Handler, database and scheduler metrics for Prometheus
+        start_metrics_server()
+        
+        # Create bot instance; handlers run on the chat executor, not telebot's pool
+        bot = create_bot(threaded=False)
+        start_executor(bot)
+        
+        # Route outgoing messages through the flood-limit aware dispatcher
+        start_dispatcher(bot).attach()
         
         # Register handlers
         logger.info("Registering handlers...")
@@ -55,29 +64,35 @@ def main():
         else:
             logger.info("Scheduler disabled (set ENABLE_SCHEDULER=True to enable)")
         
-        # Start polling
-        logger.info("Bot started successfully! Polling...")
-        bot.infinity_polling()
-        
+        # Start receiving updates
+        if RUN_MODE == 'webhook':
+            logger.info("Bot started successfully! Serving webhook...")
+            # Handlers run on the executor; one webhook thread queues updates in received order
+            run_webhook(bot, workers=1)
+        else:
+            # getUpdates is refused while a webhook is set
+            bot.remove_webhook()
+            logger.info("Bot started successfully! Polling...")
+            bot.infinity_polling()
+    
     except KeyboardInterrupt:
         logger.info("Bot stopped by user (Ctrl+C)")
-        
-        # Gracefully stop scheduler
+    except Exception as e:
+        logger.error("Fatal error: %s", e, exc_info=True)
+        sys.exit(1)
+    finally:
+        # infinity_polling() returns on Ctrl+C instead of raising, so shutdown is here
         if ENABLE_SCHEDULER:
             logger.info("Stopping scheduler...")
             # stop_scheduler()
             pass
         
+        # Updates already queued are handled (and their replies sent) first
+        stop_executor(wait=True)
+        stop_dispatcher()
+        writes.stop()
+        close_all()
         logger.info("Shutdown complete")
-    except Exception as e:
-        logger.error(f"Fatal error: {e}", exc_info=True)
-        
-        # Stop scheduler on error too
-        if ENABLE_SCHEDULER:
-            # stop_scheduler()
-            pass
-        
-        sys.exit(1)
 
 if __name__ == '__main__':
     main()
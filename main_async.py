@@ -0,0 +1,69 @@
+"""Asyncio entry point for the bot (AsyncTeleBot + async DB layer).
+
+Alternative to main.py: updates are handled as coroutines on one event
+loop and SQLite calls run on the DB executor, so slow disk I/O for one
+conversation does not hold up the others. Requires aiohttp.
+"""
+import asyncio
+import logging
+import sys
+from bot import create_async_bot
+from database import init_db, close_all
+from database.async_models import shutdown_executor
+from database.state_store import states
+from database.write_coalescer import writes
+from handlers.async_handlers import register_async_command_handlers, register_async_birthday_handlers
+from utils.logging_setup import setup_logging
+from utils.metrics import start_metrics_server
+
+# Configure logging (queued, rotating; see LOGGING_SETTINGS)
+setup_logging()
+
+logger = logging.getLogger(__name__)
+
+
+async def run():
+    """Create the async bot and poll until cancelled."""
+    bot = create_async_bot()
+    
+    logger.info("Registering handlers...")
+    register_async_command_handlers(bot)
+    register_async_birthday_handlers(bot)
+    
+    try:
+        # getUpdates is refused while a webhook is set
+        await bot.remove_webhook()
+        logger.info("Bot started successfully! Polling (asyncio)...")
+        await bot.infinity_polling()
+    finally:
+        await bot.close_session()
+
+
+def main():
+    """Main function to start the async bot."""
+    try:
+        logger.info("Starting async bot...")
+        
+        # Initialize database
+        logger.info("Initializing database...")
+        init_db()
+        states.purge_expired()
+        
+        # Handler, database and scheduler metrics for Prometheus
+        start_metrics_server()
+        
+        asyncio.run(run())
+    
+    except KeyboardInterrupt:
+        logger.info("Bot stopped by user (Ctrl+C)")
+    except Exception as e:
+        logger.error("Fatal error: %s", e, exc_info=True)
+        sys.exit(1)
+    finally:
+        shutdown_executor()
+        writes.stop()
+        close_all()
+        logger.info("Shutdown complete")
+
+if __name__ == '__main__':
+    main()
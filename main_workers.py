@@ -0,0 +1,63 @@
+"""Multi-process entry point: updates are sharded by chat to worker processes.
+
+Alternative to main.py for using more than one CPU core: this process
+receives updates (polling or webhook, per RUN_MODE) and forwards each to
+the worker owning its chat; WORKER_PROCESSES workers run the handlers.
+See utils/workers.py.
+"""
+import logging
+import sys
+from bot import create_bot
+from config import RUN_MODE
+from database import init_db, close_all
+from database.state_store import states
+from utils.logging_setup import forward_records, setup_logging
+from utils.metrics import start_metrics_server
+from utils.webhook import run_webhook
+from utils.workers import ShardingWebhookServer, create_supervisor
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    """Start the workers and feed them updates."""
+    # Configured here, not at import: spawned workers import this module too
+    setup_logging()
+    supervisor = None
+    
+    try:
+        logger.info("Starting bot with worker processes...")
+        
+        # Initialize database; workers open their own connections
+        init_db()
+        states.purge_expired()
+        close_all()
+        
+        supervisor = create_supervisor()
+        forward_records(supervisor.log_queue)
+        start_metrics_server()
+        supervisor.start()
+        
+        bot = create_bot()
+        if RUN_MODE == 'webhook':
+            logger.info("Supervisor started! Serving webhook...")
+            # One webhook thread keeps each chat's updates in received order
+            run_webhook(bot, ShardingWebhookServer, supervisor=supervisor, workers=1)
+        else:
+            # getUpdates is refused while a webhook is set
+            bot.remove_webhook()
+            logger.info("Supervisor started! Polling...")
+            supervisor.poll(bot)
+    
+    except KeyboardInterrupt:
+        logger.info("Bot stopped by user (Ctrl+C)")
+    except Exception as e:
+        logger.error("Fatal error: %s", e, exc_info=True)
+        sys.exit(1)
+    finally:
+        if supervisor is not None:
+            supervisor.stop()
+        logger.info("Shutdown complete")
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,12 @@
 """Utils package."""
-from .scheduler import start_scheduler
 
-__all__ = ['start_scheduler']
\ No newline at end of file
+__all__ = ['start_scheduler']
+
+
+def __getattr__(name):
+    # Imported lazily: the scheduler pulls in APScheduler and the database
+    # models, which themselves import utils.date_helpers
+    if name == 'start_scheduler':
+        from .scheduler import start_scheduler
+        return start_scheduler
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
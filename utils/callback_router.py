@@ -0,0 +1,47 @@
+"""Dispatch table for inline keyboard callbacks."""
+import logging
+
+from utils.metrics import timed_handler
+
+logger = logging.getLogger(__name__)
+
+# callback_data is "<key>" or "<key>:<arguments>"
+SEPARATOR = ':'
+
+
+class CallbackRouter:
+    """Routes callback queries to handlers by the key in front of their data.
+    
+    Instead of one callback_query_handler filter per button, which
+    telebot would try in turn for every tap, the bot registers a single
+    handler that looks the key up here (one dict lookup). Registering
+    the same key twice is an error, so clashing buttons fail at startup.
+    Handlers are timed in bot_handler_seconds (see utils.metrics).
+    """
+    
+    def __init__(self):
+        self._routes = {}
+    
+    def register(self, key: str, handler):
+        """Route callbacks whose data is `key` or starts with `key:`."""
+        if SEPARATOR in key:
+            raise ValueError(f"Callback key {key!r} must not contain {SEPARATOR!r}")
+        if key in self._routes:
+            raise ValueError(f"Callback key {key!r} is already routed to {self._routes[key].__name__}")
+        self._routes[key] = timed_handler(handler)
+    
+    def route(self, *keys: str):
+        """Decorator form of register() for one or more keys."""
+        def decorator(func):
+            for key in keys:
+                self.register(key, func)
+            return func
+        return decorator
+    
+    def resolve(self, data: str):
+        """Get the handler for callback data (None for unknown or outdated buttons)."""
+        key, _, _ = (data or '').partition(SEPARATOR)
+        return self._routes.get(key)
+    
+    def keys(self) -> list:
+        return list(self._routes)
@@ -0,0 +1,208 @@
+"""Handler execution on a thread pool, in order within each chat."""
+import logging
+import threading
+from collections import deque
+
+from config import EXECUTOR_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+# Update fields whose payload belongs to a chat
+CHAT_FIELDS = ('message', 'edited_message', 'channel_post', 'edited_channel_post',
+               'my_chat_member', 'chat_member', 'chat_join_request')
+# Update fields whose payload only has a user
+USER_FIELDS = ('inline_query', 'chosen_inline_result', 'shipping_query',
+               'pre_checkout_query', 'poll_answer')
+
+
+def update_chat_key(update) -> int:
+    """Chat id of a telebot Update, or the user's id for updates without a chat."""
+    for field in CHAT_FIELDS:
+        payload = getattr(update, field, None)
+        if payload is not None:
+            return payload.chat.id
+    
+    call = update.callback_query
+    if call is not None:
+        return call.message.chat.id if call.message else call.from_user.id
+    
+    for field in USER_FIELDS:
+        payload = getattr(update, field, None)
+        if payload is not None:
+            user = getattr(payload, 'from_user', None) or getattr(payload, 'user', None)
+            if user is not None:
+                return user.id
+    return update.update_id
+
+
+class ChatExecutor:
+    """Thread pool running jobs in parallel across chats, serially within a chat.
+    
+    Every chat with work has a FIFO of jobs. A chat is given to one
+    worker at a time, which runs its next job and puts the chat back at
+    the end of the ready queue if more jobs are waiting. Chats take turns
+    (a busy chat cannot hold up the others), the steps of a dialog run in
+    the order they arrived, and a chat's state is never touched by two
+    threads at once. submit() blocks while `max_pending` jobs are queued,
+    which slows polling down instead of growing memory.
+    """
+    
+    def __init__(self, workers: int = 16, max_pending: int = 10000):
+        self.workers = workers
+        self.max_pending = max_pending
+        
+        self._jobs = {}  # chat_id -> deque of (func, args); present while the chat has work
+        self._ready = deque()  # chats with jobs and no worker running them
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._has_ready = threading.Condition(self._lock)
+        self._has_room = threading.Condition(self._lock)
+        self._stopping = False
+        self._threads = []
+        self._attached = None
+    
+    def start(self):
+        """Start the worker threads."""
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'handler-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info("Chat executor started with %s workers", self.workers)
+        return self
+    
+    def stop(self, wait: bool = True):
+        """Stop the workers, after the queued jobs if `wait`."""
+        with self._lock:
+            self._stopping = True
+            if not wait:
+                self._pending -= sum(len(jobs) for jobs in self._jobs.values())
+                self._jobs.clear()
+                self._ready.clear()
+            self._has_ready.notify_all()
+            self._has_room.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+        self.detach()
+        logger.info("Chat executor stopped")
+    
+    def submit(self, chat_id: int, func, *args):
+        """Queue func(*args) to run after the chat's earlier jobs.
+        
+        Raises:
+            RuntimeError: The executor is stopping
+        """
+        with self._lock:
+            while self._pending >= self.max_pending and not self._stopping:
+                self._has_room.wait()
+            if self._stopping:
+                raise RuntimeError("Chat executor is stopping")
+            
+            self._pending += 1
+            jobs = self._jobs.get(chat_id)
+            if jobs is None:
+                self._jobs[chat_id] = deque([(func, args)])
+                self._ready.append(chat_id)
+                self._has_ready.notify()
+            else:
+                # Running or already waiting in _ready; its worker picks this up
+                jobs.append((func, args))
+    
+    def pending(self) -> int:
+        """Number of jobs queued or running."""
+        with self._lock:
+            return self._pending
+    
+    def attach(self, bot):
+        """Run the bot's update handling on the executor.
+        
+        Replaces bot.process_new_updates, which polling and the webhook
+        server call, with one that queues each update under its chat.
+        The bot must be created with threaded=False, so the executor's
+        threads run the handlers instead of telebot's unordered pool.
+        """
+        if getattr(bot, 'threaded', False):
+            raise ValueError("Attach the chat executor to a bot created with threaded=False")
+        if self._attached is not None:
+            return
+        
+        original = bot.process_new_updates
+        
+        def process_new_updates(updates):
+            for update in updates:
+                # Polling asks for updates after last_update_id, which telebot
+                # only advances when handling them: move it before queuing
+                if update.update_id > bot.last_update_id:
+                    bot.last_update_id = update.update_id
+                self.submit(update_chat_key(update), original, [update])
+        
+        bot.process_new_updates = process_new_updates
+        self._attached = bot
+    
+    def detach(self):
+        """Restore the bot method replaced by attach()."""
+        if self._attached is not None:
+            del self._attached.process_new_updates
+            self._attached = None
+    
+    def _worker(self):
+        while True:
+            with self._lock:
+                while not self._ready and not self._stopping:
+                    self._has_ready.wait()
+                if not self._ready:
+                    return
+                chat_id = self._ready.popleft()
+                func, args = self._jobs[chat_id].popleft()
+            
+            try:
+                func(*args)
+            except Exception as e:
+                logger.error("Error handling update for chat %s: %s", chat_id, e, exc_info=True)
+            
+            with self._lock:
+                self._pending -= 1
+                self._has_room.notify()
+                # stop(wait=False) may have dropped the chat meanwhile
+                jobs = self._jobs.get(chat_id)
+                if jobs:
+                    self._ready.append(chat_id)
+                    self._has_ready.notify()
+                elif jobs is not None:
+                    del self._jobs[chat_id]
+
+
+# Shared executor, created by start_executor()
+executor = None
+_start_lock = threading.Lock()
+
+
+def start_executor(bot, **overrides) -> ChatExecutor:
+    """Create and start the shared executor using config settings and attach it to bot.
+    
+    Args:
+        bot: Bot whose updates are handled on the executor
+        **overrides: ChatExecutor arguments replacing EXECUTOR_SETTINGS
+    """
+    global executor
+    
+    with _start_lock:
+        if executor is None:
+            executor = ChatExecutor(**dict(EXECUTOR_SETTINGS, **overrides)).start()
+            executor.attach(bot)
+        return executor
+
+
+def get_executor() -> ChatExecutor:
+    """Get the shared executor (None if not started)."""
+    return executor
+
+
+def stop_executor(wait: bool = True):
+    """Stop the shared executor, after every chat's queued jobs if `wait`."""
+    global executor
+    
+    with _start_lock:
+        if executor is not None:
+            executor.stop(wait=wait)
+            executor = None
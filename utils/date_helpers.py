@@ -1,5 +1,86 @@
 """Date calculation helpers for birthdays."""
-from datetime import date, datetime
+import calendar
+from collections import namedtuple
+from datetime import date, timedelta
+from functools import lru_cache
+
+# Sortable MMDD keys bounding a calendar year
+FIRST_MONTH_DAY = 101
+LAST_MONTH_DAY = 1231
+FEB_28 = 228
+FEB_29 = 229
+
+
+def month_day_key(birth_date: date) -> int:
+    """Encode month and day as a sortable MMDD integer (25 Dec -> 1225).
+    
+    Args:
+        birth_date: Any date (year is ignored)
+    
+    Returns:
+        MMDD integer as stored in birthdays.month_day
+    """
+    return birth_date.month * 100 + birth_date.day
+
+
+def celebrated_month_days(on_date: date) -> list:
+    """Get MMDD keys of birthdays celebrated on a given date.
+    
+    Args:
+        on_date: Calendar date
+    
+    Returns:
+        MMDD keys; Feb 28 of a non-leap year also covers Feb 29
+    """
+    key = month_day_key(on_date)
+    if key == FEB_28 and not calendar.isleap(on_date.year):
+        return [FEB_28, FEB_29]
+    return [key]
+
+
+def upcoming_month_day_ranges(days: int, from_date: date = None) -> list:
+    """Get MMDD ranges covering birthdays in the next N days.
+    
+    Ranges are returned in calendar order starting from from_date, so
+    reading them one after another yields birthdays sorted by days left.
+    Feb 29 birthdays are included on Feb 28 of non-leap years, matching
+    days_until_birthday.
+    
+    Args:
+        days: Window size in days (0 = only from_date)
+        from_date: Reference date (defaults to today)
+    
+    Returns:
+        List of inclusive (start, end) tuples, two if the window wraps
+        past the end of the year
+    """
+    if from_date is None:
+        from_date = date.today()
+    
+    start = month_day_key(from_date)
+    
+    # A full year or more covers every birthday
+    if days >= 365:
+        ranges = [(start, LAST_MONTH_DAY)]
+        if start > FIRST_MONTH_DAY:
+            ranges.append((FIRST_MONTH_DAY, start - 1))
+        return ranges
+    
+    end_date = from_date + timedelta(days=days)
+    end = month_day_key(end_date)
+    if end_date.year == from_date.year:
+        ranges = [(start, end, from_date.year)]
+    else:
+        ranges = [
+            (start, LAST_MONTH_DAY, from_date.year),
+            (FIRST_MONTH_DAY, end, end_date.year)
+        ]
+    
+    # Feb 29 is celebrated on Feb 28 in non-leap years
+    return [
+        (low, FEB_29 if high == FEB_28 and not calendar.isleap(year) else high)
+        for low, high, year in ranges
+    ]
 
 
 def days_until_birthday(birth_date: date, from_date: date = None) -> int:
@@ -76,3 +157,72 @@ def is_birthday_today(birth_date: date, reference_date: date = None) -> bool:
     
     return (birth_date.month == reference_date.month and 
             birth_date.day == reference_date.day)
+
+
+# Stands in for a date in the scalar helpers, which only read month and day
+_MonthDay = namedtuple('_MonthDay', ['month', 'day'])
+
+
+class DateTable:
+    """days_until_birthday and calculate_age precomputed for one reference date.
+    
+    The tables are filled by calling the scalar helpers once for every
+    (month, day) pair, impossible ones like 31.04 included, so lookups
+    give exactly their results (Feb 29 rules included) while a row costs
+    one list index instead of building several date objects. Tables are
+    indexed by MMDD keys (see month_day_key).
+    """
+    
+    def __init__(self, reference_date: date):
+        self.reference_date = reference_date
+        self._year = reference_date.year
+        # MMDD -> days until the next birthday / 1 if this year's is still ahead
+        self._days = [0] * (LAST_MONTH_DAY + 1)
+        self._ahead = [0] * (LAST_MONTH_DAY + 1)
+        for month in range(1, 13):
+            for day in range(1, 32):
+                key = month * 100 + day
+                month_day = _MonthDay(month, day)
+                self._days[key] = days_until_birthday(month_day, reference_date)
+                self._ahead[key] = -calculate_age(self._year, month_day, reference_date)
+    
+    def days_until(self, month_day: int) -> int:
+        """Days until the birthday with this MMDD key (0 if today)."""
+        return self._days[month_day]
+    
+    def age(self, birth_year: int, month_day: int) -> int:
+        """Age of someone born in birth_year on this MMDD key."""
+        return self._year - birth_year - self._ahead[month_day]
+    
+    def days_until_many(self, months, days) -> list:
+        """Days until each birthday given as parallel month and day sequences."""
+        table = self._days
+        return [table[month * 100 + day] for month, day in zip(months, days)]
+    
+    def ages(self, years, months, days) -> list:
+        """Ages for parallel year, month and day sequences (None where the year is None)."""
+        year, ahead = self._year, self._ahead
+        return [
+            None if birth_year is None else year - birth_year - ahead[month * 100 + day]
+            for birth_year, month, day in zip(years, months, days)
+        ]
+
+
+@lru_cache(maxsize=4)
+def _date_table(reference_date: date) -> DateTable:
+    return DateTable(reference_date)
+
+
+def date_table(reference_date: date = None) -> DateTable:
+    """Get the (cached) DateTable of a reference date (defaults to today)."""
+    return _date_table(reference_date or date.today())
+
+
+def days_until_batch(months, days, from_date: date = None) -> list:
+    """Batch form of days_until_birthday for month and day sequences."""
+    return date_table(from_date).days_until_many(months, days)
+
+
+def ages_batch(years, months, days, reference_date: date = None) -> list:
+    """Batch form of calculate_age for year, month and day sequences."""
+    return date_table(reference_date).ages(years, months, days)
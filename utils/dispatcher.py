@@ -0,0 +1,319 @@
+"""Outbound message dispatcher with Telegram flood-limit aware throttling."""
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import deque, OrderedDict
+from concurrent.futures import Future
+
+import requests
+from telebot.apihelper import ApiTelegramException
+
+from config import DISPATCHER_SETTINGS
+from utils.token_bucket import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Bot methods routed through the dispatcher by attach(), with the
+# position of their chat_id argument
+ATTACHED_METHODS = {
+    'send_message': 0,
+    'edit_message_text': 1,
+}
+
+
+class _Job:
+    """Single outbound API call."""
+    
+    __slots__ = ('method', 'args', 'kwargs', 'future', 'attempts')
+    
+    def __init__(self, method, args, kwargs):
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.attempts = 0
+
+
+class _Chat:
+    """Pending jobs and pacing state of one chat."""
+    
+    __slots__ = ('jobs', 'bucket', 'busy', 'scheduled')
+    
+    def __init__(self, rate: float, burst: float):
+        self.jobs = deque()
+        self.bucket = TokenBucket(rate, burst)
+        self.busy = False  # A worker is executing one of its jobs
+        self.scheduled = False  # Present in the ready heap
+
+
+class MessageDispatcher:
+    """Worker pool that sends bot API calls under Telegram's flood limits.
+    
+    Calls are queued per chat and executed in FIFO order, one at a time
+    per chat. A global token bucket (~30 msg/s) and a per-chat bucket
+    (1 msg/s) pace the workers. A 429 response pauses all sending for
+    the `retry_after` Telegram returns, since its flood wait applies to
+    the whole bot; network errors and 5xx responses are retried with
+    jittered exponential backoff.
+    """
+    
+    def __init__(self, bot, workers: int = 4, global_rate: float = 30, chat_rate: float = 1,
+                 chat_burst: float = 1, max_retries: int = 5, base_delay: float = 0.5,
+                 max_delay: float = 30):
+        self.bot = bot
+        self.workers = workers
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        
+        # No burst allowance: Telegram measures the global limit over short windows
+        self._global = TokenBucket(global_rate, 1)
+        self._chats = {}
+        self._idle = OrderedDict()  # chat_id -> None, oldest idle first
+        self._ready = []  # heap of (ready_at, seq, chat_id)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._pending = 0
+        self._running = False
+        self._threads = []
+        self._originals = {}
+    
+    # ==================== LIFECYCLE ====================
+    
+    def start(self):
+        """Start worker threads."""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'dispatcher-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info("Dispatcher started with %s workers", self.workers)
+    
+    def stop(self, wait: bool = True):
+        """Stop workers, by default after the queue has drained."""
+        with self._cond:
+            self._running = False
+            if not wait:
+                self._cancel_pending()
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+        self.detach()
+        logger.info("Dispatcher stopped")
+    
+    def _cancel_pending(self):
+        for chat in self._chats.values():
+            while chat.jobs:
+                chat.jobs.popleft().future.cancel()
+                self._pending -= 1
+        self._ready.clear()
+    
+    # ==================== SUBMISSION ====================
+    
+    def submit(self, chat_id: int, method: str, /, *args, **kwargs) -> Future:
+        """Queue a bot API call for a chat.
+        
+        Args:
+            chat_id: Chat the call is addressed to (used for ordering and pacing)
+            method: Name of the TeleBot method, e.g. 'send_message'
+            *args, **kwargs: Arguments passed to the method
+        
+        Returns:
+            Future resolved with the method's return value
+        """
+        job = _Job(self._originals.get(method) or getattr(self.bot, method), args, kwargs)
+        with self._cond:
+            if not self._running:
+                raise RuntimeError("Dispatcher is not running")
+            chat = self._chats.get(chat_id)
+            if chat is None:
+                chat = self._chats[chat_id] = _Chat(self.chat_rate, self.chat_burst)
+            self._idle.pop(chat_id, None)
+            chat.jobs.append(job)
+            self._pending += 1
+            if not chat.busy and not chat.scheduled:
+                self._schedule(chat_id, chat, time.monotonic())
+            self._prune_idle(time.monotonic())
+        return job.future
+    
+    def send_message(self, chat_id: int, text: str, **kwargs) -> Future:
+        """Queue a sendMessage call."""
+        return self.submit(chat_id, 'send_message', chat_id, text, **kwargs)
+    
+    def attach(self):
+        """Route the bot's own send methods through the dispatcher.
+        
+        Handlers keep calling bot.send_message / bot.reply_to /
+        bot.edit_message_text as before; each call is queued and blocks
+        until it has been sent, so return values and exceptions are
+        unchanged.
+        """
+        for name, chat_arg in ATTACHED_METHODS.items():
+            if name in self._originals:
+                continue
+            original = getattr(self.bot, name)
+            self._originals[name] = original
+            setattr(self.bot, name, self._make_blocking(name, original, chat_arg))
+    
+    def detach(self):
+        """Restore the bot methods replaced by attach()."""
+        for name, original in self._originals.items():
+            setattr(self.bot, name, original)
+        self._originals.clear()
+    
+    def _make_blocking(self, name, original, chat_arg):
+        def call(*args, **kwargs):
+            chat_id = args[chat_arg] if len(args) > chat_arg else kwargs.get('chat_id')
+            # Inline-mode edits have no chat to pace
+            if not self._running or chat_id is None:
+                return original(*args, **kwargs)
+            return self.submit(chat_id, name, *args, **kwargs).result()
+        call.__name__ = name
+        return call
+    
+    # ==================== SCHEDULING ====================
+    
+    def _schedule(self, chat_id, chat, ready_at):
+        """Put a chat with pending jobs into the ready heap (lock held)."""
+        chat.scheduled = True
+        heapq.heappush(self._ready, (ready_at, next(self._seq), chat_id))
+        self._cond.notify()
+    
+    def _prune_idle(self, now):
+        """Forget chats that have nothing queued and a refilled bucket (lock held)."""
+        while self._idle:
+            chat_id = next(iter(self._idle))
+            if not self._chats[chat_id].bucket.is_full(now):
+                break
+            del self._idle[chat_id]
+            del self._chats[chat_id]
+    
+    def _next_job(self):
+        """Block until a chat is allowed to send, then take its next job."""
+        with self._cond:
+            while True:
+                if not self._running and not self._pending:
+                    return None, None
+                if not self._ready:
+                    self._cond.wait()
+                    continue
+                
+                ready_at, _, chat_id = self._ready[0]
+                now = time.monotonic()
+                if ready_at > now:
+                    self._cond.wait(ready_at - now)
+                    continue
+                
+                heapq.heappop(self._ready)
+                chat = self._chats[chat_id]
+                chat.scheduled = False
+                wait = chat.bucket.try_consume(now)
+                if wait:
+                    self._schedule(chat_id, chat, now + wait)
+                    continue
+                
+                chat.busy = True
+                return chat_id, chat.jobs.popleft()
+    
+    def _worker(self):
+        while True:
+            chat_id, job = self._next_job()
+            if job is None:
+                return
+            
+            self._global.consume()
+            job.attempts += 1
+            retry_in = None
+            try:
+                result = job.method(*job.args, **job.kwargs)
+            except Exception as e:
+                retry_in = self._retry_delay(job, e)
+                if retry_in is None:
+                    logger.error("Dispatcher: giving up on chat %s after %s attempt(s): %s",
+                                 chat_id, job.attempts, e)
+                    job.future.set_exception(e)
+            else:
+                job.future.set_result(result)
+            
+            with self._cond:
+                chat = self._chats[chat_id]
+                chat.busy = False
+                now = time.monotonic()
+                if retry_in is not None:
+                    chat.jobs.appendleft(job)
+                    self._schedule(chat_id, chat, now + retry_in)
+                else:
+                    self._pending -= 1
+                    if chat.jobs:
+                        self._schedule(chat_id, chat, now)
+                    else:
+                        self._idle[chat_id] = None
+                    if not self._pending:
+                        self._cond.notify_all()
+    
+    def _retry_delay(self, job, error):
+        """Decide whether a failed call is retried.
+        
+        Returns:
+            Seconds to wait before retrying, or None to give up
+        """
+        if job.attempts > self.max_retries:
+            return None
+        
+        if isinstance(error, ApiTelegramException):
+            if error.error_code == 429:
+                parameters = (error.result_json or {}).get('parameters') or {}
+                retry_after = parameters.get('retry_after', 1)
+                logger.warning("Flood limit hit, pausing sends for %ss", retry_after)
+                self._global.pause(retry_after)
+                return float(retry_after)
+            if error.error_code < 500:
+                return None  # Bad request, blocked by user, etc.
+        elif not isinstance(error, (requests.exceptions.ConnectionError,
+                                    requests.exceptions.Timeout)):
+            return None
+        
+        # Exponential backoff with equal jitter
+        delay = min(self.max_delay, self.base_delay * 2 ** (job.attempts - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+
+# Shared dispatcher, created by start_dispatcher()
+dispatcher = None
+# The scheduler thread may start it while the main thread does
+_start_lock = threading.Lock()
+
+
+def start_dispatcher(bot, **overrides) -> MessageDispatcher:
+    """Create and start the shared dispatcher using config settings.
+    
+    Args:
+        bot: Bot whose API calls are dispatched
+        **overrides: MessageDispatcher arguments replacing DISPATCHER_SETTINGS
+    """
+    global dispatcher
+    
+    with _start_lock:
+        if dispatcher is None:
+            dispatcher = MessageDispatcher(bot, **dict(DISPATCHER_SETTINGS, **overrides))
+            dispatcher.start()
+        return dispatcher
+
+
+def stop_dispatcher(wait: bool = True):
+    """Stop the shared dispatcher."""
+    global dispatcher
+    
+    with _start_lock:
+        if dispatcher is not None:
+            dispatcher.stop(wait=wait)
+            dispatcher = None
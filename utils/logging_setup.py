@@ -0,0 +1,201 @@
+"""Non-blocking logging pipeline.
+
+Loggers put records on an in-process queue and return; a listener thread
+formats them and writes to a rotating log file and stdout. Records are
+queued unformatted, so the %-style arguments are only rendered on the
+listener thread (pass immutable values: ids, strings, exceptions).
+High-volume INFO lines of the handlers can be sampled per message
+template, and LOG_FORMAT=json writes one JSON object per line.
+"""
+import atexit
+import json
+import logging
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from config import LOGGING_SETTINGS
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Sampling counters are kept per template; dynamic messages could grow the table
+MAX_SAMPLED_TEMPLATES = 1024
+
+_listener = None
+# Listeners writing records of other processes (see forward_records)
+_forwarders = []
+
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+    
+    The stock prepare() renders the message (and the traceback) in the
+    calling thread; the queue here never leaves the process, so the
+    record can be queued as it is.
+    """
+    
+    def prepare(self, record):
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """Keep 1 in `every` INFO/DEBUG records of each message template.
+    
+    Only loggers in `loggers` (and their children) are sampled; warnings
+    and errors always pass. A template's first record is always kept,
+    so rare lines are not lost.
+    
+    Args:
+        every: Keep one record in this many per template
+        loggers: Names of the sampled loggers
+    """
+    
+    def __init__(self, every: int, loggers: tuple):
+        super().__init__()
+        self.every = every
+        self.loggers = frozenset(loggers)
+        self.prefixes = tuple(f'{name}.' for name in loggers)
+        self._seen = {}
+    
+    def filter(self, record) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        if record.name not in self.loggers and not record.name.startswith(self.prefixes):
+            return True
+        
+        # Counts may be off by one under contention, which sampling tolerates
+        seen = self._seen.get(record.msg, 0)
+        if not seen and len(self._seen) >= MAX_SAMPLED_TEMPLATES:
+            self._seen.clear()
+        self._seen[record.msg] = seen + 1
+        return seen % self.every == 0
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message (and exc)."""
+    
+    def format(self, record) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def skip_unused_record_fields():
+    """Stop filling LogRecord fields neither format prints.
+    
+    Looking up the caller's file, line and function is the most expensive
+    part of creating a record; thread and process names are cheaper but
+    also unused (see "Optimization" in the logging HOWTO).
+    """
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+
+def create_pipeline(settings: dict = LOGGING_SETTINGS, stream=None) -> tuple:
+    """Build the queue handler and its (not yet started) listener.
+    
+    Args:
+        settings: LOGGING_SETTINGS-like dict
+        stream: Console stream (defaults to stdout)
+    
+    Returns:
+        (handler to attach to a logger, QueueListener writing the records)
+    """
+    formatter = JsonFormatter() if settings['format'] == 'json' else logging.Formatter(TEXT_FORMAT)
+    
+    outputs = []
+    if settings['file']:
+        outputs.append(RotatingFileHandler(
+            settings['file'],
+            maxBytes=settings['max_bytes'],
+            backupCount=settings['backup_count'],
+            encoding='utf-8'
+        ))
+    if settings['stdout']:
+        outputs.append(logging.StreamHandler(stream or sys.stdout))
+    for output in outputs:
+        output.setFormatter(formatter)
+    
+    log_queue = queue.SimpleQueue()
+    handler = DeferredQueueHandler(log_queue)
+    if settings['sample_every'] > 1:
+        handler.addFilter(SamplingFilter(settings['sample_every'], settings['sampled_loggers']))
+    
+    return handler, QueueListener(log_queue, *outputs, respect_handler_level=True)
+
+
+def setup_logging(settings: dict = LOGGING_SETTINGS):
+    """Route the root logger through the queue pipeline.
+    
+    Replaces the root logger's handlers; the listener is stopped (and
+    the queue drained) at interpreter exit or by stop_logging().
+    """
+    global _listener
+    
+    handler, listener = create_pipeline(settings)
+    root = logging.getLogger()
+    for old in list(root.handlers):
+        root.removeHandler(old)
+        old.close()
+    root.addHandler(handler)
+    root.setLevel(settings['level'])
+    skip_unused_record_fields()
+    
+    stop_logging()
+    listener.start()
+    _listener = listener
+    atexit.register(stop_logging)
+
+
+def setup_worker_logging(log_queue, settings: dict = LOGGING_SETTINGS):
+    """Send the root logger's records to another process's queue.
+    
+    Used by worker processes: the parent writes their records through
+    forward_records(), so only one process owns (and rotates) the log
+    file. Messages are rendered here, since records are pickled on the
+    way; sampling also happens here, before anything is sent.
+    """
+    stop_logging()
+    handler = QueueHandler(log_queue)
+    if settings['sample_every'] > 1:
+        handler.addFilter(SamplingFilter(settings['sample_every'], settings['sampled_loggers']))
+    
+    root = logging.getLogger()
+    for old in list(root.handlers):
+        root.removeHandler(old)
+        old.close()
+    root.addHandler(handler)
+    root.setLevel(settings['level'])
+    skip_unused_record_fields()
+
+
+def forward_records(log_queue):
+    """Write records that worker processes put on `log_queue`.
+    
+    Needs setup_logging(): the records go to its file and stdout.
+    """
+    listener = QueueListener(log_queue, *_listener.handlers, respect_handler_level=True)
+    listener.start()
+    _forwarders.append(listener)
+
+
+def stop_logging():
+    """Write out queued records and stop the listener threads."""
+    global _listener
+    
+    while _forwarders:
+        _forwarders.pop().stop()
+    if _listener is not None:
+        listener, _listener = _listener, None
+        listener.stop()
+        for output in listener.handlers:
+            output.close()
@@ -0,0 +1,115 @@
+"""Bounded LRU cache."""
+import threading
+from collections import OrderedDict
+
+# Returned by LRUCache.get when a key is absent (None can be a cached value)
+MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache with hit/miss counters.
+    
+    Lookups and inserts are O(1); when the cache is full the least
+    recently used entry is evicted.
+    """
+    
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key, default=MISSING):
+        """Get a value and mark it as recently used."""
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key, value):
+        """Insert or replace a value, evicting the oldest entry if full."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+    
+    def get_or_create(self, key, factory):
+        """Get a value, first inserting factory() if the key is absent.
+        
+        Unlike get() followed by set(), two threads asking for the same
+        missing key get the same value. factory() runs under the cache
+        lock, so it must be cheap and must not use the cache.
+        """
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                value = factory()
+                if self.max_size > 0:
+                    self._data[key] = value
+                    if len(self._data) > self.max_size:
+                        self._data.popitem(last=False)
+                return value
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def pop(self, key, default=None):
+        """Remove a key and return its value."""
+        with self._lock:
+            return self._data.pop(key, default)
+    
+    def expire(self, is_expired) -> int:
+        """Remove least recently used entries while is_expired(value) holds.
+        
+        Stops at the first entry still in use, so a call only touches the
+        entries it removes plus one.
+        
+        Returns:
+            Number of removed entries
+        """
+        removed = 0
+        with self._lock:
+            while self._data:
+                value = next(iter(self._data.values()))
+                if not is_expired(value):
+                    break
+                self._data.popitem(last=False)
+                removed += 1
+        return removed
+    
+    def clear(self):
+        """Remove all entries and reset counters."""
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+    
+    def stats(self) -> dict:
+        """Get size and hit/miss counters."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0
+            }
+    
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+    
+    def __len__(self):
+        return len(self._data)
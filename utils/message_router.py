@@ -0,0 +1,87 @@
+"""Dispatch table for non-command messages."""
+import logging
+
+from utils.metrics import timed_handler
+
+logger = logging.getLogger(__name__)
+
+
+class MessageRouter:
+    """Routes messages to handlers by button text, then by FSM state.
+    
+    telebot tries message_handler filters one after another, so with a
+    filter per button and per state every update paid for a chain of
+    lambdas, several of them reading the state store. The bot registers
+    one handler instead and asks the router: an exact button text match
+    wins (so "❌ Отмена" works in any state), otherwise the chat's state
+    and the message's content type select the handler, and plain text
+    that matches nothing goes to the fallback. Each step is one dict
+    lookup, and the state is only read when no button matched.
+    
+    Registering the same text, the same state and content type, or a
+    second fallback raises ValueError, so clashes fail at startup.
+    Handlers are wrapped with timed_handler when registered, so every
+    routed message is counted in bot_handler_seconds.
+    """
+    
+    def __init__(self):
+        self._texts = {}
+        self._states = {}
+        self._fallback = None
+    
+    def register_text(self, text: str, handler):
+        """Route text messages equal to `text` (a reply keyboard button)."""
+        if text in self._texts:
+            raise ValueError(f"Button {text!r} is already routed to {self._texts[text].__name__}")
+        self._texts[text] = timed_handler(handler)
+    
+    def register_state(self, state: str, handler, content_type: str = 'text'):
+        """Route messages of `content_type` from chats in `state`."""
+        key = (state, content_type)
+        if key in self._states:
+            raise ValueError(f"State {state!r} ({content_type}) is already routed to {self._states[key].__name__}")
+        self._states[key] = timed_handler(handler)
+    
+    def register_fallback(self, handler):
+        """Route text that matched neither a button nor a state."""
+        if self._fallback is not None:
+            raise ValueError(f"Fallback is already routed to {self._fallback.__name__}")
+        self._fallback = timed_handler(handler)
+    
+    def text(self, *texts: str):
+        """Decorator form of register_text() for one or more buttons."""
+        def decorator(func):
+            for text in texts:
+                self.register_text(text, func)
+            return func
+        return decorator
+    
+    def state(self, *states: str, content_type: str = 'text'):
+        """Decorator form of register_state() for one or more states."""
+        def decorator(func):
+            for state in states:
+                self.register_state(state, func, content_type)
+            return func
+        return decorator
+    
+    def fallback(self, func):
+        """Decorator form of register_fallback()."""
+        self.register_fallback(func)
+        return func
+    
+    def content_types(self) -> list:
+        """Content types the bot handler has to accept."""
+        return sorted({'text'} | {content_type for _, content_type in self._states})
+    
+    def for_text(self, message):
+        """Get the button handler for a message (None if it is not a button)."""
+        if message.content_type != 'text':
+            return None
+        return self._texts.get(message.text)
+    
+    def for_state(self, state: str, message):
+        """Get the handler for a message from a chat in `state` (None to ignore it)."""
+        handler = self._states.get((state, message.content_type))
+        if handler is None and message.content_type == 'text':
+            return self._fallback
+        return handler
@@ -1,69 +1,262 @@
-"""Rate limiting utility for preventing spam."""
+"""Rate limiting utility for preventing spam.
+
+Every user gets one token bucket per action class ("view", "edit", ...),
+so opening /help does not block ➕ Добавить. Buckets live in a store:
+process memory by default, or a SQLite file shared by all worker
+processes on the host (RATE_LIMIT_BACKEND=sqlite).
+"""
+import asyncio
+import inspect
+import logging
+import threading
 import time
 from functools import wraps
-from collections import OrderedDict
-import logging
+from pathlib import Path
+
+from config import RATE_LIMIT_SETTINGS
+from utils.lru import LRUCache
+from utils.metrics import rate_limited
+from utils.token_bucket import TokenBucket
 
 logger = logging.getLogger(__name__)
 
-# Store last action time for each user with TTL
-# Using OrderedDict to maintain insertion order for cleanup
-user_last_action = OrderedDict()
-MAX_CACHE_SIZE = 10000  # Prevent unlimited growth
+# Action class of the "slow down" reply, limited like any other action
+NOTICE_ACTION = 'notice'
 
+# Rate limits are soft state: losing the last writes on a crash is fine
+SQLITE_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'OFF'),
+    ('busy_timeout', 5000),
+)
 
-def rate_limit(seconds: int = 2):
-    """Rate limiting decorator.
+
+class RateLimitStore:
+    """Interface of a token bucket store."""
     
-    Args:
-        seconds: Minimum seconds between actions
+    def try_consume(self, key: str, rate: float, capacity: float) -> float:
+        """Take a token from the bucket `key`, creating it full if needed.
+        
+        Returns:
+            0 if a token was taken, otherwise seconds until one is available
+        """
+        raise NotImplementedError
+    
+    def purge(self) -> int:
+        """Drop buckets that have refilled completely; return how many."""
+        raise NotImplementedError
+
+
+class MemoryRateLimitStore(RateLimitStore):
+    """Process-local buckets in an LRU cache.
+    
+    A full cache evicts the least recently used bucket, and purge() pops
+    refilled buckets from the same end, so neither scans the whole cache.
+    A refilled bucket is the same as a new one, so dropping it never lets
+    anyone through early.
     """
-    def decorator(func):
-        @wraps(func)
-        def wrapper(message):
-            user_id = message.from_user.id
-            current_time = time.time()
-            
-            # Auto-cleanup if cache is too large
-            if len(user_last_action) > MAX_CACHE_SIZE:
-                _cleanup_old_records()
-            
-            if user_id in user_last_action:
-                time_diff = current_time - user_last_action[user_id]
-                if time_diff < seconds:
-                    logger.warning(f"Rate limit exceeded for user {user_id}")
-                    # Don't execute the handler
-                    return
-            
-            user_last_action[user_id] = current_time
-            # Move to end to maintain LRU order
-            user_last_action.move_to_end(user_id)
+    
+    def __init__(self, cache_size: int = 10000):
+        self._buckets = LRUCache(cache_size)
+    
+    def try_consume(self, key, rate, capacity):
+        # Atomic, so concurrent first actions of a user share one bucket
+        bucket = self._buckets.get_or_create(key, lambda: TokenBucket(rate, capacity))
+        return bucket.try_consume()
+    
+    def purge(self):
+        now = time.monotonic()
+        return self._buckets.expire(lambda bucket: bucket.is_full(now))
+    
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SQLiteRateLimitStore(RateLimitStore):
+    """Buckets in a SQLite file, so every process on the host shares them.
+    
+    Each check is one short BEGIN IMMEDIATE transaction. Rows carry the
+    time their bucket will be full again, which purge() deletes by index.
+    """
+    
+    def __init__(self, db_file):
+        # Imported here so the memory store does not pull in the database package
+        from database.db import SQLiteBackend
+        
+        self._db = SQLiteBackend(db_file, pragmas=SQLITE_PRAGMAS)
+        self._ready = False
+    
+    def _ensure_schema(self):
+        with self._db.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS rate_limits (
+                    key TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated REAL NOT NULL,
+                    full_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_rate_limits_full_at ON rate_limits(full_at)')
+        self._ready = True
+    
+    def try_consume(self, key, rate, capacity):
+        if not self._ready:
+            self._ensure_schema()
+        
+        # Wall clock: monotonic clocks are not comparable between processes
+        now = time.time()
+        with self._db.transaction() as conn:
+            row = conn.execute('SELECT tokens, updated FROM rate_limits WHERE key = ?', (key,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row['tokens'] + max(0.0, now - row['updated']) * rate)
+            if tokens < 1:
+                return (1 - tokens) / rate
             
-            return func(message)
-        return wrapper
-    return decorator
+            tokens -= 1
+            conn.execute(
+                '''INSERT INTO rate_limits (key, tokens, updated, full_at) VALUES (?, ?, ?, ?)
+                   ON CONFLICT(key) DO UPDATE SET
+                       tokens = excluded.tokens,
+                       updated = excluded.updated,
+                       full_at = excluded.full_at''',
+                (key, tokens, now, now + (capacity - tokens) / rate)
+            )
+        return 0.0
+    
+    def purge(self):
+        if not self._ready:
+            return 0
+        with self._db.transaction() as conn:
+            return conn.execute('DELETE FROM rate_limits WHERE full_at < ?', (time.time(),)).rowcount
 
 
-def _cleanup_old_records(max_age_seconds: int = 3600):
-    """Internal cleanup function called automatically."""
-    current_time = time.time()
-    to_remove = []
+class RateLimiter:
+    """Token buckets per (user, action class) plus the throttled-user reply.
+    
+    Refilled buckets are purged by check() itself, at most once per
+    `purge_seconds`, so the store stays bounded without a scheduler.
+    """
+    
+    def __init__(self, store: RateLimitStore, notice_seconds: float = 10, purge_seconds: float = 600):
+        self.store = store
+        self.notice_seconds = notice_seconds
+        self.purge_seconds = purge_seconds
+        self._notifier = None
+        self._next_purge = time.monotonic() + purge_seconds
+        self._purge_lock = threading.Lock()
+    
+    def check(self, user_id: int, action: str, seconds: float, burst: int = 1) -> float:
+        """Take a token for an action.
+        
+        Args:
+            user_id: Telegram user ID
+            action: Action class sharing one bucket
+            seconds: Seconds per token (sustained rate)
+            burst: Bucket capacity (actions allowed back to back)
+        
+        Returns:
+            0 if allowed, otherwise seconds until the action is allowed again
+        """
+        try:
+            self._purge_if_due()
+            return self.store.try_consume(f'{user_id}:{action}', 1 / seconds, burst)
+        except Exception as e:
+            # A broken shared store must not take the bot down with it
+            logger.error("Rate limit store error: %s", e)
+            return 0.0
     
-    for user_id, last_time in user_last_action.items():
-        if current_time - last_time > max_age_seconds:
-            to_remove.append(user_id)
+    def _purge_if_due(self):
+        if time.monotonic() < self._next_purge:
+            return
+        # One caller purges; the others go on without waiting for it
+        if not self._purge_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_purge = time.monotonic() + self.purge_seconds
+            purged = self.purge()
+            if purged:
+                logger.info("Rate limiter purged %s refilled buckets", purged)
+        finally:
+            self._purge_lock.release()
     
-    for user_id in to_remove:
-        del user_last_action[user_id]
+    def on_throttled(self, func):
+        """Register func(message, wait) as the reply to throttled users.
+        
+        The reply is itself limited to one per `notice_seconds` per user.
+        A rate-limited handler returns func's result (e.g. the flow
+        actions of handlers.replies); func may be a coroutine function
+        for AsyncTeleBot handlers.
+        """
+        self._notifier = func
+        return func
     
-    if to_remove:
-        logger.info(f"Auto-cleaned {len(to_remove)} old rate limit records")
+    def notify(self, message, wait: float):
+        """Call the throttled-user reply if it is due (may return an awaitable)."""
+        if self._notifier is None:
+            return None
+        if self.check(message.from_user.id, NOTICE_ACTION, self.notice_seconds):
+            return None
+        return self._notifier(message, wait)
+    
+    def purge(self) -> int:
+        """Drop refilled buckets from the store."""
+        return self.store.purge()
+
+
+def create_rate_limiter() -> RateLimiter:
+    """Create the rate limiter configured in RATE_LIMIT_SETTINGS."""
+    if RATE_LIMIT_SETTINGS['backend'] == 'sqlite':
+        store = SQLiteRateLimitStore(Path(RATE_LIMIT_SETTINGS['db_file']))
+    else:
+        store = MemoryRateLimitStore(RATE_LIMIT_SETTINGS['cache_size'])
+    return RateLimiter(
+        store,
+        notice_seconds=RATE_LIMIT_SETTINGS['notice_seconds'],
+        purge_seconds=RATE_LIMIT_SETTINGS['purge_seconds']
+    )
 
 
-def clear_old_records(max_age_seconds: int = 3600):
-    """Clear old rate limit records manually.
+# Shared limiter used by the handlers
+limiter = create_rate_limiter()
+
+
+def rate_limit(seconds: float = 2, action: str = None, burst: int = 1):
+    """Rate limiting decorator.
     
     Args:
-        max_age_seconds: Maximum age of records to keep
+        seconds: Seconds per action once the burst is used up
+        action: Action class sharing one bucket per user (defaults to the handler name)
+        burst: Actions allowed back to back
     """
-    _cleanup_old_records(max_age_seconds)
\ No newline at end of file
+    def decorator(func):
+        action_class = action or func.__name__
+        rejected = rate_limited.labels(action_class)
+        
+        def wait_time(message) -> float:
+            wait = limiter.check(message.from_user.id, action_class, seconds, burst)
+            if wait:
+                rejected.inc()
+                logger.warning("Rate limit exceeded for user %s (%s)", message.from_user.id, action_class)
+            return wait
+        
+        # AsyncTeleBot handlers are coroutines and must stay awaitable
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(message):
+                wait = wait_time(message)
+                if not wait:
+                    return await func(message)
+                reply = limiter.notify(message, wait)
+                if inspect.isawaitable(reply):
+                    return await reply
+                return reply
+            return async_wrapper
+        
+        @wraps(func)
+        def wrapper(message):
+            # Don't execute the handler when limited
+            wait = wait_time(message)
+            if not wait:
+                return func(message)
+            return limiter.notify(message, wait)
+        return wrapper
+    return decorator
@@ -1,115 +1,245 @@
 """Scheduler for birthday notifications."""
 import logging
-from datetime import datetime, date
+import time
+from collections import defaultdict
+from concurrent.futures import Future, wait
+from datetime import date, datetime, timedelta
 from apscheduler.schedulers.background import BackgroundScheduler
-from database.db import get_connection
-from config import NOTIFICATION_TIME
-from utils.date_helpers import calculate_age, days_until_birthday
-from utils.rate_limiter import clear_old_records
+from database.models import BirthdayDB, NotificationDB, UserDB
+from database.state_store import states
+from config import NOTIFICATION_SETTINGS
+from utils.date_helpers import date_table, month_day_key
+from utils.timezones import SLOT_MINUTES, slot_local_date, slot_of, slot_start, utc_now
+from utils.dispatcher import start_dispatcher
+from utils.metrics import notifications, scheduler_run_seconds
+from utils.text_helpers import split_items
 
 logger = logging.getLogger(__name__)
 
 scheduler = None
 bot_instance = None
 
-def check_birthdays():
-    """Check for birthdays and send notifications."""
+# Days of notification ledger history kept
+LEDGER_RETENTION_DAYS = 7
+
+notifications_sent = notifications.labels('sent')
+notifications_failed = notifications.labels('failed')
+
+def _log_result(future, chat_id, kind):
+    """Log the outcome of a queued notification."""
+    if future.cancelled():
+        logger.warning("%s for user %s was cancelled", kind, chat_id)
+    elif future.exception():
+        logger.error("Error sending %s to %s: %s", kind, chat_id, future.exception())
+    else:
+        logger.info("Sent %s to user %s", kind, chat_id)
+
+def _queue(outbox, chat_id, message, ledger_keys, kind) -> Future:
+    """Queue a notification and record it in the ledger once delivered."""
+    future = outbox.send_message(chat_id, message, parse_mode='HTML')
+    
+    def on_done(f):
+        _log_result(f, chat_id, kind)
+        if not f.cancelled() and not f.exception():
+            try:
+                NotificationDB.mark_sent(ledger_keys)
+            except Exception as e:
+                logger.error("Error recording delivery to %s: %s", chat_id, e)
+    
+    future.add_done_callback(on_done)
+    return future
+
+def build_digest(birthdays: list, reminders: list, today: date) -> list:
+    """Build one user's daily digest.
+    
+    Args:
+        birthdays: Today's birthdays of the user's friends
+        reminders: Due reminders (rows from BirthdayDB.iter_reminders_due)
+        today: Date of the check
+    
+    Returns:
+        (text, ledger_keys) tuples, split to fit Telegram's length limit;
+        ledger_keys lists the notifications each message delivers
+    """
+    items = []
+    
+    if birthdays:
+        table = date_table(today)
+        items.append(("🎉 <b>Сегодня день рождения!</b>", None))
+        items.append(("", None))
+        for bd in birthdays:
+            line = f"🎂 <b>{bd['friend_name']}</b>"
+            if bd['birth_year']:
+                age = table.age(bd['birth_year'], month_day_key(bd['birth_date']))
+                line += f" исполняется <b>{age} лет</b>!"
+            items.append((line, bd['ledger_key']))
+        items.append(("", None))
+        items.append(("Не забудь поздравить! 🎁", None))
+    
+    if reminders:
+        if items:
+            items.append(("", None))
+        items.append(("🔔 <b>Напоминание!</b>", None))
+        items.append(("", None))
+        for bd in sorted(reminders, key=lambda r: r['remind_days_before']):
+            line = (f"Через {bd['remind_days_before']} дн. день рождения у <b>{bd['friend_name']}</b> "
+                    f"📅 {bd['target_date'].strftime('%d.%m')}")
+            items.append((line, bd['ledger_key']))
+    
+    return split_items(items)
+
+def check_birthdays(run_date: date = None, slot: int = None):
+    """Send the digests of the users whose notification time falls in a slot.
+    
+    Users are stored with the UTC send slot of their local notify_hour
+    (kept current by refresh_offsets), so each tick reads only its own
+    users through the notify_slot index and the load is spread over the
+    day. Users of the slot are handled
+    per UTC offset, because the offset decides their local date.
+    
+    Today's birthdays and due reminders are grouped by recipient, so each
+    user gets one digest (split only at Telegram's length limit) instead
+    of a message per friend. Digests are queued on the outbound
+    dispatcher; the check returns once all of them have been delivered
+    or have failed.
+    
+    Every delivered message is recorded in the notification ledger and
+    already recorded notifications are not selected again, so calling
+    this again after a crash or restart resumes where it stopped. The
+    slot is marked complete only when nothing failed. Users whose local
+    date of the slot has already passed are skipped.
+    
+    Args:
+        run_date: UTC date of the slot (defaults to now)
+        slot: Slot of the UTC day (defaults to the current one)
+    """
     if not bot_instance:
         logger.warning("Bot instance not set for scheduler")
         return
     
-    conn = None
+    run_start = time.perf_counter()
+    now = utc_now()
+    if run_date is None or slot is None:
+        run_date, slot = now.date(), slot_of(now)
+    started = slot_start(run_date, slot)
+    
+    outbox = start_dispatcher(bot_instance)
+    futures = []
+    errored = False
+    
     try:
-        conn = get_connection()
-        today = date.today()
+        NotificationDB.start_run(run_date, slot)
         
-        with conn.cursor(dictionary=True) as cursor:
-            # Get all birthdays that match today
-            cursor.execute('''
-                SELECT b.id, b.friend_name, b.birth_year, b.birth_date, u.telegram_id
-                FROM birthdays b
-                JOIN users u ON b.user_id = u.id
-                WHERE MONTH(b.birth_date) = %s AND DAY(b.birth_date) = %s
-            ''', (today.month, today.day))
-            
-            birthdays_today = cursor.fetchall()
+        for offset in UserDB.offsets_in_slot(slot):
+            today = slot_local_date(run_date, slot, offset)
+            if today < (now + timedelta(minutes=offset)).date():
+                # A late run: its "today" digest would name a past day
+                logger.info("Skipping UTC offset %s of slot %s: local date %s has passed",
+                            offset, started.strftime('%Y-%m-%d %H:%M'), today)
+                continue
             
-            # Send notifications for today's birthdays
-            for bd in birthdays_today:
-                try:
-                    message = f"🎉 <b>Сегодня день рождения!</b>\n\n"
-                    message += f"🎂 <b>{bd['friend_name']}</b>"
-                    
-                    if bd['birth_year']:
-                        age = calculate_age(bd['birth_year'], bd['birth_date'], today)
-                        message += f" исполняется <b>{age} лет</b>!"
-                    
-                    message += "\n\nНе забудь поздравить! 🎁"
-                    
-                    bot_instance.send_message(
-                        bd['telegram_id'],
-                        message,
-                        parse_mode='HTML'
-                    )
-                    logger.info(f"Sent birthday notification to user {bd['telegram_id']}")
-                except Exception as e:
-                    logger.error(f"Error sending notification to {bd['telegram_id']}: {e}")
+            # telegram_id -> (birthdays, reminders)
+            digests = defaultdict(lambda: ([], []))
             
-            # Get birthdays for upcoming reminders (excluding today to avoid duplicates)
-            cursor.execute('''
-                SELECT b.id, b.friend_name, b.birth_date, b.remind_days_before, u.telegram_id
-                FROM birthdays b
-                JOIN users u ON b.user_id = u.id
-                WHERE b.remind_days_before > 0
-                AND NOT (MONTH(b.birth_date) = %s AND DAY(b.birth_date) = %s)
-            ''', (today.month, today.day))
+            for bd in BirthdayDB.iter_birthdays_on(today, slot, offset):
+                digests[bd['telegram_id']][0].append(bd)
             
-            upcoming_birthdays = cursor.fetchall()
+            # Reminders whose date (birthday minus remind_days_before) is today
+            for bd in BirthdayDB.iter_reminders_due(today, slot, offset):
+                digests[bd['telegram_id']][1].append(bd)
             
-            for bd in upcoming_birthdays:
-                try:
-                    days_until = days_until_birthday(bd['birth_date'], today)
-                    
-                    # Send reminder only if days match AND it's not today (already handled above)
-                    if days_until == bd['remind_days_before'] and days_until > 0:
-                        # Calculate the actual date for display
-                        try:
-                            future_date = date(today.year, bd['birth_date'].month, bd['birth_date'].day)
-                        except ValueError:
-                            future_date = date(today.year, bd['birth_date'].month, 28)
-                        
-                        if future_date < today:
-                            try:
-                                future_date = date(today.year + 1, bd['birth_date'].month, bd['birth_date'].day)
-                            except ValueError:
-                                future_date = date(today.year + 1, bd['birth_date'].month, 28)
-                        
-                        message = f"🔔 <b>Напоминание!</b>\n\n"
-                        message += f"Через {days_until} дн. день рождения у <b>{bd['friend_name']}</b>\n"
-                        message += f"📅 {future_date.strftime('%d.%m')}"
-                        
-                        bot_instance.send_message(
-                            bd['telegram_id'],
-                            message,
-                            parse_mode='HTML'
-                        )
-                        logger.info(f"Sent reminder to user {bd['telegram_id']}")
-                except Exception as e:
-                    logger.error(f"Error sending reminder: {e}")
-        
+            for telegram_id, (birthdays, reminders) in digests.items():
+                for message, ledger_keys in build_digest(birthdays, reminders, today):
+                    futures.append(_queue(outbox, telegram_id, message, ledger_keys, 'birthday digest'))
+    
     except Exception as e:
-        logger.error(f"Critical error in check_birthdays: {e}", exc_info=True)
+        logger.error("Critical error in check_birthdays: %s", e, exc_info=True)
+        errored = True  # Keeps the run incomplete
     finally:
-        if conn:
-            conn.close()
+        done, _ = wait(futures)
+        sent = sum(1 for f in done if not f.cancelled() and not f.exception())
+        failed = len(futures) - sent
+        notifications_sent.inc(sent)
+        notifications_failed.inc(failed)
+        scheduler_run_seconds.observe(time.perf_counter() - run_start)
+        logger.info("Birthday check for %s UTC finished: %s messages sent, %s failed",
+                    started.strftime('%Y-%m-%d %H:%M'), sent, failed)
+    
+    try:
+        if not failed and not errored:
+            NotificationDB.complete_run(run_date, slot)
+    except Exception as e:
+        logger.error("Error updating notification ledger: %s", e)
 
-def cleanup_rate_limiter():
-    """Periodic cleanup of rate limiter records."""
+def due_slots(now: datetime = None) -> list:
+    """Recent (run_date, slot) pairs that have not completed, oldest first.
+    
+    Covers the slot containing `now` (defaults to the current time) and
+    the earlier ones of the last NOTIFICATION_SETTINGS['catch_up_hours'];
+    notifications of older slots are too late to be useful.
+    """
+    now = now or utc_now()
+    current = slot_start(now.date(), slot_of(now))
+    moment = current - timedelta(hours=NOTIFICATION_SETTINGS['catch_up_hours'])
+    completed = NotificationDB.completed_runs(moment.date())
+    
+    due = []
+    while moment <= current:
+        run = (moment.date(), slot_of(moment))
+        if run not in completed:
+            due.append(run)
+        moment += timedelta(minutes=SLOT_MINUTES)
+    return due
+
+def check_due_slots():
+    """Scheduler tick: run the current slot and the recent ones left incomplete.
+    
+    A slot whose tick was skipped (the previous tick was still sending,
+    or the bot was down) or that did not complete is run by the next
+    tick, so the slots come from the ledger, not from the tick's time.
+    """
     try:
-        clear_old_records(max_age_seconds=3600)
-        logger.info("Rate limiter cleanup completed")
+        due = due_slots()
     except Exception as e:
-        logger.error(f"Error in rate limiter cleanup: {e}")
+        logger.error("Error checking for due birthday slots: %s", e)
+        return
+    
+    if len(due) > 1:
+        logger.info("Running %s incomplete birthday check slots", len(due))
+    for run_date, slot in due:
+        check_birthdays(run_date, slot)
+
+def refresh_offsets(at: datetime = None):
+    """Periodic move of users whose timezone changed its UTC offset (DST).
+    
+    Runs a few minutes before each hour with the offsets at the coming
+    hour, when zones change them, so its slots already select the users
+    by their new offset.
+    
+    Args:
+        at: Moment of the offsets (defaults to the next whole UTC hour)
+    """
+    if at is None:
+        at = utc_now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    try:
+        UserDB.refresh_utc_offsets(at)
+    except Exception as e:
+        logger.error("Error refreshing UTC offsets: %s", e)
+
+def cleanup_ledger():
+    """Periodic purge of old notification ledger entries and slot runs."""
+    try:
+        pruned = NotificationDB.prune(utc_now().date() - timedelta(days=LEDGER_RETENTION_DAYS))
+        logger.info("Notification ledger cleanup completed (%s entries dropped)", pruned)
+    except Exception as e:
+        logger.error("Error in notification ledger cleanup: %s", e)
+
+def cleanup_states():
+    """Periodic purge of expired conversation states."""
+    try:
+        states.purge_expired()
+    except Exception as e:
+        logger.error("Error in state cleanup: %s", e)
 
 def start_scheduler(bot):
     """Start the background scheduler."""
@@ -117,31 +247,53 @@ def start_scheduler(bot):
     
     bot_instance = bot
     scheduler = BackgroundScheduler()
+    # Offsets may have changed while the bot was down
+    refresh_offsets(utc_now())
+    
+    # Check the users of each send slot at its start (UTC, like the slots);
+    # the first run, right away, covers the slots missed while the bot was down
+    scheduler.add_job(
+        check_due_slots,
+        'cron',
+        minute=f'*/{SLOT_MINUTES}',
+        timezone='UTC',
+        id='birthday_check',
+        next_run_time=utc_now(),
+        misfire_grace_time=SLOT_MINUTES * 60,
+        coalesce=True
+    )
     
-    # Schedule daily birthday check
+    # Schedule hourly offset refresh, ahead of the hour's first slot
     scheduler.add_job(
-        check_birthdays,
+        refresh_offsets,
         'cron',
-        hour=NOTIFICATION_TIME['hour'],
-        minute=NOTIFICATION_TIME['minute'],
-        id='birthday_check'
+        minute=55,
+        timezone='UTC',
+        id='offset_refresh'
     )
     
-    # Schedule hourly rate limiter cleanup
+    # Schedule hourly purge of old notification ledger entries
     scheduler.add_job(
-        cleanup_rate_limiter,
+        cleanup_ledger,
         'interval',
         hours=1,
-        id='rate_limiter_cleanup'
+        id='ledger_cleanup'
+    )
+    
+    # Schedule hourly purge of abandoned dialogs
+    scheduler.add_job(
+        cleanup_states,
+        'interval',
+        hours=1,
+        id='state_cleanup'
     )
     
     scheduler.start()
-    logger.info(f"Scheduler started. Will check birthdays daily at {NOTIFICATION_TIME['hour']}:{NOTIFICATION_TIME['minute']:02d}")
+    logger.info("Scheduler started. Will check birthdays every %s minutes "
+                "for users whose local notification hour has come", SLOT_MINUTES)
 
 def stop_scheduler():
     """Stop the scheduler gracefully."""
-    global scheduler
-    
     if scheduler and scheduler.running:
         scheduler.shutdown(wait=True)
         logger.info("Scheduler stopped gracefully")
@@ -0,0 +1,77 @@
+"""Text helpers for outgoing Telegram messages."""
+
+# Telegram rejects messages longer than this (in characters)
+MAX_MESSAGE_LENGTH = 4096
+
+
+def split_items(items, limit: int = MAX_MESSAGE_LENGTH) -> list:
+    """Join (line, payload) pairs into messages under the length limit.
+    
+    Works like split_message but also reports which payloads (e.g.
+    birthday ids) ended up in each message, so callers can track
+    delivery per item. Payloads of None are not reported.
+    
+    Args:
+        items: Iterable of (line, payload) pairs
+        limit: Maximum message length
+    
+    Returns:
+        List of (text, payloads) tuples
+    """
+    messages = []
+    current = []
+    payloads = []
+    length = 0
+    
+    def flush():
+        nonlocal length
+        text = '\n'.join(current)
+        # Telegram rejects blank messages (possible when a split lands on empty lines)
+        if text.strip():
+            messages.append((text, list(payloads)))
+        current.clear()
+        payloads.clear()
+        length = 0
+    
+    for line, payload in items:
+        while len(line) > limit:
+            head, line = line[:limit], line[limit:]
+            if current:
+                flush()
+            current.append(head)
+            if payload is not None:
+                payloads.append(payload)
+                payload = None
+            flush()
+        
+        # +1 for the newline joining it to the previous line
+        added = len(line) + (1 if current else 0)
+        if current and length + added > limit:
+            flush()
+            added = len(line)
+        
+        current.append(line)
+        if payload is not None:
+            payloads.append(payload)
+        length += added
+    
+    if current:
+        flush()
+    
+    return messages
+
+
+def split_message(lines: list, limit: int = MAX_MESSAGE_LENGTH) -> list:
+    """Join lines into as few messages as possible under the length limit.
+    
+    Messages are only split between lines, so HTML tags opened on a line
+    stay balanced. A single line longer than the limit is cut into pieces.
+    
+    Args:
+        lines: Message lines (without trailing newlines)
+        limit: Maximum message length
+    
+    Returns:
+        List of message texts
+    """
+    return [text for text, _ in split_items(((line, None) for line in lines), limit)]
@@ -0,0 +1,81 @@
+"""Per-user notification time: timezones and UTC send slots.
+
+The day is cut into UTC slots of NOTIFICATION_SETTINGS['slot_minutes']
+(a divisor of 60).
+Each user row stores the slot in which their local notify_hour falls
+(computed from the zone's current UTC offset), so the scheduler tick for
+a slot selects its users with one index lookup.
+"""
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from config import NOTIFICATION_SETTINGS
+
+SLOT_MINUTES = NOTIFICATION_SETTINGS['slot_minutes']
+DEFAULT_TIMEZONE = NOTIFICATION_SETTINGS['default_timezone']
+DEFAULT_NOTIFY_HOUR = NOTIFICATION_SETTINGS['default_hour']
+
+
+@lru_cache(maxsize=1024)
+def get_zone(name: str) -> ZoneInfo:
+    """Get a timezone by IANA name.
+    
+    Raises:
+        ValueError: Unknown timezone
+    """
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown timezone: {name}")
+
+
+def utc_now() -> datetime:
+    """Current time as an aware UTC datetime."""
+    return datetime.now(timezone.utc)
+
+
+def utc_offset_minutes(zone_name: str, at: datetime = None) -> int:
+    """UTC offset of a timezone at a moment (DST included), in minutes."""
+    at = at or utc_now()
+    return int(at.astimezone(get_zone(zone_name)).utcoffset().total_seconds() // 60)
+
+
+def send_slot(notify_hour: int, offset_minutes: int) -> int:
+    """UTC slot containing local time notify_hour:00 for a UTC offset."""
+    return (notify_hour * 60 - offset_minutes) % (24 * 60) // SLOT_MINUTES
+
+
+def slot_of(moment: datetime) -> int:
+    """Slot of an aware datetime."""
+    moment = moment.astimezone(timezone.utc)
+    return (moment.hour * 60 + moment.minute) // SLOT_MINUTES
+
+
+def slot_start(run_date: date, slot: int) -> datetime:
+    """Start of a slot on a UTC date, as an aware datetime."""
+    midnight = datetime(run_date.year, run_date.month, run_date.day, tzinfo=timezone.utc)
+    return midnight + timedelta(minutes=slot * SLOT_MINUTES)
+
+
+def slot_local_date(run_date: date, slot: int, offset_minutes: int) -> date:
+    """Local date on which users with a UTC offset are notified in a slot.
+    
+    Users of one slot and offset share one notify_hour; with offsets
+    that are not whole slots (+05:45) the slot starts a few minutes
+    before that hour, so the date is the one at the next whole hour.
+    """
+    local = slot_start(run_date, slot) + timedelta(minutes=offset_minutes)
+    local += timedelta(minutes=-local.minute % 60)
+    return local.date()
+
+
+def notification_columns(zone_name: str, notify_hour: int, at: datetime = None) -> dict:
+    """Values of the users notification columns for a timezone and hour."""
+    offset = utc_offset_minutes(zone_name, at)
+    return {
+        'timezone': zone_name,
+        'notify_hour': notify_hour,
+        'utc_offset_minutes': offset,
+        'notify_slot': send_slot(notify_hour, offset)
+    }
@@ -0,0 +1,62 @@
+"""Token bucket used to pace outbound requests."""
+import time
+import threading
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, up to `capacity`.
+    
+    Thread-safe; all methods take an optional `now` (time.monotonic())
+    so callers holding their own clock reading can avoid extra syscalls.
+    """
+    
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _refill(self, now: float):
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+    
+    def try_consume(self, now: float = None) -> float:
+        """Take one token if available.
+        
+        Returns:
+            0 if a token was taken, otherwise seconds until one is available
+        """
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+    
+    def consume(self):
+        """Take one token, sleeping until one is available."""
+        while True:
+            wait = self.try_consume()
+            if not wait:
+                return
+            time.sleep(wait)
+    
+    def pause(self, seconds: float, now: float = None):
+        """Drain the bucket so no token is available for `seconds`."""
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            self._refill(now)
+            self._tokens = min(self._tokens, 1 - seconds * self.rate)
+    
+    def is_full(self, now: float = None) -> bool:
+        """Check whether the bucket has refilled completely (i.e. is idle)."""
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            self._refill(now)
+            return self._tokens >= self.capacity
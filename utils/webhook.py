@@ -0,0 +1,164 @@
+"""Built-in webhook server, an alternative to long polling."""
+import hmac
+import json
+import logging
+import queue
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from telebot import types
+
+from config import WEBHOOK_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+# Telegram updates are small; anything larger is not from Telegram
+MAX_BODY_SIZE = 1024 * 1024
+
+
+class WebhookServer:
+    """HTTP listener that receives updates pushed by Telegram.
+    
+    Requests are checked against the secret token, acknowledged with 200
+    right away and handed to a bounded queue served by worker threads,
+    so Telegram never waits for handler execution. When the queue is
+    full the server answers 503 and Telegram redelivers the update later.
+    
+    Raises:
+        ValueError: No secret token; anyone reaching the port could post updates
+    """
+    
+    def __init__(self, bot, listen: str = '0.0.0.0', port: int = 8443, path: str = '/webhook',
+                 secret: str = '', workers: int = 4, queue_size: int = 1000):
+        if not secret:
+            raise ValueError("WEBHOOK_SECRET must be set when RUN_MODE=webhook")
+        self.bot = bot
+        self.path = path
+        self.secret = secret
+        self.workers = workers
+        self.updates = queue.Queue(maxsize=queue_size)
+        self.httpd = ThreadingHTTPServer((listen, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self._threads = []
+    
+    @property
+    def address(self) -> tuple:
+        return self.httpd.server_address[:2]
+    
+    def start(self):
+        """Start the listener and workers in background threads."""
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'webhook-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        
+        listener = threading.Thread(target=self.httpd.serve_forever, name='webhook-http', daemon=True)
+        listener.start()
+        self._threads.append(listener)
+        logger.info("Webhook server listening on %s:%s%s", self.address[0], self.address[1], self.path)
+        return self
+    
+    def stop(self):
+        """Stop accepting updates and let workers finish the queued ones."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        for _ in range(self.workers):
+            self.updates.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+        logger.info("Webhook server stopped")
+    
+    def _worker(self):
+        while True:
+            body = self.updates.get()
+            if body is None:
+                return
+            try:
+                self.process_update(json.loads(body))
+            except Exception as e:
+                logger.error("Error processing webhook update: %s", e, exc_info=True)
+    
+    def process_update(self, data: dict):
+        """Handle one decoded update (called on a worker thread)."""
+        self.bot.process_new_updates([types.Update.de_json(data)])
+    
+    def _make_handler(self):
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive lets Telegram reuse its connections
+            protocol_version = 'HTTP/1.1'
+            
+            def _reply(self, status):
+                # The body of a refused request may be unread; drop the connection
+                self.send_response(status)
+                if status != 200:
+                    self.send_header('Connection', 'close')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+            
+            def do_POST(self):
+                if self.path != server.path:
+                    return self._reply(404)
+                
+                token = self.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+                if not hmac.compare_digest(token, server.secret):
+                    logger.warning("Rejected webhook request with bad secret from %s", self.client_address[0])
+                    return self._reply(403)
+                
+                try:
+                    length = int(self.headers.get('Content-Length') or 0)
+                except ValueError:
+                    return self._reply(400)
+                if not 0 < length <= MAX_BODY_SIZE:
+                    return self._reply(400)
+                
+                body = self.rfile.read(length)
+                try:
+                    server.updates.put_nowait(body)
+                except queue.Full:
+                    logger.warning("Webhook queue full, asking Telegram to retry")
+                    return self._reply(503)
+                self._reply(200)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        return Handler
+
+
+def run_webhook(bot, server_class=WebhookServer, **options):
+    """Register the webhook with Telegram and serve updates until interrupted.
+    
+    Args:
+        bot: Bot that registers the webhook (and handles updates)
+        server_class: WebhookServer or a subclass
+        **options: Constructor arguments replacing WEBHOOK_SETTINGS values
+    """
+    settings = WEBHOOK_SETTINGS
+    if not settings['url']:
+        raise ValueError("WEBHOOK_URL must be set when RUN_MODE=webhook")
+    
+    arguments = dict(
+        listen=settings['listen'],
+        port=settings['port'],
+        path=settings['path'],
+        secret=settings['secret'],
+        workers=settings['workers'],
+        queue_size=settings['queue_size']
+    )
+    arguments.update(options)
+    server = server_class(bot, **arguments)
+    server.start()
+    bot.set_webhook(
+        url=settings['url'].rstrip('/') + settings['path'],
+        secret_token=arguments['secret'],
+        max_connections=settings['max_connections']
+    )
+    logger.info("Webhook registered at %s", settings['url'])
+    
+    try:
+        threading.Event().wait()
+    finally:
+        server.stop()
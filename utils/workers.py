@@ -0,0 +1,290 @@
+"""Multi-process mode: one supervisor receives updates, worker processes handle them.
+
+The supervisor takes updates from Telegram once (long polling or the
+webhook) and puts each raw update on the queue of the worker that owns
+its chat (chat id modulo the number of workers). A worker runs the
+usual handlers on its own bot and chat executor (in parallel across
+chats, in order within each chat), so a chat's conversation state,
+caches and rate-limit buckets live in one process. It takes at most
+`backlog` updates off its queue ahead of the handlers and acknowledges
+each one once handled.
+
+Workers are started with the spawn method (no connections or threads
+inherited from the supervisor) and restarted when they exit. The
+supervisor keeps every update until it is acknowledged and replays the
+unacknowledged ones, in order, to the restarted worker: nothing is
+lost, but the updates being handled when a worker died run again.
+"""
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+
+from telebot import apihelper, types
+
+from config import DISPATCHER_SETTINGS, WORKER_SETTINGS
+from utils.chat_executor import CHAT_FIELDS, start_executor, stop_executor, update_chat_key
+from utils.metrics import worker_restarts, worker_updates
+from utils.webhook import WebhookServer
+
+logger = logging.getLogger(__name__)
+
+# Seconds between getUpdates attempts after a failed one
+POLL_RETRY_DELAY = 3
+# Seconds a worker gets to finish its queue on shutdown
+STOP_TIMEOUT = 30
+
+
+def shard_key(update: dict) -> int:
+    """Chat id of a raw update, or the user's id for updates without a chat."""
+    for kind in CHAT_FIELDS:
+        if kind in update:
+            return update[kind]['chat']['id']
+    
+    call = update.get('callback_query')
+    if call is not None:
+        message = call.get('message')
+        return message['chat']['id'] if message else call['from']['id']
+    
+    for payload in update.values():
+        if isinstance(payload, dict):
+            user = payload.get('from') or payload.get('user')
+            if user:
+                return user['id']
+    return update['update_id']
+
+
+def run_worker(index: int, workers: int, backlog: int, updates, acks, log_queue):
+    """Worker process: handle the updates of one shard (each chat's in arrival order).
+    
+    Args:
+        index: Worker number (0-based)
+        workers: Number of workers sharing Telegram's global send limit
+        backlog: Updates taken off `updates` and not yet handled, at most
+        updates: Queue of raw updates; None stops the worker
+        acks: Queue of the update_ids handled, for the supervisor
+        log_queue: Queue the supervisor writes log records from
+    """
+    # Ctrl+C reaches the whole process group; the supervisor stops workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    
+    # Imported here: the supervisor itself never runs handlers
+    from bot import create_bot
+    from database import close_all
+    from database.write_coalescer import writes
+    from handlers.birthdays import register_birthday_handlers
+    from handlers.commands import register_command_handlers
+    from utils.dispatcher import start_dispatcher, stop_dispatcher
+    from utils.logging_setup import setup_worker_logging
+    from utils.metrics import start_metrics_server
+    
+    setup_worker_logging(log_queue)
+    start_metrics_server(offset=1 + index)
+    
+    bot = create_bot(threaded=False)
+    # Bound before start_executor() replaces it with queuing on the executor
+    process = bot.process_new_updates
+    executor = start_executor(bot, max_pending=backlog)
+    start_dispatcher(bot, global_rate=DISPATCHER_SETTINGS['global_rate'] / workers).attach()
+    register_command_handlers(bot)
+    register_birthday_handlers(bot)
+    logger.info("Worker %s started (pid %s)", index, os.getpid())
+    
+    def handle(update, update_id):
+        try:
+            process([update])
+        finally:
+            acks.put(update_id)
+    
+    try:
+        while True:
+            update = updates.get()
+            if update is None:
+                break
+            try:
+                parsed = types.Update.de_json(update)
+                # Blocks while `backlog` updates wait: the next get() waits with it
+                executor.submit(update_chat_key(parsed), handle, parsed, update['update_id'])
+            except Exception as e:
+                logger.error("Worker %s: error processing update %s: %s",
+                             index, update.get('update_id'), e, exc_info=True)
+                acks.put(update.get('update_id'))
+    finally:
+        stop_executor()
+        stop_dispatcher()
+        writes.stop()
+        close_all()
+        logger.info("Worker %s stopped", index)
+
+
+class Supervisor:
+    """Starts the worker processes, shards updates to them and restarts dead ones.
+    
+    Args:
+        workers: Number of worker processes
+        queue_size: Updates queued per worker before dispatch() blocks
+        backlog: Updates a worker takes off its queue ahead of its handlers
+        restart_delay: Seconds between liveness checks (and so before a restart)
+    """
+    
+    def __init__(self, workers: int = 4, queue_size: int = 1000, backlog: int = 64,
+                 restart_delay: float = 1):
+        if workers < 1:
+            raise ValueError("At least one worker process is needed")
+        self.workers = workers
+        self.queue_size = queue_size
+        self.backlog = backlog
+        self.restart_delay = restart_delay
+        self._context = multiprocessing.get_context('spawn')
+        self.log_queue = self._context.Queue()
+        self._queues = [None] * workers
+        self._acks = [None] * workers
+        self._processes = [None] * workers
+        # update_id -> raw update, per worker, until acknowledged
+        self._unacked = [{} for _ in range(workers)]
+        self._locks = [threading.Lock() for _ in range(workers)]
+        self._stopping = threading.Event()
+        self._monitor = None
+    
+    def start(self):
+        """Start the workers and the thread that restarts them."""
+        for index in range(self.workers):
+            self._spawn(index)
+        self._monitor = threading.Thread(target=self._watch, name='worker-monitor', daemon=True)
+        self._monitor.start()
+        logger.info("Started %s worker processes", self.workers)
+        return self
+    
+    def stop(self):
+        """Let the workers finish their queues, then stop them."""
+        self._stopping.set()
+        if self._monitor:
+            self._monitor.join()
+        for index, updates in enumerate(self._queues):
+            try:
+                updates.put(None, timeout=STOP_TIMEOUT)
+            except queue.Full:
+                logger.warning("Worker %s did not free its queue in %ss, terminating it",
+                               index, STOP_TIMEOUT)
+                self._processes[index].terminate()
+        for index, process in enumerate(self._processes):
+            process.join(STOP_TIMEOUT)
+            if process.is_alive():
+                logger.warning("Worker %s did not stop in %ss, terminating it", index, STOP_TIMEOUT)
+                process.terminate()
+                process.join()
+        logger.info("Workers stopped")
+    
+    def dispatch(self, update: dict):
+        """Queue a raw update on the worker that owns its chat.
+        
+        Blocks while that worker's queue is full, which holds back
+        getUpdates (or the webhook's queue) instead of dropping updates.
+        """
+        index = shard_key(update) % self.workers
+        with self._locks[index]:
+            self._unacked[index][update['update_id']] = update
+            updates = self._queues[index]
+        while True:
+            try:
+                updates.put(update, timeout=self.restart_delay)
+                break
+            except queue.Full:
+                if self._stopping.is_set():
+                    raise
+                if self._queues[index] is not updates:
+                    break  # Replayed to the restarted worker
+        worker_updates.labels(index).inc()
+    
+    def poll(self, bot, long_polling_timeout: int = 20):
+        """Long-poll getUpdates with bot's token and dispatch every update."""
+        offset = None
+        while not self._stopping.is_set():
+            try:
+                # Raw dicts: workers parse their own updates
+                updates = apihelper.get_updates(
+                    bot.token, offset=offset, long_polling_timeout=long_polling_timeout
+                )
+            except Exception as e:
+                logger.error("getUpdates failed: %s", e)
+                time.sleep(POLL_RETRY_DELAY)
+                continue
+            
+            for update in updates:
+                self.dispatch(update)
+                offset = update['update_id'] + 1
+    
+    def _spawn(self, index: int):
+        # Fresh queues: a worker killed inside get() or put() may leave the old ones
+        # locked or half-read; what it had not acknowledged is replayed instead
+        updates = self._context.Queue(self.queue_size)
+        acks = self._context.Queue()
+        process = self._context.Process(
+            target=run_worker,
+            args=(index, self.workers, self.backlog, updates, acks, self.log_queue),
+            name=f'bot-worker-{index}',
+            daemon=True
+        )
+        process.start()
+        
+        with self._locks[index]:
+            self._queues[index] = updates
+            self._acks[index] = acks
+            self._processes[index] = process
+            pending = list(self._unacked[index].values())
+            if pending:
+                logger.warning("Replaying %s unacknowledged updates to worker %s", len(pending), index)
+            for update in pending:
+                while True:
+                    try:
+                        updates.put(update, timeout=self.restart_delay)
+                        break
+                    except queue.Full:
+                        if not process.is_alive():
+                            return  # Replayed again by the next restart
+    
+    def _collect_acks(self, index: int):
+        # Messages this small are written atomically, even by a worker that dies
+        with self._locks[index]:
+            unacked = self._unacked[index]
+            while True:
+                try:
+                    unacked.pop(self._acks[index].get_nowait(), None)
+                except queue.Empty:
+                    return
+    
+    def _watch(self):
+        while not self._stopping.wait(self.restart_delay):
+            for index, process in enumerate(self._processes):
+                alive = process.is_alive()
+                # After the liveness check, so a dead worker's last acks are in
+                self._collect_acks(index)
+                if not alive:
+                    logger.error("Worker %s (pid %s) exited with code %s, restarting it",
+                                 index, process.pid, process.exitcode)
+                    worker_restarts.labels(index).inc()
+                    self._spawn(index)
+
+
+class ShardingWebhookServer(WebhookServer):
+    """WebhookServer that hands updates to a Supervisor instead of a bot."""
+    
+    def __init__(self, bot, supervisor: Supervisor, **kwargs):
+        super().__init__(bot, **kwargs)
+        self.supervisor = supervisor
+    
+    def process_update(self, data: dict):
+        self.supervisor.dispatch(data)
+
+
+def create_supervisor() -> Supervisor:
+    """Create a Supervisor from WORKER_SETTINGS."""
+    return Supervisor(
+        workers=WORKER_SETTINGS['processes'],
+        queue_size=WORKER_SETTINGS['queue_size'],
+        backlog=WORKER_SETTINGS['backlog'],
+        restart_delay=WORKER_SETTINGS['restart_delay']
+    )